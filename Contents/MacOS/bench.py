@@ -0,0 +1,289 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+Benchmarks of the presentation tool on synthetic decks
+
+Beamer-like decks are generated (frames of up to a few overlays, a section
+navigation bar of zero-width links on every page, notes and Q: annotations)
+and run headless through the document model: page table, deck index,
+sidecar, page cache and the headless renderer of the views.
+
+	bench.py [-p <pages>,...] [-r <repeat>] [-o <results.json>|-]
+	         [-c <baseline.json>] [-t <tolerance>]
+
+-p  deck sizes in pages (default 50,200,1000,5000)
+-r  repetitions of each timing, the median is kept (default 5)
+-o  write the results as json to a file, or to stdout with -
+-c  compare with previous results, exits with 2 if a metric regressed by
+    more than the tolerance (default 0.2, i.e. 20%)
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import json
+import time
+import random
+import getopt
+import platform
+import tempfile
+import tracemalloc
+
+from deck import DeckIndex, PageTable
+from document import StubDocument
+from headless import HeadlessRenderer
+from overview import GridLayout, ThumbnailCache, priority, AHEAD_ROWS
+import sidecar
+
+
+# constants ##################################################################
+
+VERSION = 1
+DEFAULT_PAGES = [50, 200, 1000, 5000]
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = .2
+
+OVERLAYS = 3      # maximum pages per frame
+SECTIONS = 8      # sections in the navigation bar
+NOTES    = .3     # fraction of frames with a note
+QUESTIONS = .1    # fraction of frames with a question
+DRAWN_PAGES = 10  # pages drawn for the view benchmarks
+
+OVERVIEW_SIZE = (1280., 800.) # presenter view showing the overview
+
+NAVIGATION_LINK = ((2., 260.), (0., 6.))  # zero-width, section marker
+CONTENT_LINK    = ((40., 20.), (60., 10.)) # ordinary link in the slide
+
+
+# synthetic decks ############################################################
+
+def synthetic_deck(page_count, overlays=OVERLAYS, sections=SECTIONS,
+                   notes=NOTES, questions=QUESTIONS, seed=0):
+	"""document and page records (as extracted by the application)"""
+	generator = random.Random(seed)
+	labels, frame_starts = [], []
+	while len(labels) < page_count:
+		frame_starts.append(len(labels))
+		pages = min(generator.randint(1, overlays), page_count-len(labels))
+		labels.extend([str(len(frame_starts))] * pages)
+
+	step = max(len(frame_starts) // sections, 1)
+	section_starts = frame_starts[::step][:sections]
+
+	records = []
+	for page, label in enumerate(labels):
+		links = [(NAVIGATION_LINK, start) for start in section_starts]
+		links.append((CONTENT_LINK, None))
+		record = dict(label=label, links=links, notes=[], questions=[])
+		if page in frame_starts:
+			if generator.random() < notes:
+				record["notes"].append("note for frame %s" % label)
+			if generator.random() < questions:
+				record["questions"].append("question on frame %s?" % label)
+		records.append(record)
+	return StubDocument.uniform(page_count, labels=labels), records
+
+
+# measures ###################################################################
+
+def median(values):
+	values = sorted(values)
+	return values[len(values)//2]
+
+
+def measure(function, repeat):
+	"""median duration of function() in milliseconds, and its last result"""
+	durations = []
+	for _ in range(repeat):
+		begin = time.perf_counter()
+		result = function()
+		durations.append(time.perf_counter() - begin)
+	return median(durations)*1000., result
+
+
+def per_page(function, page_count, repeat):
+	"""median duration in microseconds of function(page) over all pages"""
+	def run():
+		for page in range(page_count):
+			function(page)
+	duration, _ = measure(run, repeat)
+	return duration*1000./page_count
+
+
+def peak_memory(function):
+	"""bytes allocated at peak while running function()"""
+	tracemalloc.start()
+	try:
+		function()
+		_, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return peak
+
+
+def bench_deck(page_count, repeat, directory):
+	document, records = synthetic_deck(page_count)
+	results = dict(pages=page_count)
+
+	# cold start: every page parsed, then indexed
+	def index():
+		table = PageTable(page_count, lambda page: dict(records[page]))
+		table.warm()
+		return table, DeckIndex(table.column("label"), table.column("links"))
+	results["index_ms"], (table, deck) = measure(index, repeat)
+	results["index_bytes"] = peak_memory(index)
+
+	# warm start: records from the sidecar
+	pdf_path = os.path.join(directory, "deck-%s.pdf" % page_count)
+	with open(pdf_path, "wb") as f:
+		f.write(b"%%PDF-1.5\n%% %d pages\n" % page_count)
+	results["sidecar_save_ms"], _ = measure(
+		lambda: sidecar.save(pdf_path, table.records), repeat)
+	def load():
+		table = PageTable(page_count, None, sidecar.load(pdf_path))
+		return DeckIndex(table.column("label"), table.column("links"))
+	results["sidecar_load_ms"], _ = measure(load, repeat)
+
+	# navigation
+	for name in ["next_frame", "prev_frame", "next_section", "prev_section"]:
+		results["%s_us" % name] = per_page(getattr(deck, name), page_count, repeat)
+	results["page_for_label_us"] = per_page(
+		lambda page: deck.page_for_label(deck.labels[page]), page_count, repeat)
+	results["section_us"] = per_page(deck.section, page_count, repeat)
+	results["frame_ordinal_us"] = per_page(deck.frame_ordinal, page_count, repeat)
+	results["resolve_us"] = per_page(
+		lambda page: deck.resolve("#%d" % (page+1)), page_count, repeat)
+
+	# drawing, cold (rendering pages) then warm (from the page cache)
+	pages = range(0, page_count, max(page_count // DRAWN_PAGES, 1))
+	renderer = HeadlessRenderer(document, prefetch=False)
+	def draw():
+		for page in pages:
+			renderer.render_presenter(page, notes=records[page]["notes"])
+	results["draw_presenter_cold_ms"], _ = measure(
+		lambda: (renderer.cache.clear(), draw()), repeat)
+	draw()
+	results["draw_presenter_ms"], _ = measure(draw, repeat)
+	results["draw_slide_ms"], _ = measure(
+		lambda: [renderer.render_slide(page) for page in pages], repeat)
+	for name in ["draw_presenter_cold_ms", "draw_presenter_ms", "draw_slide_ms"]:
+		results[name] /= len(pages)
+	results["cache_bytes"] = renderer.cache.used
+
+	# overview, until the thumbnails of the visible tiles (and those ahead,
+	# at the end of the deck) are rendered
+	grid = GridLayout(len(deck.frame_starts), OVERVIEW_SIZE, document.size(0))
+	scroll = grid.scroll_to(len(deck.frame_starts)-1, 0.)
+	size = int(grid.tile_width), int(grid.tile_height)
+	pages = [deck.frame_end(deck.frame_starts[i])
+	         for i in priority(grid.visible(scroll), grid.visible(scroll, AHEAD_ROWS))]
+	thumbnails = ThumbnailCache(lambda page, size: document.render(page, size, None))
+	def overview():
+		thumbnails.invalidate()
+		thumbnails.request(pages, size)
+		thumbnails.wait()
+	results["overview_ms"], _ = measure(overview, repeat)
+	return results
+
+
+def run(page_counts, repeat):
+	directory = tempfile.mkdtemp(prefix="presentation-bench-")
+	try:
+		results = [bench_deck(page_count, repeat, directory)
+		           for page_count in page_counts]
+	finally:
+		for name in os.listdir(directory):
+			os.unlink(os.path.join(directory, name))
+		os.rmdir(directory)
+	return {
+		"version":  VERSION,
+		"python":   platform.python_version(),
+		"platform": platform.platform(),
+		"repeat":   repeat,
+		"results":  results,
+	}
+
+
+# reporting ##################################################################
+
+def metrics(results):
+	return [key for key in results[0] if key != "pages"]
+
+
+def report(data, out=sys.stdout):
+	results = data["results"]
+	names = metrics(results)
+	out.write("%-24s" % "pages" + "".join("%12s" % r["pages"] for r in results) + "\n")
+	for name in names:
+		out.write("%-24s" % name + "".join(
+			"%12.3f" % r[name] if isinstance(r[name], float) else "%12s" % r[name]
+			for r in results) + "\n")
+
+
+def compare(data, baseline, tolerance, out=sys.stdout):
+	"""report metrics that grew by more than tolerance, returns their count"""
+	previous = dict((r["pages"], r) for r in baseline["results"])
+	regressions = 0
+	for results in data["results"]:
+		reference = previous.get(results["pages"])
+		if reference is None:
+			continue
+		for name, value in results.items():
+			old = reference.get(name)
+			if name == "pages" or not old:
+				continue
+			change = (value-old)/float(old)
+			if change > tolerance:
+				regressions += 1
+				out.write("regression: %s at %s pages: %.3f -> %.3f (+%d%%)\n" % (
+					name, results["pages"], old, value, change*100))
+	return regressions
+
+
+# command line ###############################################################
+
+def main(args):
+	try:
+		options, args = getopt.getopt(args, "p:r:o:c:t:")
+	except getopt.GetoptError as error:
+		sys.stderr.write("%s\n%s" % (error, __doc__))
+		return 1
+	if args:
+		sys.stderr.write(__doc__)
+		return 1
+	page_counts, repeat = DEFAULT_PAGES, DEFAULT_REPEAT
+	output = baseline = None
+	tolerance = DEFAULT_TOLERANCE
+	for option, value in options:
+		if option == "-p":
+			page_counts = [int(v) for v in value.split(",")]
+		elif option == "-r":
+			repeat = int(value)
+		elif option == "-o":
+			output = value
+		elif option == "-c":
+			with open(value) as f:
+				baseline = json.load(f)
+		elif option == "-t":
+			tolerance = float(value)
+
+	data = run(page_counts, repeat)
+	if output == "-":
+		json.dump(data, sys.stdout, indent=1)
+		sys.stdout.write("\n")
+	else:
+		report(data)
+		if output:
+			with open(output, "w") as f:
+				json.dump(data, f, indent=1)
+	if baseline is not None and compare(data, baseline, tolerance, sys.stderr):
+		return 2
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Rendered page cache for the presentation tool
+
+Backend agnostic: images are produced by a render(page, size, transform)
+callable returning an (image, cost) pair, where cost is the memory used by
+the image in bytes. Images are evicted in least recently used order once the
+memory budget is exceeded, and neighbours of the current page can be
+rendered ahead of time by a background thread.
+"""
+
+
+# imports ####################################################################
+
+import sys
+import threading
+
+from collections import OrderedDict
+
+
+# constants ##################################################################
+
+MB = 1 << 20
+
+DEFAULT_BUDGET   = 256 * MB # bytes of rendered images kept around
+DEFAULT_PREFETCH = 2        # pages rendered ahead around the current one
+
+
+# page cache #################################################################
+
+def parse_budget(spec):
+	"""memory budget in bytes from its command line description, in MB"""
+	try:
+		megabytes = int(spec)
+	except ValueError:
+		megabytes = 0
+	if megabytes < 1:
+		raise ValueError("invalid cache size '%s'" % spec)
+	return megabytes * MB
+
+
+class PageCache(object):
+	def __init__(self, render, budget=DEFAULT_BUDGET, prefetch=DEFAULT_PREFETCH):
+		self.render = render
+		self.budget = budget
+		self.prefetch_count = prefetch
+
+		self.images = OrderedDict() # (page, size, transform) -> (image, cost)
+		self.used = 0
+		self.hits = self.misses = self.evictions = self.prefetched = 0
+
+		self.lock = threading.Lock()
+		self.generation = 0 # bumped when the rendered document changes
+		self.pending = OrderedDict() # (size, transform) -> keys to render
+		self.wakeup = threading.Condition(self.lock)
+		self.worker = None
+
+	def key(self, page, size, transform=None):
+		return (page, tuple(size), tuple(transform) if transform else None)
+
+	def __contains__(self, key):
+		with self.lock:
+			return key in self.images
+
+	def __len__(self):
+		return len(self.images)
+
+	def get(self, page, size, transform=None):
+		"""image of page at size (in pixels), rendering it if not cached"""
+		key = self.key(page, size, transform)
+		with self.lock:
+			if key in self.images:
+				self.images.move_to_end(key) # most recently used goes last
+				self.hits += 1
+				image, _ = self.images[key]
+				return image
+			self.misses += 1
+			generation = self.generation
+		return self._render(key, generation)
+
+	def _render(self, key, generation):
+		image, cost = self.render(*key)
+		with self.lock:
+			if generation != self.generation: # rendered from a stale document
+				return image
+			if key in self.images:
+				self.used -= self.images.pop(key)[1]
+			self.images[key] = image, cost
+			self.used += cost
+			self._evict()
+		return image
+
+	def _evict(self):
+		# always keep the most recent image, even if it exceeds the budget
+		while self.used > self.budget and len(self.images) > 1:
+			_, (_, cost) = self.images.popitem(last=False)
+			self.used -= cost
+			self.evictions += 1
+
+	def invalidate(self, pages=None):
+		"""drop cached images of pages (all of them if None)"""
+		with self.lock:
+			for key in list(self.images):
+				if pages is None or key[0] in pages:
+					self.used -= self.images.pop(key)[1]
+			self.pending.clear()
+			self.generation += 1
+
+	def remap(self, moved):
+		"""keep only images of the pages in moved, renumbered as it says"""
+		with self.lock:
+			images = OrderedDict()
+			for (page, size, transform), (image, cost) in self.images.items():
+				if page in moved:
+					images[moved[page], size, transform] = image, cost
+			self.images = images
+			self.used = sum(cost for _, cost in images.values())
+			self.pending.clear()
+			self.generation += 1
+
+	def clear(self):
+		self.invalidate()
+
+	# prefetching
+
+	def neighbours(self, page, first_page, last_page):
+		"""pages around page, closest first, next ones before previous ones"""
+		for d in range(1, self.prefetch_count+1):
+			for p in (page+d, page-d):
+				if first_page <= p <= last_page:
+					yield p
+
+	def prefetch(self, page, size, transform=None, first_page=0, last_page=None):
+		"""schedule rendering of the neighbours of page in the background"""
+		if last_page is None:
+			last_page = page + self.prefetch_count
+		keys = [self.key(p, size, transform)
+		        for p in self.neighbours(page, first_page, last_page)]
+		with self.lock:
+			# previous requests for this size are obsolete, the page moved
+			view = keys[0][1:] if keys else None
+			keys = [key for key in keys if key not in self.images]
+			if keys:
+				self.pending[view] = keys
+				self._start_worker()
+				self.wakeup.notify()
+			else:
+				self.pending.pop(view, None)
+
+	def _start_worker(self):
+		if self.worker is None:
+			self.worker = threading.Thread(target=self._work, name="prefetch")
+			self.worker.daemon = True
+			self.worker.start()
+
+	def _work(self):
+		while True:
+			with self.lock:
+				while not self.pending:
+					self.wakeup.wait()
+				view, keys = next(iter(self.pending.items()))
+				key = keys.pop(0)
+				if not keys:
+					del self.pending[view]
+				if key in self.images:
+					continue
+				generation = self.generation
+			try:
+				self._render(key, generation)
+			except Exception as error: # the page is rendered again when shown
+				sys.stderr.write("prefetch of page %s failed: %s\n" % (key[0], error))
+				continue
+			self.prefetched += 1
+
+	def stats(self):
+		return dict(
+			images=len(self.images), used=self.used, budget=self.budget,
+			hits=self.hits, misses=self.misses,
+			evictions=self.evictions, prefetched=self.prefetched,
+		)
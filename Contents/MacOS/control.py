@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Command dispatcher and remote control server for the presentation tool
+
+Keyboard and remote control share one dispatcher of named commands. The
+server accepts connections on a unix domain socket, reads one command per
+line (e.g. "next", "goto 37", "state") and answers each with one line of
+json: {"ok": true, "result": ...} or {"ok": false, "error": "..."}.
+
+Commands are run through call(function), which the application uses to run
+them on its main thread; this module does not depend on AppKit.
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import json
+import threading
+import asyncio
+
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+# dispatcher #################################################################
+
+class CommandError(Exception):
+	pass
+
+
+class Dispatcher(object):
+	def __init__(self):
+		self.commands = OrderedDict()
+
+	def register(self, name, action, help="", argument=None):
+		"""register action under name, argument names its parameter if any"""
+		self.commands[name] = (action, help, argument)
+
+	def __contains__(self, name):
+		return name in self.commands
+
+	def dispatch(self, line):
+		"""run the command described by line, returns its result"""
+		words = line.strip().split(None, 1)
+		if not words:
+			raise CommandError("empty command")
+		name, value = words[0], words[1:]
+		try:
+			action, _, argument = self.commands[name]
+		except KeyError:
+			raise CommandError("unknown command '%s'" % name)
+		if argument and not value:
+			raise CommandError("%s expects %s" % (name, argument))
+		if value and not argument:
+			raise CommandError("%s expects no argument" % name)
+		return action(*value)
+
+	def help(self):
+		return [" ".join(filter(None, [name, argument, "-", help]))
+		        for name, (_, help, argument) in self.commands.items()]
+
+
+def respond(dispatcher, line):
+	"""json answer to a command line"""
+	try:
+		result = dispatcher.dispatch(line)
+	except Exception as error: # a remote should never bring the show down
+		answer = {"ok": False, "error": str(error)}
+	else:
+		answer = {"ok": True, "result": result}
+	return json.dumps(answer, separators=(",", ":")) + "\n"
+
+
+def call_now(function):
+	"""run function immediately, in a future (when there is no ui thread)"""
+	future = Future()
+	try:
+		future.set_result(function())
+	except Exception as error:
+		future.set_exception(error)
+	return future
+
+
+# server #####################################################################
+
+class ControlServer(object):
+	def __init__(self, dispatcher, path, call=call_now):
+		self.dispatcher = dispatcher
+		self.path = path
+		self.call = call
+		self.connections = self.commands = 0
+		self.loop = asyncio.new_event_loop()
+		self.ready = threading.Event()
+		self.thread = threading.Thread(target=self.run, name="control")
+		self.thread.daemon = True
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def run(self):
+		asyncio.set_event_loop(self.loop)
+		self.loop.run_until_complete(self.listen())
+		self.ready.set()
+		self.loop.run_forever()
+
+	async def listen(self):
+		if os.path.exists(self.path): # left over by a previous run
+			os.unlink(self.path)
+		try:
+			self.server = await asyncio.start_unix_server(self.handle, self.path)
+		except OSError as error:
+			sys.stderr.write("control socket %s failed: %s\n" % (self.path, error))
+
+	async def handle(self, reader, writer):
+		self.connections += 1
+		try:
+			while True:
+				line = await reader.readline()
+				if not line:
+					break
+				line = line.decode("utf-8", "replace")
+				answer = self.call(lambda: respond(self.dispatcher, line))
+				writer.write((await asyncio.wrap_future(answer)).encode("utf-8"))
+				await writer.drain()
+				self.commands += 1
+		except (ValueError, ConnectionError):
+			pass
+		finally:
+			writer.close()
+
+	def stop(self):
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		if os.path.exists(self.path):
+			os.unlink(self.path)
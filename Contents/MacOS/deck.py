@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Deck index: frame and section lookups for the presentation tool
+
+Pure python, so that it can be fed page labels and link rects extracted from
+any pdf backend (and unit-tested or benchmarked without PDFKit).
+"""
+
+
+# imports ####################################################################
+
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+
+# helpers ####################################################################
+
+SECTION_LINK_MAX_WIDTH = 2. # beamer \hyperlinksubsectionstart links are 0pt wide
+
+def is_section_link(rect):
+	"""zero-width links are the section markers of beamerouterthemelecture"""
+	_, (width, _) = rect
+	return width < SECTION_LINK_MAX_WIDTH
+
+
+def section_links(links):
+	"""destinations of the section links found in (rect, destination) pairs"""
+	return [destination for rect, destination in links
+	        if destination is not None and is_section_link(rect)]
+
+
+def normalize_title(title):
+	"""outline titles are matched regardless of case and spacing"""
+	return " ".join(title.lower().split())
+
+
+def outline_sections(outline, first_page, last_page):
+	"""(page, title) of the outline entries that are sections: those of the
+	shallowest level with several entries (a lone top entry being the title
+	of the document)"""
+	entries = [(title, page, depth) for title, page, depth in outline
+	           if page is not None and first_page <= page <= last_page]
+	depths = Counter(depth for _, _, depth in entries)
+	level = min([depth for depth, count in depths.items() if count > 1] or [0])
+	return [(page, title) for title, page, depth in entries if depth == level]
+
+
+# deck index #################################################################
+
+class DeckIndex(object):
+	"""sorted frame and section starts of a deck, with O(log n) lookups
+
+	labels:  the page label of each page, in page order
+	links:   for each page, its links as ((x, y), (w, h)), destination pairs
+	outline: (title, page, depth) of the pdf outline entries, depth first
+
+	Sections are taken from the outline, else from the zero-width links of
+	beamerouterthemelecture, and kept as sorted (start, end, title) ranges.
+	"""
+
+	def __init__(self, labels, links=(), outline=()):
+		self.labels = list(labels)
+		self.page_count = len(self.labels)
+		self.first_page, self.last_page = 0, self.page_count-1
+		self.last_label = self.labels[-1] if self.labels else None
+
+		# a frame starts on each page whose label differs from the previous one
+		self.frame_starts = [page for page, label in enumerate(self.labels)
+		                     if page == 0 or label != self.labels[page-1]]
+
+		# frame of each page
+		self.frame_ordinals = []
+		for ordinal, start in enumerate(self.frame_starts):
+			end = self.frame_starts[ordinal+1] if ordinal+1 < len(self.frame_starts) else self.page_count
+			self.frame_ordinals.extend([ordinal] * (end - start))
+
+		# first page with each label
+		self.label_pages = {}
+		for page in reversed(self.frame_starts):
+			self.label_pages[self.labels[page]] = page
+
+		# first page of each outline title
+		self.title_pages = {}
+		for title, page, _ in reversed(list(outline)):
+			if page is not None and self.first_page <= page <= self.last_page:
+				self.title_pages[normalize_title(title)] = page
+
+		# sections start on the outline entries, else on the destinations
+		# of zero-width links, the first one on the first page
+		entries = outline_sections(outline, self.first_page, self.last_page)
+		self.section_source = "outline" if entries else "links"
+		if not entries:
+			starts = set()
+			for page_links in links:
+				starts.update(section_links(page_links))
+			entries = [(page, "") for page in starts
+			           if self.first_page <= page <= self.last_page]
+		titles = {}
+		for page, title in sorted(entries, key=lambda entry: entry[0]): # outline order on ties
+			titles.setdefault(page, title)
+		if self.page_count:
+			titles.setdefault(self.first_page, "")
+		self.section_starts = sorted(titles)
+		ends = [start-1 for start in self.section_starts[1:]] + [self.last_page]
+		self.sections = [(start, end, titles[start])
+		                 for start, end in zip(self.section_starts, ends)]
+
+	def clamp(self, page):
+		return min(max(self.first_page, page), self.last_page)
+
+	# frames
+
+	def frame_start(self, page):
+		"""first page of the frame containing page"""
+		i = bisect_right(self.frame_starts, page)-1
+		return self.frame_starts[max(i, 0)]
+
+	def frame_end(self, page):
+		"""last page of the frame containing page"""
+		return self.next_frame(page)-1 if page < self.last_page else page
+
+	def frame_ordinal(self, page):
+		"""index of the frame containing page among all frames"""
+		return self.frame_ordinals[self.clamp(page)] if self.page_count else 0
+
+	def next_frame(self, page):
+		"""first page of the frame following the one containing page"""
+		i = bisect_right(self.frame_starts, page)
+		if i < len(self.frame_starts):
+			return self.frame_starts[i]
+		return self.page_count # past the end, as the original page walk did
+
+	def prev_frame(self, page):
+		"""first page of the frame preceding the one containing page"""
+		if page <= self.first_page:
+			return None
+		return self.frame_start(page-1)
+
+	def page_for_label(self, label):
+		"""first page with label, None if there is none"""
+		return self.label_pages.get(label)
+
+	def page_for_title(self, title):
+		"""first page of the outline entry titled title, None if there is none"""
+		return self.title_pages.get(normalize_title(title))
+
+	def resolve(self, text):
+		"""page a typed jump goes to, None if there is none: "#<n>" is the
+		absolute page number n (from 1), anything else a page label, then an
+		outline title"""
+		text = text.strip()
+		if text.startswith("#"):
+			try:
+				page = int(text[1:]) - 1
+			except ValueError:
+				return None
+			return page if self.first_page <= page <= self.last_page else None
+		page = self.label_pages.get(text)
+		if page is None:
+			page = self.page_for_title(text)
+		return page
+
+	# sections
+
+	def section_index(self, page):
+		"""index of the section containing page among all sections"""
+		return max(bisect_right(self.section_starts, page)-1, 0)
+
+	def section(self, page):
+		"""(start, end, title) of the section containing page"""
+		return self.sections[self.section_index(page)]
+
+	def section_start(self, page):
+		"""first page of the section containing page"""
+		return self.section_starts[self.section_index(page)]
+
+	def next_section(self, page):
+		"""first page of the section following the one containing page"""
+		i = bisect_right(self.section_starts, page)
+		if i < len(self.section_starts):
+			return self.section_starts[i]
+		return self.last_page
+
+	def prev_section(self, page):
+		"""start of the current section, or of the previous one if already there"""
+		start = self.section_start(page)
+		if start < page:
+			return start
+		i = bisect_left(self.section_starts, start)
+		return self.section_starts[max(i-1, 0)]
+
+
+# page walks ################################################################
+
+def walk_next_frame(label, page, page_count):
+	"""first page of the frame following the one containing page, walking
+	the pages of the frame (label(page) being its label), for decks that
+	are not indexed yet"""
+	current = label(page)
+	page += 1
+	while page < page_count and label(page) == current:
+		page += 1
+	return page
+
+
+def walk_prev_frame(label, page):
+	"""first page of the frame preceding the one containing page, walking
+	the pages of that frame, None on the first page"""
+	if page <= 0:
+		return None
+	page -= 1
+	current = label(page)
+	while page > 0 and label(page-1) == current:
+		page -= 1
+	return page
+
+
+# lazy page table ############################################################
+
+class PageTable(object):
+	"""per page records, extracted by extract(page) on first access
+
+	warm() extracts the remaining records a few at a time, so that a large
+	deck can be indexed in the background once the first slide is shown.
+	"""
+
+	def __init__(self, page_count, extract, records=None):
+		self.page_count = page_count
+		self.extract = extract
+		self.records = list(records) if records else [None] * page_count
+		self.missing = self.records.count(None)
+		self.next_missing = 0
+
+	def __len__(self):
+		return self.page_count
+
+	def __getitem__(self, page):
+		record = self.records[page]
+		if record is None:
+			record = self.records[page] = self.extract(page)
+			self.missing -= 1
+		return record
+
+	def __iter__(self):
+		for page in range(self.page_count):
+			yield self[page]
+
+	def complete(self):
+		return self.missing == 0
+
+	def warm(self, count=None):
+		"""extract up to count missing records (all if None), True when done"""
+		while self.missing and count != 0:
+			while self.records[self.next_missing] is not None:
+				self.next_missing += 1
+			self[self.next_missing]
+			if count is not None:
+				count -= 1
+		return self.complete()
+
+	def column(self, name):
+		return PageColumn(self, name)
+
+
+class PageColumn(object):
+	"""one field of the records of a page table, indexed by page"""
+
+	def __init__(self, table, name):
+		self.table = table
+		self.name = name
+
+	def __len__(self):
+		return len(self.table)
+
+	def __getitem__(self, page):
+		return self.table[page][self.name]
+
+	def __iter__(self):
+		for record in self.table:
+			yield record[self.name]
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Document backends of the presentation tool
+
+A document gives its page count, page labels and sizes (crop box, in points)
+and renders a page seen through a transform into an image of a given size in
+pixels, returning the image and its cost in bytes (see cache.PageCache).
+Transforms are affine transform structs (m11, m12, m21, m22, tx, ty) applied
+to page coordinates, as used for the bounding box zoom.
+
+Backends:
+	QuartzDocument  PDFKit, the one used by the application on Mac OS X
+	PdfiumDocument  rasterized by pypdfium2 (optional) into rasters
+	StubDocument    synthetic pages drawn in pure python into rasters, for
+	                benchmarks and tests without any pdf library
+
+Rasters are RGBA pixels in a bytearray, addressed in view coordinates (origin
+at the bottom left, y up) so that layouts apply unchanged.
+
+Smaller images of a page can be derived from a rendering by downsample()
+(see pagestore.py).
+"""
+
+
+# imports ####################################################################
+
+import re
+import hashlib
+import struct
+import zlib
+
+from array import array
+from operator import itemgetter
+
+try:
+	import objc
+	from AppKit import (
+		NSGraphicsContext, NSImage, NSBitmapImageRep, NSDeviceRGBColorSpace,
+		NSEraseRect, NSRectFillUsingOperation, NSCompositingOperationClear,
+		NSBezierPath, NSZeroRect, NSCompositingOperationCopy,
+		NSImageInterpolationHigh,
+	)
+	from AppKit import NSBitmapImageFileTypePNG
+	from Foundation import NSAffineTransform
+	from Quartz import kPDFDisplayBoxCropBox, CGImageCreateWithImageInRect
+except ImportError: # not on Mac OS X, only the headless backends are available
+	objc = None
+
+
+# constants ##################################################################
+
+IDENTITY = (1., 0., 0., 1., 0., 0.)
+BEAMER_SIZE = (362.83, 272.13) # 128mm x 96mm, the beamer default
+
+BLACK = (0, 0, 0, 255)
+WHITE = (255, 255, 255, 255)
+GRAY  = (128, 128, 128, 255)
+BLUE  = (0, 0, 255, 255)
+
+DIGEST_WIDTH = 64 # pixels of the rendering hashed as a page digest
+
+# parts of a pdf that change with every build whatever the content
+PDF_VOLATILE = re.compile(br"/(CreationDate|ModDate)\s*\([^)]*\)|/ID\s*\[[^\]]*\]")
+
+
+# rasters ####################################################################
+
+class Raster(object):
+	def __init__(self, width, height, color=BLACK, pixels=None):
+		self.width, self.height = width, height
+		if pixels is None:
+			pixels = bytearray(color) * (width*height)
+		self.pixels = pixels
+
+	def __len__(self):
+		return len(self.pixels)
+
+	def _bounds(self, rect):
+		"""pixel columns and rows covered by rect, clipped, rows top down"""
+		(x, y), (w, h) = rect
+		x0, x1 = max(int(round(x)), 0), min(int(round(x+w)), self.width)
+		y0, y1 = max(int(round(y)), 0), min(int(round(y+h)), self.height)
+		return x0, x1, self.height-y1, self.height-y0
+
+	def fill(self, rect, color):
+		x0, x1, r0, r1 = self._bounds(rect)
+		if x0 >= x1:
+			return
+		span = bytearray(color) * (x1-x0)
+		stride = 4*self.width
+		for row in range(r0, r1):
+			start = row*stride + 4*x0
+			self.pixels[start:start+len(span)] = span
+
+	def frame(self, rect, color, width=1.):
+		(x, y), (w, h) = rect
+		self.fill(((x, y), (w, width)), color)
+		self.fill(((x, y+h-width), (w, width)), color)
+		self.fill(((x, y), (width, h)), color)
+		self.fill(((x+w-width, y), (width, h)), color)
+
+	def blend(self, rect, color):
+		"""composite color with its alpha over rect"""
+		x0, x1, r0, r1 = self._bounds(rect)
+		if x0 >= x1:
+			return
+		alpha = color[3]/255.
+		tables = [bytes(int(round(v*(1.-alpha) + c*alpha)) for v in range(256))
+		          for c in color[:3]]
+		stride = 4*self.width
+		for row in range(r0, r1):
+			start, end = row*stride + 4*x0, row*stride + 4*x1
+			for channel, table in enumerate(tables):
+				self.pixels[start+channel:end:4] = \
+					self.pixels[start+channel:end:4].translate(table)
+
+	def draw(self, raster, origin):
+		"""copy raster with its bottom left corner at origin"""
+		x, y = int(round(origin[0])), int(round(origin[1]))
+		x0, x1, r0, r1 = self._bounds(((x, y), (raster.width, raster.height)))
+		if x0 >= x1:
+			return
+		stride, source_stride = 4*self.width, 4*raster.width
+		source_r0 = r0 - (self.height-y-raster.height)
+		for row in range(r0, r1):
+			start = row*stride + 4*x0
+			source = (source_r0+row-r0)*source_stride + 4*(x0-x)
+			self.pixels[start:start+4*(x1-x0)] = raster.pixels[source:source+4*(x1-x0)]
+
+	def crop(self, x, y, w, h):
+		"""raster of the w x h pixels at x, y from the top left"""
+		stride = 4*self.width
+		pixels = bytearray()
+		for row in range(y, y+h):
+			pixels += self.pixels[row*stride+4*x:row*stride+4*(x+w)]
+		return Raster(w, h, pixels=pixels)
+
+	def scaled(self, size):
+		"""raster of size pixels sampled from this one (nearest pixel)"""
+		w, h = size
+		source = memoryview(self.pixels).cast("I")
+		image = Raster(w, h)
+		target = memoryview(image.pixels).cast("I")
+		columns = itemgetter(*[int((x+.5)*self.width/w) for x in range(w)] + [0])
+		for y in range(h):
+			start = int((y+.5)*self.height/h)*self.width
+			target[y*w:(y+1)*w] = array("I", columns(source[start:start+self.width])[:w])
+		return image
+
+	def checksum(self):
+		return hashlib.sha1(self.pixels).hexdigest()
+
+	def ppm(self):
+		"""binary ppm image (alpha dropped), for regression references"""
+		rgb = bytearray(3*self.width*self.height)
+		for channel in range(3):
+			rgb[channel::3] = self.pixels[channel::4]
+		return b"P6\n%d %d\n255\n" % (self.width, self.height) + bytes(rgb)
+
+	def png(self):
+		"""png image, for page images served to browsers"""
+		stride = 4*self.width
+		rows = bytearray()
+		for row in range(self.height):
+			rows.append(0) # no filter
+			rows += self.pixels[row*stride:(row+1)*stride]
+		def chunk(kind, data):
+			return (struct.pack(">I", len(data)) + kind + data +
+			        struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+		return (b"\x89PNG\r\n\x1a\n" +
+		        chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 6, 0, 0, 0)) +
+		        chunk(b"IDAT", zlib.compress(bytes(rows))) +
+		        chunk(b"IEND", b""))
+
+
+# backends ###################################################################
+
+class Document(object):
+	page_count = 0
+
+	def label(self, page_number):
+		return str(page_number+1)
+
+	def size(self, page_number):
+		raise NotImplementedError
+
+	def render(self, page_number, size, transform):
+		"""rasterize page seen through transform into an image of size pixels,
+		returns the image and its cost in bytes"""
+		raise NotImplementedError
+
+	def downsample(self, image, page_number, size):
+		"""image of size pixels derived from a larger rendering of page"""
+		image = image.scaled(size)
+		return image, len(image)
+
+	def digest(self, page_number):
+		"""hash of what the page looks like, to skip unchanged pages (this
+		default hashes a small rendering)"""
+		w, h = self.size(page_number)
+		image, _ = self.render(page_number, (DIGEST_WIDTH, max(int(round(DIGEST_WIDTH*h/w)), 1)), IDENTITY)
+		return hashlib.sha1(bytes(image.pixels)).hexdigest()
+
+
+class QuartzDocument(Document):
+	"""a PDFKit document, to be used from one thread only"""
+
+	def __init__(self, pdf):
+		self.pdf = pdf
+		self.page_count = pdf.pageCount()
+		self.plain_pages = set() # pages drawn without their annotations
+
+	def label(self, page_number):
+		return self.pdf.pageAtIndex_(page_number).label()
+
+	def size(self, page_number):
+		_, size = self.pdf.pageAtIndex_(page_number).boundsForBox_(kPDFDisplayBoxCropBox)
+		return tuple(size)
+
+	def digest(self, page_number):
+		page = self.pdf.pageAtIndex_(page_number)
+		data = bytes(page.dataRepresentation() or b"")
+		return hashlib.sha1(PDF_VOLATILE.sub(b"", data)).hexdigest()
+
+	def render(self, page_number, size, transform):
+		page = self.pdf.pageAtIndex_(page_number)
+		if page_number not in self.plain_pages:
+			page.setDisplaysAnnotations_(False)
+			self.plain_pages.add(page_number)
+		page_rect = page.boundsForBox_(kPDFDisplayBoxCropBox)
+		def draw():
+			NSEraseRect(page_rect)
+			page.drawWithBox_(kPDFDisplayBoxCropBox)
+		return render_bitmap(size, page_rect, transform, draw)
+
+	def downsample(self, image, page_number, size):
+		page_rect = self.pdf.pageAtIndex_(page_number).boundsForBox_(kPDFDisplayBoxCropBox)
+		def draw():
+			NSGraphicsContext.currentContext().setImageInterpolation_(NSImageInterpolationHigh)
+			image.drawInRect_fromRect_operation_fraction_(
+				page_rect, NSZeroRect, NSCompositingOperationCopy, 1.)
+		return render_bitmap(size, page_rect, IDENTITY, draw)
+
+
+def render_bitmap(size, page_rect, transform, draw):
+	"""image of size pixels of what draw() draws in page_rect seen through
+	transform, and its cost in bytes (Quartz)"""
+	with objc.autorelease_pool():
+		pixels_wide, pixels_high = size
+		bitmap = NSBitmapImageRep.alloc().initWithBitmapDataPlanes_pixelsWide_pixelsHigh_bitsPerSample_samplesPerPixel_hasAlpha_isPlanar_colorSpaceName_bytesPerRow_bitsPerPixel_(
+			None, pixels_wide, pixels_high, 8, 4, True, False, NSDeviceRGBColorSpace, 0, 32
+		)
+		_, (w, h) = page_rect
+		image = NSImage.alloc().initWithSize_((w, h))
+		image.addRepresentation_(bitmap)
+		update_bitmap(image, page_rect, transform, draw)
+	return image, bitmap.bytesPerRow()*pixels_high
+
+
+def update_bitmap(image, page_rect, transform, draw, clear=None):
+	"""draw() over an image made by render_bitmap, after clearing the rect
+	clear (x0, y0, x1, y1 in transformed page coordinates) to which drawing
+	is then clipped (Quartz)"""
+	with objc.autorelease_pool():
+		bitmap = image.representations()[0]
+		_, (w, h) = page_rect
+
+		NSGraphicsContext.saveGraphicsState()
+		NSGraphicsContext.setCurrentContext_(
+			NSGraphicsContext.graphicsContextWithBitmapImageRep_(bitmap))
+		scale = NSAffineTransform.transform()
+		scale.scaleXBy_yBy_(bitmap.pixelsWide()/w, bitmap.pixelsHigh()/h)
+		scale.concat()
+		page_transform = NSAffineTransform.transform()
+		page_transform.setTransformStruct_(transform)
+		page_transform.concat()
+		if clear is not None:
+			x0, y0, x1, y1 = clear
+			rect = ((x0, y0), (x1-x0, y1-y0))
+			NSRectFillUsingOperation(rect, NSCompositingOperationClear)
+			NSBezierPath.clipRect_(rect)
+		draw()
+		NSGraphicsContext.restoreGraphicsState()
+
+
+def encode_png(image, rect=None):
+	"""png of an image of a backend, or of its rect (x, y, w, h in pixels
+	from the top left)"""
+	if isinstance(image, Raster):
+		return (image.crop(*rect) if rect else image).png()
+	with objc.autorelease_pool():
+		bitmap = image.representations()[0]
+		if rect:
+			x, y, w, h = rect
+			bitmap = NSBitmapImageRep.alloc().initWithCGImage_(
+				CGImageCreateWithImageInRect(bitmap.CGImage(), ((x, y), (w, h))))
+		return bytes(bitmap.representationUsingType_properties_(NSBitmapImageFileTypePNG, {}))
+
+
+def page_rect_pixels(rect, page_size, size, transform):
+	"""rect in page coordinates to pixels of a rendering (no rotations)"""
+	(x, y), (w, h) = rect
+	m11, _, _, m22, tx, ty = transform or IDENTITY
+	sx, sy = size[0]/page_size[0], size[1]/page_size[1]
+	return (sx*(m11*x+tx), sy*(m22*y+ty)), (sx*m11*w, sy*m22*h)
+
+
+class StubDocument(Document):
+	"""synthetic pages: a title bar, a body and a marker moving with the
+	page number, so that every page renders to different pixels"""
+
+	def __init__(self, sizes, labels=None):
+		self.sizes = list(sizes)
+		self.page_count = len(self.sizes)
+		self.labels = list(labels) if labels else None
+
+	@classmethod
+	def uniform(cls, page_count, size=BEAMER_SIZE, labels=None):
+		return cls([size] * page_count, labels)
+
+	def label(self, page_number):
+		if self.labels:
+			return self.labels[page_number]
+		return Document.label(self, page_number)
+
+	def size(self, page_number):
+		return self.sizes[page_number]
+
+	def render(self, page_number, size, transform):
+		w, h = page_size = self.sizes[page_number]
+		image = Raster(size[0], size[1], WHITE)
+		shade = 64 + (37*page_number) % 160
+		def fill(rect, color):
+			image.fill(page_rect_pixels(rect, page_size, size, transform), color)
+		fill(((0., h*.85), (w, h*.15)), (32, 32, shade, 255))
+		fill(((w*.1, h*.1), (w*.8, h*.6)), (224, 224, 224, 255))
+		step = w*.8 / max(self.page_count, 1)
+		fill(((w*.1 + step*page_number, h*.05), (max(step, 1.), h*.03)), BLUE)
+		return image, len(image)
+
+
+class PdfiumDocument(Document):
+	"""pdf rasterized by pypdfium2, labels read from the sidecar if any"""
+
+	def __init__(self, path):
+		import pypdfium2 # optional, only for rendering off a Mac
+		import sidecar
+		self.pdf = pypdfium2.PdfDocument(path)
+		self.page_count = len(self.pdf)
+		try:
+			records = sidecar.load(path)
+		except (IOError, OSError):
+			records = None
+		self.labels = [record["label"] for record in records or []]
+
+	def label(self, page_number):
+		if len(self.labels) == self.page_count:
+			return self.labels[page_number]
+		return Document.label(self, page_number)
+
+	def size(self, page_number):
+		return tuple(self.pdf[page_number].get_size())
+
+	def render(self, page_number, size, transform):
+		"""pdfium renders at a uniform scale: transforms other than a zoom
+		and a shift raise ValueError"""
+		m11, m12, m21, m22, tx, ty = transform or IDENTITY
+		if m12 or m21 or m11 != m22 or m11 <= 0:
+			raise ValueError("unsupported transform %s" % (transform,))
+		w, h = self.size(page_number)
+		scale = size[0]/w
+		bitmap = self.pdf[page_number].render(scale=scale*m11,
+		                                      rev_byteorder=True, prefer_bgrx=True)
+		page = Raster(bitmap.width, bitmap.height, WHITE)
+		data, stride, row_size = bitmap.buffer, bitmap.stride, 4*bitmap.width
+		for row in range(bitmap.height):
+			page.pixels[row*row_size:(row+1)*row_size] = data[row*stride:row*stride+row_size]
+		page.pixels[3::4] = b"\xff" * (bitmap.width*bitmap.height) # rgbx to rgba
+		image = Raster(size[0], size[1], WHITE)
+		image.draw(page, (scale*tx, size[1]/h*ty))
+		return image, len(image)
+
+
+def open_document(spec):
+	"""headless document from "synthetic:<pages>" or the path of a pdf"""
+	kind, _, value = spec.partition(":")
+	if kind == "synthetic":
+		return StubDocument.uniform(int(value))
+	return PdfiumDocument(spec)
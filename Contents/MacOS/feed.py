@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Message feed for the ticker of the presentation tool
+
+Lines are read off the ui thread, from any number of sources served by one
+asyncio loop, and put in a bounded queue that the ticker only dequeues from.
+Sources are given as:
+	stdin               standard input
+	unix:<path>         unix domain socket, one message per line
+	fifo:<path>         named pipe (created if needed), one message per line
+	http:[<host>:]<port>
+	                    local http endpoint, each line of a POST body is a
+	                    message (host defaults to 127.0.0.1)
+
+When the queue is full, the overflow policy decides what happens to new
+messages:
+	drop-oldest  the oldest queued message is dropped
+	coalesce     the new message is appended to the newest queued one
+	rate-limit   messages beyond a steady rate are dropped (queue full or not)
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import threading
+import time
+import asyncio
+
+from collections import deque
+
+
+# constants ##################################################################
+
+DROP_OLDEST, COALESCE, RATE_LIMIT = POLICIES = "drop-oldest", "coalesce", "rate-limit"
+
+DEFAULT_SIZE   = 100 # messages
+DEFAULT_POLICY = DROP_OLDEST
+DEFAULT_RATE   = 2.  # messages per second accepted by rate-limit
+DEFAULT_BURST  = 10  # messages accepted at once by rate-limit
+
+COALESCE_SEPARATOR = "  •  "
+
+LOCALHOST = "127.0.0.1"
+MAX_BODY = 1 << 16 # bytes accepted in a http POST
+
+
+# queue ######################################################################
+
+class FeedQueue(object):
+	def __init__(self, size=DEFAULT_SIZE, policy=DEFAULT_POLICY,
+	             rate=DEFAULT_RATE, burst=DEFAULT_BURST, clock=time.monotonic):
+		if policy not in POLICIES:
+			raise ValueError("unknown feed policy '%s'" % policy)
+		if size < 1:
+			raise ValueError("feed size must be at least 1")
+		self.size = size
+		self.policy = policy
+		self.rate, self.burst = rate, burst
+		self.clock = clock
+
+		self.messages = deque()
+		self.lock = threading.Lock()
+		self.received = self.dropped = self.coalesced = 0
+
+		self.tokens = float(burst)
+		self.last_refill = clock()
+
+	def __len__(self):
+		return len(self.messages)
+
+	def put(self, message):
+		"""queue message, returns False if it has been dropped"""
+		with self.lock:
+			self.received += 1
+			if self.policy == RATE_LIMIT and not self._take_token():
+				self.dropped += 1
+				return False
+			if len(self.messages) < self.size:
+				self.messages.append(message)
+				return True
+			if self.policy == COALESCE:
+				self.messages[-1] += COALESCE_SEPARATOR + message
+				self.coalesced += 1
+				return True
+			self.dropped += 1
+			if self.policy == DROP_OLDEST:
+				self.messages.popleft()
+				self.messages.append(message)
+				return True
+			return False # rate-limit with a full queue
+
+	def _take_token(self):
+		now = self.clock()
+		self.tokens = min(self.burst, self.tokens + (now-self.last_refill)*self.rate)
+		self.last_refill = now
+		if self.tokens < 1.:
+			return False
+		self.tokens -= 1.
+		return True
+
+	def get(self):
+		"""oldest queued message, None if there is none"""
+		with self.lock:
+			if self.messages:
+				return self.messages.popleft()
+
+	def stats(self):
+		return dict(depth=len(self.messages), received=self.received,
+		            dropped=self.dropped, coalesced=self.coalesced)
+
+
+# sources ####################################################################
+
+def decode(line):
+	if isinstance(line, bytes):
+		line = line.decode("utf-8", "replace")
+	return line.rstrip()
+
+
+async def read_lines(reader, queue):
+	while True:
+		try:
+			line = await reader.readline()
+		except (ValueError, ConnectionError): # line too long or peer reset
+			break
+		if not line: # end of file
+			break
+		queue.put(decode(line))
+
+
+def pipe_reader(loop, stream):
+	"""asyncio stream reader connected to a pipe-like stream"""
+	reader = asyncio.StreamReader()
+	protocol = asyncio.StreamReaderProtocol(reader)
+	return reader, loop.connect_read_pipe(lambda: protocol, stream)
+
+
+class Source(object):
+	connections = 0
+
+	async def serve(self, queue, loop):
+		raise NotImplementedError
+
+	async def handle(self, reader, writer):
+		self.connections += 1
+		try:
+			await read_lines(reader, self.queue)
+		finally:
+			writer.close()
+
+
+class StdinSource(Source):
+	def __init__(self, stream=None):
+		self.stream = stream # sys.stdin at serving time if None
+
+	def __str__(self):
+		return "stdin"
+
+	async def serve(self, queue, loop):
+		self.connections += 1
+		stream = self.stream or sys.stdin
+		reader, connect = pipe_reader(loop, stream)
+		try:
+			await connect
+		except ValueError: # regular file, cannot be polled
+			while True:
+				line = await loop.run_in_executor(None, stream.readline)
+				if not line:
+					break
+				queue.put(decode(line))
+			return
+		await read_lines(reader, queue)
+
+
+class UnixSource(Source):
+	def __init__(self, path):
+		self.path = path
+
+	def __str__(self):
+		return "unix:%s" % self.path
+
+	async def serve(self, queue, loop):
+		self.queue = queue
+		if os.path.exists(self.path): # left over by a previous run
+			os.unlink(self.path)
+		self.server = await asyncio.start_unix_server(self.handle, self.path)
+
+
+class FifoSource(Source):
+	def __init__(self, path):
+		self.path = path
+
+	def __str__(self):
+		return "fifo:%s" % self.path
+
+	async def serve(self, queue, loop):
+		if not os.path.exists(self.path):
+			os.mkfifo(self.path)
+		fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+		# keep a writer open, otherwise each writer closing would be an eof
+		self.keep_open = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+		reader, connect = pipe_reader(loop, os.fdopen(fd, "rb", 0))
+		await connect
+		self.connections += 1
+		await read_lines(reader, queue)
+
+
+class HttpSource(Source):
+	def __init__(self, port, host=LOCALHOST):
+		self.host, self.port = host, port
+
+	def __str__(self):
+		return "http:%s:%s" % (self.host, self.port)
+
+	async def serve(self, queue, loop):
+		self.queue = queue
+		self.server = await asyncio.start_server(self.handle, self.host, self.port)
+
+	async def handle(self, reader, writer):
+		self.connections += 1
+		try:
+			status = await self.respond(reader)
+			writer.write(("HTTP/1.0 %s\r\n"
+			              "Content-Length: 0\r\n"
+			              "Connection: close\r\n\r\n" % status).encode("ascii"))
+			await writer.drain()
+		except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+			pass
+		finally:
+			writer.close()
+
+	async def respond(self, reader):
+		request = (await reader.readline()).split()
+		length = 0
+		while True:
+			header = await reader.readline()
+			if header.strip() == b"":
+				break
+			name, _, value = header.partition(b":")
+			if name.strip().lower() == b"content-length":
+				length = int(value)
+		if not request or request[0] != b"POST":
+			return "405 Method Not Allowed"
+		if length > MAX_BODY:
+			return "413 Payload Too Large"
+		body = await reader.readexactly(length)
+		for line in body.decode("utf-8", "replace").splitlines():
+			if line.strip():
+				self.queue.put(line.rstrip())
+		return "204 No Content"
+
+
+def parse_size(spec):
+	"""queue size from its command line description"""
+	try:
+		size = int(spec)
+	except ValueError:
+		size = 0
+	if size < 1:
+		raise ValueError("invalid feed size '%s'" % spec)
+	return size
+
+
+def parse_source(spec):
+	"""feed source from its command line description"""
+	kind, _, where = spec.partition(":")
+	if kind == "stdin" and not where:
+		return StdinSource()
+	if kind == "unix" and where:
+		return UnixSource(where)
+	if kind == "fifo" and where:
+		return FifoSource(where)
+	if kind == "http" and where:
+		host, _, port = where.rpartition(":")
+		return HttpSource(int(port), host or LOCALHOST)
+	raise ValueError("invalid feed source '%s'" % spec)
+
+
+# server #####################################################################
+
+class FeedServer(object):
+	"""serves all the sources of a queue from one asyncio loop in a thread"""
+
+	def __init__(self, queue, sources):
+		self.queue = queue
+		self.sources = list(sources)
+		self.loop = asyncio.new_event_loop()
+		self.thread = threading.Thread(target=self.run, name="feed")
+		self.thread.daemon = True
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def run(self):
+		asyncio.set_event_loop(self.loop)
+		for source in self.sources:
+			self.loop.create_task(self.serve(source))
+		self.loop.run_forever()
+
+	async def serve(self, source):
+		try:
+			await source.serve(self.queue, self.loop)
+		except (OSError, ValueError) as error:
+			sys.stderr.write("feed source %s failed: %s\n" % (source, error))
+
+	def stop(self):
+		self.loop.call_soon_threadsafe(self.loop.stop)
+
+	def stats(self):
+		stats = self.queue.stats()
+		stats["connections"] = dict((str(source), source.connections)
+		                            for source in self.sources)
+		return stats
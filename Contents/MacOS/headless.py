@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+Headless renderer of the presentation tool
+
+Draws the audience and presenter views of a document backend (see
+document.py) into offscreen rasters, with the same layout and page cache as
+the application, so that frame times can be measured and pixels compared
+without a display. Text is drawn as boxes of its estimated extent.
+
+	headless.py [-p <page>] [-s <width>x<height>] [-o <prefix>] <doc.pdf>|synthetic:<pages>
+
+writes <prefix>-slide.ppm and <prefix>-presenter.ppm and prints their
+checksums and the time taken to draw them.
+"""
+
+
+# imports ####################################################################
+
+import sys
+import time
+import getopt
+
+from cache import PageCache, DEFAULT_BUDGET
+from layout import slide_layout, PresenterLayout
+from document import Raster, IDENTITY, BLACK, WHITE, GRAY, open_document
+
+
+# constants ##################################################################
+
+PRESENTER_SIZE = (1024, 768)
+AUDIENCE_SIZE  = (1024, 768)
+
+TEXT_ASPECT = .55 # mean glyph width in font size
+NEXT_PAGE_SHADE = (64, 64, 64, 64)
+
+
+# rendering ##################################################################
+
+def text_extent(text, font_size):
+	lines = text.split("\n") if text else []
+	return (max([len(line) for line in lines] or [0]) * font_size * TEXT_ASPECT,
+	        len(lines) * font_size * 1.2)
+
+
+class HeadlessRenderer(object):
+	def __init__(self, document, budget=DEFAULT_BUDGET, prefetch=True):
+		self.document = document
+		self.cache = PageCache(document.render, budget)
+		self.prefetch = prefetch
+
+	def draw_page(self, raster, page_number, placement, transform=IDENTITY):
+		x, y, r = placement
+		w, h = self.document.size(page_number)
+		size = int(round(w*r)), int(round(h*r))
+		raster.draw(self.cache.get(page_number, size, transform), (x, y))
+		if self.prefetch:
+			self.cache.prefetch(page_number, size, transform,
+			                    0, self.document.page_count-1)
+		return (x, y), (w*r, h*r)
+
+	def draw_text(self, raster, text, origin, font_size, color=WHITE):
+		raster.fill((origin, text_extent(text, font_size)), color)
+
+	def render_slide(self, page_number, view_size=AUDIENCE_SIZE, transform=IDENTITY):
+		"""the audience view"""
+		raster = Raster(view_size[0], view_size[1], BLACK)
+		placement = slide_layout(view_size, self.document.size(page_number))
+		self.draw_page(raster, page_number, placement, transform)
+		return raster
+
+	def render_presenter(self, page_number, view_size=PRESENTER_SIZE,
+	                     transform=IDENTITY, window_present=False,
+	                     notes=(), clock="00:00:00"):
+		"""the presenter view: current and next page, clock, page number, notes"""
+		document = self.document
+		layout = PresenterLayout(view_size, window_present)
+		raster = Raster(view_size[0], view_size[1], BLACK)
+
+		page_size = document.size(page_number)
+		page_rect = self.draw_page(raster, page_number,
+		                           layout.current(page_size), transform)
+		if window_present:
+			return raster
+		raster.frame(page_rect, GRAY)
+
+		tw, _ = text_extent(clock, layout.clock_font_size)
+		self.draw_text(raster, clock, layout.clock_origin(tw), layout.clock_font_size)
+		self.draw_text(raster, "%s/%s (%s/%s)" % (
+			document.label(page_number), document.label(document.page_count-1),
+			page_number+1, document.page_count),
+			layout.page_number_origin, layout.font_size)
+		self.draw_text(raster, "\n".join(notes), layout.notes_origin,
+		               layout.notes_font_size)
+
+		if page_number+1 < document.page_count:
+			next_rect = self.draw_page(raster, page_number+1,
+			                           layout.next(document.size(page_number+1)))
+			raster.blend(next_rect, NEXT_PAGE_SHADE)
+		return raster
+
+
+# command line ###############################################################
+
+def main(args):
+	try:
+		options, args = getopt.getopt(args, "p:s:o:")
+	except getopt.GetoptError as error:
+		sys.stderr.write("%s\n%s" % (error, __doc__))
+		return 1
+	if len(args) != 1:
+		sys.stderr.write(__doc__)
+		return 1
+	page_number, prefix = 0, "headless"
+	size = PRESENTER_SIZE
+	for option, value in options:
+		if option == "-p":
+			page_number = int(value)-1
+		elif option == "-s":
+			size = tuple(int(v) for v in value.split("x"))
+		elif option == "-o":
+			prefix = value
+
+	renderer = HeadlessRenderer(open_document(args[0]), prefetch=False)
+	for name, render in [("slide", renderer.render_slide),
+	                     ("presenter", renderer.render_presenter)]:
+		begin = time.time()
+		raster = render(page_number, size)
+		duration = time.time() - begin
+		path = "%s-%s.ppm" % (prefix, name)
+		with open(path, "wb") as f:
+			f.write(raster.ppm())
+		sys.stdout.write("%s %s %.1fms\n" % (path, raster.checksum(), duration*1000.))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,354 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+Pen annotation files of the presentation tool
+
+Strokes drawn over a pdf are saved next to it (or in the cache directory,
+see sidecar.py) in a compact binary file, valid as long as the pdf has the
+same size and mtime or, failing that, the same content hash. An index of
+the pages with strokes comes first, so that the strokes of a page are only
+decoded when the page is shown, and the pages that were not loaded are
+copied as is when saving. A file holding the strokes of another build of
+the pdf is never overwritten: it is moved aside, with the hash of its pdf in
+its name, and found again if the pdf goes back to that build.
+
+Format (little endian):
+	header  "PINK", version u16, flags u16, pdf size u64, pdf mtime f64,
+	        pdf sha1 20 bytes, page entry count u32
+	entries page u32, offset u64, length u32 (offsets from the file start)
+	pages   stroke count u32, then per stroke: width f32, point count u32,
+	        then the coordinates in 1/64 points, zigzag varints, the first
+	        point absolute and the others as deltas to the previous one,
+	        then if the top bit of the point count is set (pressure), the
+	        widths of the points, encoded like the coordinates
+
+This module is pure python, so that annotations can be read off a Mac:
+
+	inkfile.py show <doc.pdf>|<file.ink>
+	inkfile.py json <doc.pdf>|<file.ink>
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import glob
+import json
+import struct
+import threading
+
+from array import array
+
+import sidecar
+from strokes import Stroke
+
+
+# constants ##################################################################
+
+MAGIC = b"PINK"
+VERSION = 1
+EXTENSION = "ink"
+QUANTUM = 64. # steps per point
+
+HEADER = struct.Struct("<4sHHQd20sI")
+ENTRY  = struct.Struct("<IQI")
+COUNT  = struct.Struct("<I")
+STROKE = struct.Struct("<fI")
+WIDTHS = 1 << 31 # point count flag
+
+
+# encoding ###################################################################
+
+def _write_varint(out, value):
+	value = (value << 1) if value >= 0 else ((-value << 1) - 1) # zigzag
+	while value >= 0x80:
+		out.append((value & 0x7f) | 0x80)
+		value >>= 7
+	out.append(value)
+
+
+def _write_values(out, values):
+	previous = 0
+	for value in values:
+		value = int(round(value*QUANTUM))
+		_write_varint(out, value - previous)
+		previous = value
+
+
+def encode_page(strokes):
+	"""binary block of the strokes of a page"""
+	out = bytearray(COUNT.pack(len(strokes)))
+	for stroke in strokes:
+		flags = WIDTHS if stroke.widths is not None else 0
+		out += STROKE.pack(stroke.width, len(stroke) | flags)
+		_write_values(out, stroke.points)
+		if flags:
+			_write_values(out, stroke.widths)
+	return bytes(out)
+
+
+def _read_values(data, offset, count):
+	"""count values from offset, and the offset after them"""
+	values = array("f")
+	value = 0
+	for _ in range(count):
+		shift = delta = 0
+		while True:
+			byte = data[offset]
+			offset += 1
+			delta |= (byte & 0x7f) << shift
+			if byte < 0x80:
+				break
+			shift += 7
+		value += (delta >> 1) ^ -(delta & 1) # zigzag
+		values.append(value/QUANTUM)
+	return values, offset
+
+
+def decode_page(data):
+	"""strokes of a binary page block"""
+	data = bytearray(data)
+	strokes = []
+	count, = COUNT.unpack_from(data, 0)
+	offset = COUNT.size
+	for _ in range(count):
+		width, points = STROKE.unpack_from(data, offset)
+		offset += STROKE.size
+		values, offset = _read_values(data, offset, 2*(points & ~WIDTHS))
+		widths = None
+		if points & WIDTHS:
+			widths, offset = _read_values(data, offset, points & ~WIDTHS)
+		strokes.append(Stroke(values, width, widths))
+	return strokes
+
+
+# files ######################################################################
+
+class InkFile(object):
+	"""an annotation file, its page blocks read on demand"""
+
+	def __init__(self, path):
+		self.path = path
+		self.file = open(path, "rb") # kept open, still readable once replaced
+		header = self.file.read(HEADER.size)
+		try:
+			(magic, version, _, self.size, self.mtime,
+			 digest, count) = HEADER.unpack(header)
+		except struct.error:
+			raise ValueError("truncated annotation file '%s'" % path)
+		if magic != MAGIC or version != VERSION:
+			raise ValueError("not an annotation file '%s'" % path)
+		self.hash = "".join("%02x" % byte for byte in bytearray(digest))
+		entries = self.file.read(ENTRY.size*count)
+		self.entries = {}
+		for i in range(count):
+			page, offset, length = ENTRY.unpack_from(entries, i*ENTRY.size)
+			self.entries[page] = offset, length
+		self.lock = threading.Lock()
+
+	def pages(self):
+		return sorted(self.entries)
+
+	def raw(self, page):
+		"""binary block of page, None if it has no strokes"""
+		if page not in self.entries:
+			return None
+		offset, length = self.entries[page]
+		with self.lock:
+			self.file.seek(offset)
+			return self.file.read(length)
+
+	def strokes(self, page):
+		data = self.raw(page)
+		return decode_page(data) if data else []
+
+	def close(self):
+		self.file.close()
+
+
+def stale_path(path, digest):
+	"""where the annotation file at path is kept once its pdf is rebuilt"""
+	root, extension = os.path.splitext(path)
+	return "%s.%s%s" % (root, digest[:12], extension)
+
+
+def stale_paths(pdf_path):
+	"""annotation files kept from other builds of pdf_path"""
+	paths = []
+	for path in sidecar.sidecar_paths(pdf_path, EXTENSION):
+		root, extension = os.path.splitext(path)
+		paths.extend(sorted(glob.glob("%s.*%s" % (glob.escape(root), extension))))
+	return paths
+
+
+def find(pdf_path):
+	"""annotation file of pdf_path if there is a valid one (possibly one kept
+	from an earlier build), else None"""
+	for path in sidecar.sidecar_paths(pdf_path, EXTENSION) + stale_paths(pdf_path):
+		try:
+			ink = InkFile(path)
+		except (IOError, OSError, ValueError):
+			continue
+		if sidecar.valid(pdf_path, ink.size, ink.mtime, ink.hash):
+			return ink
+		ink.close()
+	return None
+
+
+def save(pdf_path, pages, source=None, digest=None, replaces=()):
+	"""save strokes (page -> list of strokes) of pdf_path, the pages of source
+	(an InkFile) that are not in pages being kept, returns the file path
+
+	a file saved for another pdf hash is moved aside (see stale_path) unless
+	that hash is in replaces, its strokes being in pages already"""
+	stat = os.stat(pdf_path)
+	blocks = dict((page, encode_page(strokes))
+	              for page, strokes in pages.items() if strokes)
+	if source is not None:
+		for page in source.pages():
+			if page not in pages:
+				blocks[page] = source.raw(page)
+	digest = digest or sidecar.content_hash(pdf_path)
+
+	out = bytearray(HEADER.pack(MAGIC, VERSION, 0, stat.st_size, stat.st_mtime,
+	                            bytes(bytearray.fromhex(digest)), len(blocks)))
+	offset = HEADER.size + ENTRY.size*len(blocks)
+	for page in sorted(blocks):
+		out += ENTRY.pack(page, offset, len(blocks[page]))
+		offset += len(blocks[page])
+	for page in sorted(blocks):
+		out += blocks[page]
+
+	for path in sidecar.sidecar_paths(pdf_path, EXTENSION):
+		try:
+			_keep_stale(path, digest, replaces)
+			sidecar.write_atomic(path, out, binary=True)
+		except (IOError, OSError):
+			continue
+		return path
+
+
+def _keep_stale(path, digest, replaces):
+	try:
+		ink = InkFile(path)
+	except (IOError, OSError, ValueError): # none, or not ours to keep
+		return
+	ink.close()
+	if ink.hash != digest and ink.hash not in replaces:
+		os.rename(path, stale_path(path, ink.hash))
+
+
+class Writer(object):
+	"""saves the latest snapshot of the strokes in a background thread,
+	snapshots given while one is being written are coalesced
+
+	nothing is written before attach() tells which file (if any) the pages
+	that were not loaded come from"""
+
+	def __init__(self, pdf_path, error=None):
+		self.pdf_path = pdf_path
+		self.source = None
+		self.attached = threading.Event()
+		self.error = error or (lambda error: None)
+		self.snapshot = None
+		self.busy = False
+		self.saves = 0
+		self.digest = None # content hash, for the (size, mtime) it was read at
+		self.replaces = set() # pdf hashes of the files whose strokes are ours
+		self.condition = threading.Condition()
+		self.thread = threading.Thread(target=self.run, name="ink")
+		self.thread.daemon = True
+		self.thread.start()
+
+	def attach(self, source):
+		self.source = source
+		if source is not None:
+			self.replaces.add(source.hash)
+		self.attached.set()
+
+	def save(self, snapshot):
+		with self.condition:
+			self.snapshot = snapshot
+			self.condition.notify_all()
+
+	def run(self):
+		self.attached.wait()
+		while True:
+			with self.condition:
+				while self.snapshot is None:
+					self.condition.wait()
+				snapshot, self.snapshot = self.snapshot, None
+				self.busy = True
+			try:
+				stat = os.stat(self.pdf_path)
+				stamp = stat.st_size, stat.st_mtime
+				if self.digest is None or self.digest[0] != stamp:
+					self.digest = stamp, sidecar.content_hash(self.pdf_path)
+				save(self.pdf_path, snapshot, self.source, self.digest[1], self.replaces)
+				self.replaces.add(self.digest[1])
+				self.saves += 1
+			except (IOError, OSError) as error:
+				self.error(error)
+			with self.condition:
+				self.busy = False
+				self.condition.notify_all()
+
+	def flush(self, timeout=None):
+		"""wait until the last snapshot is written"""
+		with self.condition:
+			return self.condition.wait_for(
+				lambda: self.snapshot is None and not self.busy, timeout)
+
+
+# command line ###############################################################
+
+def open_ink(path):
+	if path.endswith("." + EXTENSION):
+		return InkFile(path)
+	return find(path)
+
+
+def stroke_json(stroke):
+	data = {"width": stroke.width, "points": list(stroke)}
+	if stroke.widths is not None:
+		data["widths"] = list(stroke.widths)
+	return data
+
+
+def main(args):
+	if len(args) != 2 or args[0] not in ("show", "json"):
+		sys.stderr.write(__doc__)
+		return 1
+	command, path = args
+	try:
+		ink = open_ink(path)
+	except (IOError, OSError, ValueError) as error:
+		sys.stderr.write("%s\n" % error)
+		return 1
+	if ink is None:
+		sys.stderr.write("no valid annotations for '%s'\n" % path)
+		for stale in stale_paths(path):
+			sys.stderr.write("kept from another build: %s\n" % stale)
+		return 1
+	if command == "json":
+		json.dump({
+			"hash":  ink.hash,
+			"pages": dict((str(page), [stroke_json(stroke) for stroke in ink.strokes(page)])
+			              for page in ink.pages()),
+		}, sys.stdout, separators=(",", ":"))
+		sys.stdout.write("\n")
+		return 0
+	sys.stdout.write("%s: %s pages annotated, pdf hash %s\n" % (
+		ink.path, len(ink.entries), ink.hash))
+	for page in ink.pages():
+		strokes = ink.strokes(page)
+		sys.stdout.write("%5s %4s strokes %6s points\n" % (
+			page, len(strokes), sum(len(stroke) for stroke in strokes)))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Hot path instrumentation for the presentation tool
+
+Views time the phases of their drawing through frames:
+
+	frame = instruments.frame("presenter")
+	... draw the page
+	frame.phase("page")
+	... draw the clock
+	frame.phase("clock")
+	frame.end()
+
+and events are counted with count(name). Durations are kept over a rolling
+window, reported as p50/p99/max in milliseconds. Other components register
+gauges, functions returning their own stats (cache hits, redraws, feed queue
+depth, ...), that are only called when a report is made.
+
+When disabled, frame() returns a shared frame that does nothing and
+count() returns at once, so instrumented code pays a call and no clock read.
+"""
+
+
+# imports ####################################################################
+
+import json
+import time
+
+from collections import OrderedDict, deque, defaultdict
+
+
+# constants ##################################################################
+
+WINDOW = 200 # durations kept per timing
+
+
+# frames #####################################################################
+
+class Frame(object):
+	def __init__(self, instruments, name):
+		self.instruments = instruments
+		self.name = name
+		self.begin = self.last = instruments.clock()
+
+	def phase(self, name):
+		"""record the time since the previous phase (or the frame start)"""
+		now = self.instruments.clock()
+		self.instruments.record("%s.%s" % (self.name, name), now-self.last)
+		self.last = now
+
+	def end(self):
+		self.instruments.record(self.name, self.instruments.clock()-self.begin)
+
+
+class NullFrame(object):
+	def phase(self, name):
+		pass
+
+	def end(self):
+		pass
+
+NULL_FRAME = NullFrame()
+
+
+# instruments ################################################################
+
+def percentile(values, fraction):
+	"""nearest rank percentile of sorted values"""
+	if not values:
+		return 0.
+	return values[min(int(fraction*len(values)), len(values)-1)]
+
+
+class Instruments(object):
+	def __init__(self, enabled=False, window=WINDOW, clock=time.perf_counter):
+		self.enabled = enabled
+		self.window = window
+		self.clock = clock
+		self.timings = OrderedDict() # name -> recent durations
+		self.counters = defaultdict(int)
+		self.gauges = OrderedDict()  # name -> function returning stats
+
+	def frame(self, name):
+		if not self.enabled:
+			return NULL_FRAME
+		return Frame(self, name)
+
+	def record(self, name, duration):
+		timing = self.timings.get(name)
+		if timing is None:
+			timing = self.timings[name] = deque(maxlen=self.window)
+		timing.append(duration)
+
+	def count(self, name, n=1):
+		if self.enabled:
+			self.counters[name] += n
+
+	def gauge(self, name, function):
+		self.gauges[name] = function
+
+	def reset(self):
+		self.timings.clear()
+		self.counters.clear()
+
+	def report(self):
+		timings = OrderedDict()
+		for name, durations in self.timings.items():
+			durations = sorted(durations)
+			timings[name] = dict(
+				count=len(durations),
+				p50=percentile(durations, .5)*1000.,
+				p99=percentile(durations, .99)*1000.,
+				max=durations[-1]*1000. if durations else 0.,
+			)
+		return dict(
+			enabled=self.enabled,
+			timings=timings,
+			counters=dict(self.counters),
+			gauges=OrderedDict((name, function())
+			                   for name, function in self.gauges.items()),
+		)
+
+	def lines(self):
+		"""report as text, one timing, counter or gauge per line"""
+		report = self.report()
+		lines = ["%-22s %7.2f %7.2f %7.2f ms" % (name, t["p50"], t["p99"], t["max"])
+		         for name, t in report["timings"].items()]
+		if lines:
+			lines.insert(0, "%-22s %7s %7s %7s" % ("", "p50", "p99", "max"))
+		lines.extend("%-22s %s" % item for item in sorted(report["counters"].items()))
+		for name, stats in report["gauges"].items():
+			lines.append("%-22s %s" % (name, format_stats(stats)))
+		return lines
+
+	def dump(self, path):
+		"""write the report as json to path"""
+		with open(path, "w") as f:
+			json.dump(self.report(), f, indent=1)
+		return path
+
+
+def format_stats(stats):
+	if not isinstance(stats, dict):
+		return str(stats)
+	return " ".join("%s=%s" % (key, "%.3g" % value if isinstance(value, float)
+	                                else format_stats(value))
+	                for key, value in sorted(stats.items()))
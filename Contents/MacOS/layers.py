@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Prerendered layers for the presentation tool
+
+Text that only changes with the presentation state (help table, notes, page
+numbers) is rendered once per state into an image by render(key), the key
+holding everything the rendering depends on, and later frames only draw the
+image. Backend agnostic, least recently used layers are dropped.
+"""
+
+
+# imports ####################################################################
+
+from collections import OrderedDict
+
+
+# constants ##################################################################
+
+DEFAULT_SIZE = 64 # layers kept
+
+
+# layer cache ################################################################
+
+class LayerCache(object):
+	def __init__(self, render, size=DEFAULT_SIZE):
+		self.render = render
+		self.size = size
+		self.layers = OrderedDict()
+		self.hits = self.misses = 0
+
+	def __len__(self):
+		return len(self.layers)
+
+	def get(self, key):
+		"""layer for key, rendered if it is not cached"""
+		if key in self.layers:
+			self.layers.move_to_end(key)
+			self.hits += 1
+			return self.layers[key]
+		self.misses += 1
+		layer = self.layers[key] = self.render(key)
+		while len(self.layers) > self.size:
+			self.layers.popitem(last=False)
+		return layer
+
+	def clear(self):
+		self.layers.clear()
+
+	def stats(self):
+		return dict(layers=len(self.layers), hits=self.hits, misses=self.misses)
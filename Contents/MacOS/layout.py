@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Layout of the audience and presenter views of the presentation tool
+
+Pure geometry in view coordinates (origin at the bottom left, y up), shared
+by the Cocoa views and the headless renderer. Pages are placed by an origin
+and a scale: page point (px, py) is drawn at (x + r*px, y + r*py).
+"""
+
+
+# audience ###################################################################
+
+def slide_layout(view_size, page_size):
+	"""origin and scale of a page centered and fitted in the view"""
+	width, height = view_size
+	w, h = page_size
+	r = min(width/w, height/h)
+	return (width-w*r)/2., (height-h*r)/2., r
+
+
+# presenter ##################################################################
+
+class PresenterLayout(object):
+	def __init__(self, view_size, window_present=False):
+		self.width, self.height = width, height = view_size
+		self.margin = margin = width / 40.
+		if window_present:
+			self.current_width = width-2*margin
+		else:
+			self.current_width = (width-3*margin)*2/3.
+		self.font_size = margin
+		self.notes_font_size = margin*.6
+		self.clock_font_size = margin*1.5
+
+		self.page_number_origin = (margin*1.5+self.current_width, height-1.4*margin)
+		self.notes_origin = (margin, 0.)
+		self.help_origin = (2*margin+self.current_width, 0.)
+
+	def current(self, page_size):
+		"""origin and scale of the current page, top left"""
+		w, h = page_size
+		r = self.current_width/w
+		return self.margin, self.height-self.margin-h*r, r
+
+	def next(self, page_size):
+		"""origin and scale of the next page, half size on the right"""
+		w, h = page_size
+		r = self.current_width/2./w
+		return 2*self.margin+self.current_width, self.height-2.5*self.margin-h*r, r
+
+	def clock_origin(self, text_width):
+		return self.width-self.margin-text_width, self.height-2.*self.margin
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Overview grid of the presentation tool
+
+The overview shows a thumbnail per frame (its last page, overlays complete)
+in a grid scrolled vertically. GridLayout places the tiles and maps points
+back to them, in view coordinates (origin at the bottom left, y up), in
+constant time whatever the deck size. ThumbnailCache renders thumbnails on
+a pool of worker threads, the visible tiles first, and keeps them within a
+memory budget. Backend agnostic: thumbnails are produced by a render(page,
+size) callable returning an (image, cost) pair, as for cache.PageCache.
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import threading
+
+from collections import OrderedDict
+
+from cache import MB
+
+
+# constants ##################################################################
+
+DEFAULT_COLUMNS = 6
+GAP = 12.          # points between tiles
+LABEL_HEIGHT = 14. # points below each tile for its label
+AHEAD_ROWS = 2     # rows rendered past the visible ones, in scroll order
+
+DEFAULT_BUDGET = 64 * MB
+DEFAULT_WORKERS = max(min((os.cpu_count() or 1) - 1, 4), 1)
+
+
+# layout #####################################################################
+
+class GridLayout(object):
+	"""tiles of count thumbnails of page_size proportions in a view of
+	view_size, scroll being the distance (in points) from the top"""
+
+	def __init__(self, count, view_size, page_size, columns=DEFAULT_COLUMNS):
+		self.count = count
+		self.columns = columns
+		self.view_width, self.view_height = view_size
+		pw, ph = page_size
+		self.tile_width = max((self.view_width - GAP*(columns+1))/columns, 1.)
+		self.tile_height = self.tile_width*ph/pw
+		self.row_height = self.tile_height + LABEL_HEIGHT + GAP
+		self.rows = (count + columns - 1)//columns
+		self.height = GAP + self.rows*self.row_height
+
+	def clamp_scroll(self, scroll):
+		return max(0., min(scroll, self.height - self.view_height))
+
+	def tile_rect(self, i, scroll):
+		"""((x, y), (w, h)) of the thumbnail of tile i"""
+		row, column = divmod(i, self.columns)
+		x = GAP + column*(self.tile_width + GAP)
+		top = GAP + row*self.row_height - scroll
+		return (x, self.view_height - top - self.tile_height), (self.tile_width, self.tile_height)
+
+	def label_origin(self, i, scroll):
+		(x, y), _ = self.tile_rect(i, scroll)
+		return x, y - LABEL_HEIGHT
+
+	def visible(self, scroll, ahead=0):
+		"""range of the tiles in view, and ahead rows past it"""
+		first = max(int((scroll - GAP)//self.row_height), 0)
+		last = int((scroll + self.view_height)//self.row_height) + ahead
+		return range(first*self.columns, min((last+1)*self.columns, self.count))
+
+	def index_at(self, point, scroll):
+		"""tile under point, None if none is"""
+		x, y = point
+		top = self.view_height - y + scroll - GAP
+		if top < 0 or x < GAP:
+			return None
+		row, dy = divmod(top, self.row_height)
+		column, dx = divmod(x - GAP, self.tile_width + GAP)
+		if dy > self.tile_height + LABEL_HEIGHT or dx > self.tile_width or column >= self.columns:
+			return None
+		i = int(row)*self.columns + int(column)
+		return i if i < self.count else None
+
+	def scroll_to(self, i, scroll):
+		"""scroll showing tile i, moving as little as possible"""
+		top = GAP + (i//self.columns)*self.row_height
+		bottom = top + self.tile_height + LABEL_HEIGHT + GAP
+		if top - GAP < scroll:
+			scroll = top - GAP
+		elif bottom > scroll + self.view_height:
+			scroll = bottom - self.view_height
+		return self.clamp_scroll(scroll)
+
+	def move(self, i, dx, dy):
+		"""tile dx columns right and dy rows down of i, within the grid"""
+		j = i + dx + dy*self.columns
+		if dy and not 0 <= j < self.count:
+			return i
+		return max(0, min(j, self.count-1))
+
+
+def priority(visible, ahead, current=None):
+	"""pages of the tiles in rendering order: the visible ones (from the
+	selected one outwards), then the ones ahead"""
+	visible = list(visible)
+	if current in visible:
+		visible.sort(key=lambda i: abs(i - current))
+	return visible + [i for i in ahead if i not in set(visible)]
+
+
+# thumbnails #################################################################
+
+class ThumbnailCache(object):
+	"""thumbnails rendered in the background, done(page) being called (from
+	a worker thread) when one is ready"""
+
+	def __init__(self, render, budget=DEFAULT_BUDGET, workers=DEFAULT_WORKERS, done=None):
+		self.render = render
+		self.budget = budget
+		self.worker_count = workers
+		self.done = done or (lambda page: None)
+
+		self.images = OrderedDict() # (page, size) -> (image, cost)
+		self.used = 0
+		self.hits = self.misses = self.evictions = self.rendered = 0
+
+		self.lock = threading.Lock()
+		self.wakeup = threading.Condition(self.lock)
+		self.generation = 0 # bumped when the rendered document changes
+		self.pending = []   # keys to render, most urgent first
+		self.rendering = set()
+		self.workers = []
+
+	def __len__(self):
+		return len(self.images)
+
+	def get(self, page, size):
+		"""thumbnail of page if it is ready, else None (request it first)"""
+		key = page, tuple(size)
+		with self.lock:
+			if key in self.images:
+				self.images.move_to_end(key)
+				self.hits += 1
+				image, _ = self.images[key]
+				return image
+			self.misses += 1
+			return None
+
+	def request(self, pages, size):
+		"""render the thumbnails of pages (most urgent first) that are not
+		ready, replacing the previous requests"""
+		size = tuple(size)
+		with self.lock:
+			self.pending = [(page, size) for page in pages
+			                if (page, size) not in self.images
+			                and (page, size) not in self.rendering]
+			# the requested thumbnails are kept over older ones
+			for page in reversed(pages):
+				if (page, size) in self.images:
+					self.images.move_to_end((page, size))
+			if self.pending:
+				while len(self.workers) < self.worker_count:
+					worker = threading.Thread(target=self._work, name="thumbnails")
+					worker.daemon = True
+					worker.start()
+					self.workers.append(worker)
+				self.wakeup.notify_all()
+
+	def _work(self):
+		while True:
+			with self.lock:
+				while not self.pending:
+					self.wakeup.wait()
+				key = self.pending.pop(0)
+				self.rendering.add(key)
+				generation = self.generation
+			image = None
+			try:
+				image, cost = self.render(*key)
+			except Exception as error: # requested again when next shown
+				sys.stderr.write("thumbnail of page %s failed: %s\n" % (key[0], error))
+			finally:
+				with self.lock:
+					self.rendering.discard(key)
+					if image is not None and generation == self.generation:
+						self.images[key] = image, cost
+						self.used += cost
+						self.rendered += 1
+						self._evict()
+					else:
+						image = None
+					self.wakeup.notify_all() # for wait()
+			if image is not None:
+				self.done(key[0])
+
+	def _evict(self):
+		while self.used > self.budget and len(self.images) > 1:
+			_, (_, cost) = self.images.popitem(last=False)
+			self.used -= cost
+			self.evictions += 1
+
+	def wait(self, timeout=None):
+		"""wait until nothing is left to render"""
+		with self.lock:
+			return self.wakeup.wait_for(
+				lambda: not self.pending and not self.rendering, timeout)
+
+	def invalidate(self):
+		with self.lock:
+			self.images.clear()
+			self.used = 0
+			self.pending = []
+			self.generation += 1
+
+	def stats(self):
+		return dict(
+			images=len(self.images), used=self.used, budget=self.budget,
+			hits=self.hits, misses=self.misses, evictions=self.evictions,
+			rendered=self.rendered, pending=len(self.pending),
+		)
@@ -0,0 +1,260 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+Shared page image store of the presentation tool
+
+The presenter and audience views show the same pages at different sizes
+(current page in both windows, next page at half width in the presenter
+window). Instead of rasterizing a page once per size, the store renders it
+once, at the largest width recently asked for with the same transform, and
+derives the smaller sizes from that rendering by downsampling. When images
+can be drawn at any size (Quartz), sizes down to a quarter of its width are
+served by the rendering itself.
+
+Backend agnostic, a drop-in cache.PageCache: images are produced by a
+render(page, size, transform) callable and derived by a downsample(image,
+page, size) one, both returning an (image, cost) pair (see document.py).
+
+	pagestore.py rss [-p <pages>] [-b <budget in MB>] [-m cache|store]
+
+compares the peak memory and the rasterizations of the page cache and of
+the store showing a deck on a 4K audience screen and a 1080p presenter
+screen (each in its own process, unless -m is given). The audience images
+dominate, so the store mostly saves rasterizations, not memory.
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import time
+import getopt
+import resource
+import subprocess
+
+from collections import OrderedDict, deque
+
+from cache import PageCache, MB, DEFAULT_BUDGET, DEFAULT_PREFETCH
+
+
+# constants ##################################################################
+
+MIN_SCALE = .25      # smallest fraction of a rendering width drawn from it (scalable)
+RECENT_REQUESTS = 16 # requests remembered to size the renderings
+
+
+# store ######################################################################
+
+class PageStore(PageCache):
+	"""masters: (page, transform) -> size of the rendering the other sizes
+	of page are derived from"""
+
+	def __init__(self, render, downsample, budget=DEFAULT_BUDGET,
+	             prefetch=DEFAULT_PREFETCH, scalable=False):
+		PageCache.__init__(self, render, budget, prefetch)
+		self.downsample = downsample
+		self.scalable = scalable
+		self.masters = {} # (page, transform) -> size of its largest rendering
+		self.recent = deque(maxlen=RECENT_REQUESTS) # (transform, width)
+		self.rendered = self.derived = 0
+
+	def get(self, page, size, transform=None, exact=False):
+		"""image of page at size, or at a larger size if scalable unless
+		exact, rendering it if not stored"""
+		key = self.key(page, size, transform)
+		with self.lock:
+			self.recent.append((key[2], key[1][0]))
+			image = self._cached(key, exact)
+			if image is not None:
+				self.hits += 1
+				return image
+			self.misses += 1
+			generation = self.generation
+		return self._render(key, generation, exact)
+
+	def _master(self, page, transform):
+		"""size and image of the rendering of page (lock held), or Nones"""
+		master = self.masters.get((page, transform))
+		entry = master and self.images.get((page, master, transform))
+		if entry is None:
+			self.masters.pop((page, transform), None)
+			return None, None
+		self.images.move_to_end((page, master, transform))
+		return master, entry[0]
+
+	def _cached(self, key, exact=False):
+		"""image for key, from the images kept, None if it has to be made"""
+		if key in self.images:
+			self.images.move_to_end(key)
+			return self.images[key][0]
+		page, size, transform = key
+		master, image = self._master(page, transform)
+		if self.scalable and not exact and master and master[0] >= size[0] >= MIN_SCALE*master[0]:
+			return image
+		return None
+
+	def _master_size(self, size, transform):
+		"""size of a new rendering: the largest width recently asked for"""
+		width = max([w for t, w in self.recent if t == transform] + [size[0]])
+		return width, max(int(round(width*size[1]/float(size[0]))), 1)
+
+	def _render(self, key, generation, exact=False):
+		page, size, transform = key
+		with self.lock:
+			image = self._cached(key, exact) # prefetched meanwhile
+			if image is not None:
+				return image
+			master, source = self._master(page, transform)
+			if not master or master[0] < size[0]:
+				source, master = None, self._master_size(size, transform)
+		if source is None:
+			source, cost = self.render(page, master, transform)
+			with self.lock:
+				self.rendered += 1
+				if self._store((page, master, transform), source, cost, generation):
+					self.masters[page, transform] = master
+			if master == size or (self.scalable and not exact and size[0] >= MIN_SCALE*master[0]):
+				return source
+		image, cost = self.downsample(source, page, size)
+		with self.lock:
+			self.derived += 1
+			self._store(key, image, cost, generation)
+		return image
+
+	def _store(self, key, image, cost, generation):
+		"""keep image (lock held), False if it comes from a stale document"""
+		if generation != self.generation:
+			return False
+		if key in self.images:
+			self._drop(key)
+		self.images[key] = image, cost
+		self.used += cost
+		self._evict()
+		return True
+
+	def _drop(self, key):
+		"""forget the image of key (lock held)"""
+		page, size, transform = key
+		_, cost = self.images.pop(key)
+		self.used -= cost
+		if self.masters.get((page, transform)) == size:
+			del self.masters[page, transform]
+
+	def _evict(self):
+		while self.used > self.budget and len(self.images) > 1:
+			self._drop(next(iter(self.images)))
+			self.evictions += 1
+
+	def invalidate(self, pages=None):
+		with self.lock:
+			for key in list(self.images):
+				if pages is None or key[0] in pages:
+					self._drop(key)
+			self.pending.clear()
+			self.generation += 1
+
+	def remap(self, moved):
+		with self.lock:
+			images = OrderedDict()
+			for (page, size, transform), entry in self.images.items():
+				if page in moved:
+					images[moved[page], size, transform] = entry
+			self.masters = dict(((moved[page], transform), size)
+			                    for (page, transform), size in self.masters.items()
+			                    if page in moved)
+			self.images = images
+			self.used = sum(cost for _, cost in images.values())
+			self.pending.clear()
+			self.generation += 1
+
+	def stats(self):
+		stats = PageCache.stats(self)
+		stats.update(rendered=self.rendered, derived=self.derived, masters=len(self.masters))
+		return stats
+
+
+# memory #####################################################################
+
+def rss():
+	"""current and peak resident memory of the process, in bytes"""
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	peak *= 1 if sys.platform == "darwin" else 1024 # kilobytes on linux
+	try:
+		with open("/proc/self/statm") as f:
+			current = int(f.read().split()[1]) * resource.getpagesize()
+	except (IOError, OSError):
+		current = int(subprocess.check_output(
+			["ps", "-o", "rss=", "-p", str(os.getpid())])) * 1024
+	return dict(current=current, peak=peak)
+
+
+# command line ###############################################################
+
+AUDIENCE_SCREEN  = (3840, 2160) # 4K
+PRESENTER_SCREEN = (1920, 1080) # 1080p
+PRESENTER_CURRENT = .6          # width of the current page, in screen widths
+
+MODES = "cache", "store"
+SIMULATION_BUDGET = 1024 * MB # enough to keep the default deck
+
+
+def fit(page_size, screen_size, fraction=1.):
+	"""pixel size of a page fitted in a fraction of a screen width"""
+	(pw, ph), (sw, sh) = page_size, screen_size
+	scale = min(sw*fraction/pw, sh/ph)
+	return int(round(pw*scale)), int(round(ph*scale))
+
+
+def simulate(mode, pages, budget=SIMULATION_BUDGET):
+	"""show pages one after the other in both windows, as the application
+	does, returns stats"""
+	from document import StubDocument, IDENTITY
+	document = StubDocument.uniform(pages+1)
+	page_size = document.size(0)
+	audience = fit(page_size, AUDIENCE_SCREEN)
+	current = fit(page_size, PRESENTER_SCREEN, PRESENTER_CURRENT)
+	following = current[0]//2, current[1]//2
+	if mode == "cache":
+		cache = PageCache(lambda page, size, transform: document.render(page, size, transform), budget)
+	else:
+		cache = PageStore(document.render, document.downsample, budget, scalable=True)
+	start = time.time()
+	for page in range(pages):
+		cache.get(page, audience, IDENTITY)
+		cache.get(page, current, IDENTITY)
+		cache.get(page+1, following, IDENTITY)
+	stats = cache.stats()
+	stats.update(rss(), seconds=round(time.time()-start, 3))
+	return stats
+
+
+def main(args):
+	command = args[:1]
+	try:
+		options, args = getopt.getopt(args[1:], "p:b:m:")
+	except getopt.GetoptError as error:
+		sys.stderr.write("%s\n%s" % (error, __doc__))
+		return 1
+	options = dict(options)
+	if command != ["rss"] or args or options.get("-m", MODES[0]) not in MODES:
+		sys.stderr.write(__doc__)
+		return 1
+	pages = int(options.get("-p", 10))
+	budget = int(options.get("-b", SIMULATION_BUDGET//MB))
+	if "-m" in options:
+		stats = simulate(options["-m"], pages, budget*MB)
+		sys.stdout.write("%s: peak %.1fMB, images %.1fMB, %s rasterized, %s derived in %ss\n" % (
+			options["-m"], stats["peak"]/float(MB), stats["used"]/float(MB),
+			stats.get("rendered", stats["misses"]), stats.get("derived", 0), stats["seconds"]))
+		return 0
+	for mode in MODES: # separate processes, for separate peaks
+		subprocess.check_call([sys.executable, os.path.abspath(__file__),
+		                       "rss", "-p", str(pages), "-b", str(budget), "-m", mode])
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -16,17 +16,42 @@ import sys
 import os
 import re
 import time
-import select
 import getopt
 import textwrap
 import mimetypes
+import threading
 
 from math import exp, hypot
 from collections import defaultdict
+from concurrent.futures import Future
+
+from deck import (DeckIndex, PageTable, is_section_link, walk_next_frame,
+                  walk_prev_frame)
+from cache import DEFAULT_BUDGET, parse_budget
+from pagestore import PageStore, rss
+from redraw import Redraw, segment_rect
+from layout import slide_layout, PresenterLayout
+from document import (QuartzDocument, render_bitmap, update_bitmap, encode_png,
+                      IDENTITY)
+from strokes import (Stroke, PageStrokes, Drawings, inking, segment_bounds, padded,
+                     MAX_POINTS)
+from reload import FileWatcher, match_pages, remap_pages, remap_table, remap_links
+import sidecar
+import feed
+from ticker import Ticker, DEFAULT_FPS, parse_fps
+import control
+import inkfile
+import search
+import stream
+from instrument import Instruments
+from layers import LayerCache
+from overview import GridLayout, ThumbnailCache, priority, AHEAD_ROWS
 
 
 # constants and helpers ######################################################
 
+launch_time = time.time()
+
 NAME = "Présentation"
 MAJOR, MINOR = 1, 2
 VERSION = "%s.%s" % (MAJOR, MINOR)
@@ -47,6 +72,10 @@ MIN_POSTER_HEIGHT = 20.
 
 HELP = [
 	("?",         "show/hide this help"),
+	("i",         "show/hide timings"),
+	("o",         "show/hide overview of the frames"),
+	("/",         "search the slides"),
+	("l",         "show/hide sections"),
 	("h/q",       "hide/quit"),
 	("b/w/m/s/p", "toggle black/web/movie/slide/poll view"),
 	("F5/f/F",     "toggle fullscreen"),
@@ -73,9 +102,14 @@ HELP_SLIDES = [
 #	("⌘→",        "forward"),
 	("↖",         "first page"),
 	("↘",         "last page"),
+	("0-9 ⏎",     "go to slide label"),
+	("#n ⏎",      "go to page n"),
+	("g",         "go to slide label, #page or section"),
 ]
 HELP_ANNOTATIONS = [
 	("e",         "erase on-screen annotations"),
+	("u/U",       "undo/redo last annotation change"),
+	("shift-drag", "erase strokes under the pointer"),
 ]
 #HELP_MOVIE = [
 #	("space",     "play/pause video (while in movie mode)"),
@@ -84,6 +118,17 @@ HELP_ANNOTATIONS = [
 HELP_WEB = [
 	("+/-/0",     "zoom in/out/reset web view"),
 ]
+HELP_SECTIONS = {
+	"keys":        HELP,
+	"clock":       HELP_CLOCK,
+	"timer":       HELP_TIMER,
+	"poll":        HELP_POLL,
+	"slides":      HELP_SLIDES,
+	"annotations": HELP_ANNOTATIONS,
+	"web":         HELP_WEB,
+}
+HELP_FONT_SIZE = 8 # pt
+SECTION_LINES = 24 # sections listed around the current one
 
 def nop(): pass
 
@@ -100,14 +145,43 @@ if launched_from_finder:
 
 def exit_usage(message=None, code=0):
 	usage = textwrap.dedent("""\
-	Usage: %s [-hvid:f] <doc.pdf>
+	Usage: %s [-hvid:fc:] <doc.pdf>
+	       %s --export-tiles <doc.pdf> <dir>
 		-h --help          print this help message then exit
 		-v --version       print version then exit
 		-i --icon          print icon then exit
 		-d --duration <t>  duration of the talk in minutes
 		-f --feed          enable reading feed on stdin
+		   --feed-source <s>
+		                   enable reading feed from s (may be repeated):
+		                   stdin, unix:<path>, fifo:<path>, http:[<host>:]<port>
+		   --feed-size <n> maximum number of queued feed messages
+		   --ticker-fps <f>
+		                   maximum frame rate of the feed ticker
+		   --control <path>
+		                   accept remote control commands on a unix socket
+		   --stream [<host>:]<port>
+		                   mirror the audience window to browsers
+		   --stream-images <dir>
+		                   page images served to the browsers (see stream.py
+		                   export), rendered on demand otherwise
+		   --feed-policy <p>
+		                   what to do with messages when the feed is full
+		                   (%s)
+		-c --cache <m>     memory for rendered pages in megabytes
+		   --cache-rss     report the memory of the process and of the
+		                   rendered pages (shown with the i key, printed
+		                   on quit)
+		   --redraw-stats  print redraw counts per view on quit
+		   --profile-startup
+		                   print time to first slide and to full index
+		   --instrument    time drawing phases (shown with the i key)
+		   --instrument-dump <path>
+		                   write timings and counters as json on quit
+		   --export-tiles  write the pages of doc.pdf as tiles at several
+		                   resolutions in dir (see tiles.py), then exit
 		<doc.pdf>          file to present
-	""" % name)
+	""" % (name, name, ", ".join(feed.POLICIES)))
 	if message:
 		sys.stderr.write("%s\n" % message)
 	sys.stderr.write(usage)
@@ -122,17 +196,39 @@ def exit_icon():
 	sys.stdout.write(base64.b64decode(ICON))
 	sys.exit()
 
+RELOAD_INTERVAL = .5 # seconds between checks for a rebuilt pdf
+
 
 # options
 
 try:
-	options, args = getopt.getopt(args, "hvid:f", ["help", "version", "icon",
-	                                               "duration=", "feed"])
+	options, args = getopt.getopt(args, "hvid:fc:", ["help", "version", "icon",
+	                                                 "duration=", "feed", "cache=", "cache-rss",
+	                                                 "redraw-stats", "profile-startup",
+	                                                 "feed-source=", "feed-size=", "feed-policy=",
+	                                                 "ticker-fps=", "control=",
+	                                                 "stream=", "stream-images=",
+	                                                 "instrument", "instrument-dump=",
+	                                                 "export-tiles"])
 except getopt.GetoptError as message:
 	exit_usage(message, 1)
 
 show_feed = False
+feed_sources = []
+feed_size = feed.DEFAULT_SIZE
+feed_policy = feed.DEFAULT_POLICY
+ticker_fps = DEFAULT_FPS
+control_path = None
+stream_address = None
+stream_images = None
 presentation_duration = 0
+page_cache_budget = DEFAULT_BUDGET
+cache_rss = False
+redraw_stats = False
+profile_startup = False
+instrument = False
+instrument_dump = None
+export_tiles = False
 
 for opt, value in options:
 	if opt in ["-h", "--help"]:
@@ -145,6 +241,61 @@ for opt, value in options:
 		presentation_duration = int(value)
 	elif opt in ["-f", "--feed"]:
 		show_feed = True
+		feed_sources.append(feed.StdinSource())
+	elif opt == "--feed-source":
+		show_feed = True
+		try:
+			feed_sources.append(feed.parse_source(value))
+		except ValueError as message:
+			exit_usage(message, 1)
+	elif opt == "--feed-size":
+		try:
+			feed_size = feed.parse_size(value)
+		except ValueError as message:
+			exit_usage(message, 1)
+	elif opt == "--feed-policy":
+		if value not in feed.POLICIES:
+			exit_usage("unknown feed policy '%s'" % value, 1)
+		feed_policy = value
+	elif opt == "--ticker-fps":
+		try:
+			ticker_fps = parse_fps(value)
+		except ValueError as message:
+			exit_usage(message, 1)
+	elif opt == "--control":
+		control_path = value
+	elif opt == "--stream":
+		try:
+			stream_address = stream.parse_address(value)
+		except ValueError as message:
+			exit_usage(message, 1)
+	elif opt == "--stream-images":
+		stream_images = value
+	elif opt in ["-c", "--cache"]:
+		try:
+			page_cache_budget = parse_budget(value)
+		except ValueError as message:
+			exit_usage(message, 1)
+	elif opt == "--cache-rss":
+		cache_rss = True
+	elif opt == "--redraw-stats":
+		redraw_stats = True
+	elif opt == "--profile-startup":
+		profile_startup = True
+	elif opt == "--instrument":
+		instrument = True
+	elif opt == "--instrument-dump":
+		instrument = True
+		instrument_dump = value
+	elif opt == "--export-tiles":
+		export_tiles = True
+
+if export_tiles:
+	if len(args) != 2:
+		exit_usage("--export-tiles expects a pdf and a directory", 1)
+	# the export runs its own process pool, away from the application
+	tiles_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiles.py")
+	os.execv(sys.executable, [sys.executable, tiles_script, "export"] + args)
 
 if len(args) > 1:
 	exit_usage("no more than one argument is expected", 1)
@@ -165,6 +316,7 @@ from Foundation import (
 	NSAttributedString, NSUnicodeStringEncoding,
 	NSURL, NSURLRequest, NSURLConnection,
 	NSAffineTransform,
+	NSContainsRect, NSIntersectsRect,
 )
 
 from AppKit import (
@@ -178,11 +330,11 @@ from AppKit import (
 	NSWindow,
 	NSMiniaturizableWindowMask, NSResizableWindowMask, NSTitledWindowMask,
 	NSBackingStoreBuffered,
-	NSCommandKeyMask, NSAlternateKeyMask,
+	NSCommandKeyMask, NSAlternateKeyMask, NSShiftKeyMask,
 	NSMenu, NSMenuItem,
 	NSGraphicsContext,
 	NSCompositingOperationClear, NSCompositingOperationSourceAtop, NSCompositingOperationCopy,
-	NSRectFillUsingOperation, NSFrameRectWithWidth, NSFrameRect, NSEraseRect,
+	NSRectFillUsingOperation, NSFrameRectWithWidth, NSFrameRect,
 	NSZeroRect,
 	NSColor, NSCursor, NSFont,
 	NSFontAttributeName,	NSForegroundColorAttributeName,
@@ -194,12 +346,15 @@ from AppKit import (
 	NSPrevFunctionKey, NSNextFunctionKey,
 	NSF5FunctionKey,
 	NSScreen, NSWorkspace, NSImage,
-	NSBezierPath, NSRoundLineCapStyle,
+	NSBitmapImageFileTypePNG,
+	NSCompositingOperationSourceOver,
+	NSBezierPath, NSRoundLineCapStyle, NSRoundLineJoinStyle,
 )
 
 from Quartz import (
 	PDFDocument, PDFAnnotationText, PDFAnnotationLink,
-	PDFActionNamed,
+	PDFAnnotationInk, PDFBorder,
+	PDFActionNamed, PDFActionGoTo,
 	kPDFActionNamedNextPage, kPDFActionNamedPreviousPage,
 	kPDFActionNamedFirstPage, kPDFActionNamedLastPage,
 	kPDFActionNamedGoBack, kPDFActionNamedGoForward,
@@ -211,6 +366,7 @@ from WebKit import (
 )
 
 import AVFoundation
+import objc
 #from AVFoundation import (
 #	AVMovie, AVMovieView,
 #)
@@ -283,14 +439,13 @@ file_name = url.lastPathComponent()
 pdf = PDFDocument.alloc().initWithURL_(url)
 if not pdf:
 	exit_usage("'%s' does not seem to be a pdf." % url.path(), 1)
+document = QuartzDocument(pdf)
 
 
 # page navigation
 
 page_count = pdf.pageCount()
 first_page, last_page = 0, page_count-1
-last_frame = -1
-curr_section_start_page, next_section_start_page = first_page, last_page
 
 past_pages = []
 current_page = first_page
@@ -299,7 +454,9 @@ future_pages = []
 def _goto(page):
 	global current_page
 	current_page = page
+	stream_page()
 	presentation_show(slide_view)
+	invalidate_slides()
 
 def _pop_push_page(pop_pages, push_pages):
 	def action():
@@ -334,31 +491,39 @@ def next_page(): goto_page(current_page+1)
 def prev_page(): goto_page(current_page-1)
 def home_page(): goto_page(first_page)
 def end_page():  goto_page(last_page)
-def next_section(): goto_page(next_section_start_page)
-def prev_section():
-	if curr_section_start_page < current_page:
-		goto_page(curr_section_start_page)
-	else:
-		temp,_ = extract_annotations(get_page(curr_section_start_page-1))
-		goto_page(temp)
-		
+
+# frames only need the labels around the current page, they are walked
+# until the deck is indexed; sections need every page
+
 def next_frame():
-	page = get_page(current_page)
-	current_label = page.label()
-	next_frame_page = current_page
-	while page and page.label()==current_label:
-		next_frame_page += 1
-		page=get_page(next_frame_page)
-	goto_page(next_frame_page)
+	deck = get_deck()
+	if deck is None:
+		goto_page(walk_next_frame(page_label, current_page, page_count))
+	else:
+		goto_page(deck.next_frame(current_page))
+
 def prev_frame():
-	page = get_page(current_page-1)
-	if page:
-		current_label = page.label()
-		prev_frame_page = current_page-1
-		while page and page.label()==current_label:
-			prev_frame_page -= 1
-			page=get_page(prev_frame_page)
-		goto_page(prev_frame_page+1)
+	deck = get_deck()
+	if deck is None:
+		page = walk_prev_frame(page_label, current_page)
+	else:
+		page = deck.prev_frame(current_page)
+	if page is not None:
+		goto_page(page)
+
+def next_section():
+	deck = get_deck()
+	if deck is None:
+		presenter_view.show_indexing()
+	else:
+		goto_page(deck.next_section(current_page))
+
+def prev_section():
+	deck = get_deck()
+	if deck is None:
+		presenter_view.show_indexing()
+	else:
+		goto_page(deck.prev_section(current_page))
 
 def get_page(page_number):
 	if page_number == min(max(first_page, page_number), last_page):
@@ -382,58 +547,305 @@ def get_page(page_number):
 #		return
 #	return movie
 
-notes  = defaultdict(list)
-questions  = defaultdict(list)
-answers  = defaultdict(list)
-movies = {}
-for page_number in range(page_count):
+def link_destination(annotation):
+	destination = annotation.destination()
+	if destination:
+		return pdf.indexForPage_(destination.page())
+
+def extract_page(page_number):
+	"""notes, questions, movies and section links of a page"""
 	page = pdf.pageAtIndex_(page_number)
 	page.setDisplaysAnnotations_(False)
-	last_frame = page.label()
+	record = dict(label=page.label(), links=[], notes=[], questions=[], movies={})
 	question = 'none'
 	for annotation in page.annotations():
 		annotation_type = type(annotation)
-		if annotation_type == PDFAnnotationText:
+		if annotation_type == PDFAnnotationLink:
+			origin, size = annotation.bounds()
+			bounds = tuple(origin), tuple(size)
+			if is_section_link(bounds):
+				record["links"].append((bounds, link_destination(annotation)))
+#			movie = get_movie(annotation.URL())
+#			if movie:
+#				record["movies"][annotation] = (movie, movie.posterImage())
+		elif annotation_type == PDFAnnotationText:
 			contents = annotation.contents()
 			if contents.startswith('Q:'):
 				question = contents[2:]
-				questions[page_number].append(question)
+				record["questions"].append(question)
 #			elif annotation.contents()[1].startswith('A:'):
 #				answers[question].append(contents[2:])
 			else:
-				notes[page_number].append(contents)
-#		elif annotation_type == PDFAnnotationLink:
-#			movie = get_movie(annotation.URL())
-#			if movie:
-#				movies[annotation] = (movie, movie.posterImage())
+				record["notes"].append(contents)
+	return record
+
+def extract_outline():
+	"""(title, page, depth) of the outline entries, depth first"""
+	entries = []
+	def walk(outline, depth=0):
+		for i in range(outline.numberOfChildren()):
+			child = outline.childAtIndex_(i)
+			destination = child.destination()
+			if destination is None and isinstance(child.action(), PDFActionGoTo):
+				destination = child.action().destination()
+			page = pdf.indexForPage_(destination.page()) if destination else None
+			entries.append((child.label() or "", page, depth))
+			walk(child, depth+1)
+	root = pdf.outlineRoot()
+	if root is not None:
+		walk(root)
+	return entries
+
+# pages are read from the sidecar if it is still valid, otherwise parsed on
+# first access and the rest is warmed once the first slide is on screen (see
+# Warmer below), then saved to the sidecar
+pdf_path = url.path()
+try:
+	records = sidecar.load(pdf_path)
+except (IOError, OSError):
+	records = None
+from_sidecar = records is not None and len(records) == page_count
+if from_sidecar:
+	for record in records:
+		record["movies"] = {}
+else:
+	records = None
+
+def set_page_table(table):
+	global page_table, notes, questions, movies, deck
+	page_table = table
+	notes     = page_table.column("notes")
+	questions = page_table.column("questions")
+	movies    = page_table.column("movies")
+	deck = None
+
+set_page_table(PageTable(page_count, extract_page, records))
+answers = defaultdict(list)
+
+def get_deck():
+	"""frame and section index, None until warming parsed every page"""
+	return deck
+
+def build_deck():
+	"""index the deck, once every page is parsed (see Warmer below)"""
+	global deck
+	deck = DeckIndex(page_table.column("label"), page_table.column("links"),
+	                 extract_outline())
+	if not from_sidecar:
+		save_sidecar()
+
+def page_label(page_number):
+	"""label of a page, without parsing its annotations"""
+	record = page_table.records[page_number]
+	if record is not None:
+		return record["label"]
+	return pdf.pageAtIndex_(page_number).label()
+
+def save_sidecar():
+	def save():
+		try:
+			sidecar.save(pdf_path, page_table.records)
+		except (IOError, OSError) as error:
+			NSLog("unable to save index: %@", str(error))
+	thread = threading.Thread(target=save, name="sidecar")
+	thread.daemon = True
+	thread.start()
+
+last_frame = pdf.pageAtIndex_(last_page).label()
 
 
 # interaction state
 
-IDLE, BBOX, CLIC, DRAW = list(range(4))
+IDLE, BBOX, CLIC, DRAW, ERASE = list(range(5))
 state = IDLE
 window_present = False
 
-drawings = defaultdict(list)
+drawings = Drawings() # committed strokes, per page, loaded lazily
+live_stroke = None # page and stroke being drawn
+live_segments = [] # segments of the stroke being drawn
+pipeline = None # inking of the stroke being drawn
+STROKE_WIDTH = 2.
+ERASER_RADIUS = 6. # points of the view
+
+
+# redraws
+
+def mark_dirty(view, rect):
+	if rect is None:
+		view.setNeedsDisplay_(True)
+	else:
+		view.setNeedsDisplayInRect_(rect)
+
+redraw = Redraw(mark_dirty)
+
+instruments = Instruments(enabled=instrument)
+instruments.gauge("redraws", redraw.stats)
+
+SLIDE_VIEWS = ["slide", "presenter"]
+
+def invalidate_slides():
+	for name in SLIDE_VIEWS:
+		redraw.invalidate(name)
+
+def invalidate_stroke(p0, p1, width=2.):
+	"""invalidate the segment p0-p1 (in page coordinates) of a pen stroke"""
+	for name in SLIDE_VIEWS:
+		view = redraw.views.get(name)
+		transform = view and view.page_transform
+		if transform is None:
+			continue
+		pad = hypot(*transform.transformSize_((width, 0.))) + 1.
+		redraw.invalidate(name, segment_rect(transform.transformPoint_(p0),
+		                                     transform.transformPoint_(p1), pad))
 
 
 # page drawing ###############################################################
 
 bbox = NSAffineTransform.transform()
 
-def draw_page(page):
+def bbox_key():
+	return tuple(bbox.transformStruct())
+
+# PDFKit objects are kept on their thread: workers render from their own
+# copy of the document, opened again when the pdf is reloaded
+worker_documents = threading.local()
+
+def thread_document():
+	"""document to render from on the calling thread"""
+	if threading.current_thread() is threading.main_thread():
+		return document
+	if getattr(worker_documents, "source", None) is not document:
+		with objc.autorelease_pool():
+			worker_documents.document = QuartzDocument(PDFDocument.alloc().initWithURL_(url))
+		worker_documents.source = document
+	return worker_documents.document
+
+def render_page(page_number, size, transform):
+	"""rasterize page seen through transform into a bitmap of size pixels"""
+	return thread_document().render(page_number, size, transform)
+
+def downsample_page(image, page_number, size):
+	return thread_document().downsample(image, page_number, size)
+
+# one store for both views (see pagestore.py): pages are rendered once at the
+# audience size and drawn scaled in the presenter window
+page_cache = PageStore(render_page, downsample_page, page_cache_budget, scalable=True)
+instruments.gauge("cache", page_cache.stats)
+if cache_rss:
+	instruments.gauge("rss", rss)
+
+def pixel_size(view, size):
+	w, h = view.convertSizeToBacking_(size)
+	return int(round(w)), int(round(h))
+
+def draw_page_image(page_number, size):
+	"""draw page (through bbox) from the cache, rendered at size pixels"""
+	page_rect = pdf.pageAtIndex_(page_number).boundsForBox_(kPDFDisplayBoxCropBox)
+	transform = bbox_key()
+	image = page_cache.get(page_number, size, transform)
+	image.drawInRect_fromRect_operation_fraction_(
+		page_rect, NSZeroRect, NSCompositingOperationSourceOver, 1.
+	)
+	page_cache.prefetch(page_number, size, transform, first_page, last_page)
+
+OVERLAY_LAYERS = 4 # stroke overlays kept (current page in both views)
+
+def segments_path(segments, origin=(0., 0.)):
+	ox, oy = origin
+	path = NSBezierPath.bezierPath()
+	path.setLineCapStyle_(NSRoundLineCapStyle)
+	path.setLineJoinStyle_(NSRoundLineJoinStyle)
+	(x, y), _, _, _, _, _ = segments[0]
+	path.moveToPoint_((x-ox, y-oy))
+	for _, (cx0, cy0), (cx1, cy1), (x, y), _, _ in segments:
+		path.curveToPoint_controlPoint1_controlPoint2_(
+			(x-ox, y-oy), (cx0-ox, cy0-oy), (cx1-ox, cy1-oy))
+	return path
+
+def stroke_path(stroke, origin=(0., 0.)):
+	return segments_path(stroke.segments(), origin)
+
+def draw_segments(segments, width, widths):
+	"""draw segments outlined in white, one path for a constant width or one
+	per segment when the widths vary (pressure)"""
+	if not segments:
+		return
+	if widths:
+		paths = [(segments_path([segment]), (segment.w0+segment.w1)/2.)
+		         for segment in segments]
+	else:
+		paths = [(segments_path(segments), width)]
+	for color, scale in [(NSColor.whiteColor(), 1.), (NSColor.blackColor(), .5)]:
+		color.setStroke()
+		for path, width in paths:
+			path.setLineWidth_(width*scale)
+			path.stroke()
+
+def draw_strokes(strokes):
+	for stroke in strokes:
+		draw_segments(stroke.segments(), stroke.width, stroke.widths is not None)
+
+def render_overlay(key):
+	"""committed strokes of a page, rendered like the page itself, and their
+	version"""
+	page_number, size, transform = key
+	strokes = drawings[page_number]
+	page_rect = pdf.pageAtIndex_(page_number).boundsForBox_(kPDFDisplayBoxCropBox)
+	image, _ = render_bitmap(size, page_rect, transform, lambda: draw_strokes(strokes))
+	return [image, strokes.version]
+
+def update_overlay(layer, key):
+	"""bring an overlay up to date with the strokes of its page, drawing only
+	what changed when the changes since its version are known"""
+	page_number, size, transform = key
+	strokes = drawings[page_number]
+	image, version = layer
+	damage = strokes.damage_since(version)
+	if damage is None:
+		layer[:] = render_overlay(key)
+		instruments.count("overlay.render")
+		return
+	on_top, clear, redrawn = damage
+	page_rect = pdf.pageAtIndex_(page_number).boundsForBox_(kPDFDisplayBoxCropBox)
+	if clear is not None:
+		update_bitmap(image, page_rect, transform, lambda: draw_strokes(redrawn), clear)
+	if on_top:
+		update_bitmap(image, page_rect, transform, lambda: draw_strokes(on_top))
+	layer[1] = strokes.version
+	instruments.count("overlay.update")
+
+overlay_layers = LayerCache(render_overlay, OVERLAY_LAYERS)
+instruments.gauge("overlay_layers", overlay_layers.stats)
+
+def draw_overlay(page_number, size):
+	"""composite the cached overlay of the committed strokes of the page"""
+	strokes = drawings[page_number]
+	if not strokes:
+		return
+	page_rect = pdf.pageAtIndex_(page_number).boundsForBox_(kPDFDisplayBoxCropBox)
+	key = page_number, size, bbox_key()
+	layer = overlay_layers.get(key)
+	if layer[1] != strokes.version:
+		update_overlay(layer, key)
+	image, _ = layer
+	image.drawInRect_fromRect_operation_fraction_(
+		page_rect, NSZeroRect, NSCompositingOperationSourceOver, 1.
+	)
+
+def draw_page(page_number, size):
+	draw_page_image(page_number, size)
+	draw_overlay(page_number, size)
 	bbox.concat()
 	
-	NSEraseRect(page.boundsForBox_(kPDFDisplayBoxCropBox))
-	page.drawWithBox_(kPDFDisplayBoxCropBox)
-
+	page = pdf.pageAtIndex_(page_number)
+	page_movies = movies[page_number]
 	NSColor.blackColor().setFill()
 	for annotation in page.annotations():
-		if not annotation in movies:
+		if not annotation in page_movies:
 			continue
 		bounds = annotation.bounds()
 		
-		_, poster = movies[annotation]
+		_, poster = page_movies[annotation]
 		if poster is None:
 			continue
 		
@@ -459,108 +871,271 @@ def draw_page(page):
 			bounds, NSZeroRect, NSCompositingOperationCopy, 1.
 		)
 	
-	for path in drawings[current_page]:
-		NSColor.whiteColor().setStroke()
-		path.setLineWidth_(2)
-		path.stroke()
-		NSColor.blackColor().setStroke()
-		path.setLineWidth_(1)
-		path.stroke()
+	if live_stroke is not None and live_stroke[0] == page_number:
+		_, stroke = live_stroke
+		draw_segments(live_segments, stroke.width, stroke.widths is not None)
+
+
+# inking #####################################################################
+
+# pen input goes through the inking pipeline (see strokes.py), the segments
+# it yields are drawn live, then the stroke moves to the overlay of its page
+
+def stroke_begin(point, pressure):
+	global live_stroke, live_segments, pipeline
+	live_stroke = current_page, Stroke(width=STROKE_WIDTH)
+	live_segments = []
+	pipeline = inking(STROKE_WIDTH)
+	next(pipeline)
+	stroke_add(point, pressure)
+
+def stroke_add(point, pressure):
+	add_segments(pipeline.send((point.x, point.y, pressure)))
+
+def stroke_end():
+	global live_stroke, live_segments, pipeline
+	add_segments(pipeline.send(None))
+	page_number, stroke = live_stroke
+	commit_stroke(page_number, stroke)
+	live_stroke, live_segments, pipeline = None, [], None
+
+def add_segments(segments):
+	global live_stroke, live_segments
+	page_number, stroke = live_stroke
+	start = len(stroke)
+	for segment in segments:
+		if not len(stroke):
+			stroke.append(segment.p0[0], segment.p0[1], segment.w0)
+		stroke.append(segment.p1[0], segment.p1[1], segment.w1)
+		live_segments.append(segment)
+		x0, y0, x1, y1 = segment_bounds(segment)
+		invalidate_stroke((x0, y0), (x1, y1), stroke.width)
+		if len(stroke) >= MAX_POINTS:
+			# long strokes are committed in parts, bounding their geometry
+			stream_ink(page_number, stroke, start)
+			commit_stroke(page_number, stroke)
+			stroke = Stroke(width=STROKE_WIDTH)
+			stroke.append(segment.p1[0], segment.p1[1], segment.w1)
+			live_stroke, live_segments = (page_number, stroke), []
+			start = 0
+	stream_ink(page_number, stroke, start)
+
+def commit_stroke(page_number, stroke):
+	simplified = stroke.simplified()
+	edit_drawings(lambda strokes: strokes.append(simplified), page_number)
+
+
+# text layers ################################################################
+
+# text that only changes with the state is laid out once per state, then
+# frames only draw the resulting image
+
+def layer_image(size, draw):
+	image = NSImage.alloc().initWithSize_((max(size[0], 1.), max(size[1], 1.)))
+	image.lockFocus()
+	draw()
+	image.unlockFocus()
+	return image
+
+def render_text(key):
+	text, font_size = key
+	text = NSString.stringWithString_(text)
+	attr = {
+		NSFontAttributeName:            NSFont.labelFontOfSize_(font_size),
+		NSForegroundColorAttributeName: NSColor.whiteColor(),
+	}
+	return layer_image(text.sizeWithAttributes_(attr),
+	                   lambda: text.drawAtPoint_withAttributes_((0, 0), attr))
+
+def render_help(key):
+	sections, font_size = key
+	help_text = _h("".join([
+		"<table style='color: white; font-family: LucidaGrande; font-size: %spt;'>" % font_size
+	] + [
+		"<tr><th style='padding: 0 1em;' align='right'>%s</th><td>%s</td></tr>" % h
+		for section in sections for h in HELP_SECTIONS[section]
+	] + [
+		"</table>"
+	]))
+	return layer_image(help_text.size(), lambda: help_text.drawAtPoint_((0, 0)))
+
+text_layers = LayerCache(render_text)
+help_layers = LayerCache(render_help)
+instruments.gauge("text_layers", text_layers.stats)
+instruments.gauge("help_layers", help_layers.stats)
+
+def draw_layer(image, origin):
+	image.drawAtPoint_fromRect_operation_fraction_(
+		origin, NSZeroRect, NSCompositingOperationSourceOver, 1.
+	)
+
+
+# overview ###################################################################
+
+# a thumbnail per frame (see overview.py), rendered on worker threads and
+# drawn once ready, the presenter being redrawn as they come
+
+OVERVIEW_LABEL_FONT_SIZE = 10 # pt
+OVERVIEW_LABELS = 256 # label layers kept
+
+def render_thumbnail(page_number, size):
+	return thread_document().render(page_number, size, IDENTITY)
+
+def thumbnail_done(page_number):
+	call_on_main_thread(lambda: redraw.invalidate("presenter"))
+
+thumbnails = ThumbnailCache(render_thumbnail, done=thumbnail_done)
+label_layers = LayerCache(render_text, OVERVIEW_LABELS)
+instruments.gauge("thumbnails", thumbnails.stats)
+
+def overview_layout(size):
+	deck = get_deck()
+	_, page_size = pdf.pageAtIndex_(0).boundsForBox_(kPDFDisplayBoxCropBox)
+	return GridLayout(len(deck.frame_starts), size, page_size)
+
+def overview_page(deck, i):
+	"""page shown for frame i: its last one, with all its overlays"""
+	return deck.frame_end(deck.frame_starts[i])
+
+def draw_overview(grid, scroll, selection, thumbnail_size):
+	deck = get_deck()
+	visible = grid.visible(scroll)
+	ahead = grid.visible(scroll, AHEAD_ROWS)
+	thumbnails.request([overview_page(deck, i) for i in priority(visible, ahead, selection)],
+	                   thumbnail_size)
+	for i in visible:
+		page_number = overview_page(deck, i)
+		rect = grid.tile_rect(i, scroll)
+		image = thumbnails.get(page_number, thumbnail_size)
+		if image is None:
+			NSColor.darkGrayColor().setFill()
+			NSRectFillUsingOperation(rect, NSCompositingOperationCopy)
+		else:
+			image.drawInRect_fromRect_operation_fraction_(
+				rect, NSZeroRect, NSCompositingOperationSourceOver, 1.
+			)
+		if deck.frame_starts[i] <= current_page <= page_number:
+			NSColor.grayColor().setFill()
+			NSFrameRectWithWidth(rect, 2.)
+		if i == selection:
+			NSColor.blueColor().setFill()
+			NSFrameRectWithWidth(rect, 4.)
+		label = pdf.pageAtIndex_(page_number).label() or str(page_number+1)
+		draw_layer(label_layers.get((label, OVERVIEW_LABEL_FONT_SIZE)),
+		           grid.label_origin(i, scroll))
 
 
 # presentation ###############################################################
 
 class SlideView(NSView):
+	page_transform = None
+	
 	def drawRect_(self, rect):
+		redraw.drew("slide")
+		frame = instruments.frame("slide")
+		warmer.start()
 		bounds = self.bounds()
 		width, height = bounds.size
 		
-		NSRectFillUsingOperation(bounds, NSCompositingOperationClear)
+		NSRectFillUsingOperation(rect, NSCompositingOperationClear)
 		
 		# current page
-		page = pdf.pageAtIndex_(current_page)
-		page_rect = page.boundsForBox_(kPDFDisplayBoxCropBox)
-		_, (w, h) = page_rect
-		r = min(width/w, height/h)
+		w, h = document.size(current_page)
+		x, y, r = slide_layout((width, height), (w, h))
 		
 		NSGraphicsContext.saveGraphicsState()
 		transform = NSAffineTransform.transform()
-		transform.translateXBy_yBy_(width/2., height/2.)
+		transform.translateXBy_yBy_(x, y)
 		transform.scaleXBy_yBy_(r, r)
-		transform.translateXBy_yBy_(-w/2., -h/2.)
 		transform.concat()
-		draw_page(page)
+		draw_page(current_page, pixel_size(self, (w*r, h*r)))
 		NSGraphicsContext.restoreGraphicsState()
+		frame.phase("page")
+		
+		self.page_transform = transform
+		self.page_transform.prependTransform_(bbox)
+		frame.end()
+
 
+TICKER_FONT_SIZE = 30.
+TICKER_STROKE = 20. # stroke width in percent of font size
+TICKER_Y = 4.
 
 class MessageView(NSView):
-	fps = 20. # frame per seconds for animation
-	pps = 40. # pixels per seconds for scrolling
-	
-	input_lines = ["…"]
-	should_check = True
+	text = "…"
+	should_check = False
 	
 	def initWithFrame_(self, frame):
 		assert NSView.initWithFrame_(self, frame) == self
+		self.ticker = Ticker(fps=ticker_fps)
+		font = NSFont.labelFontOfSize_(TICKER_FONT_SIZE)
+		self.attributes = [{
+			NSFontAttributeName:            font,
+			NSStrokeColorAttributeName:     NSColor.colorWithDeviceWhite_alpha_(0., .75),
+			NSStrokeWidthAttributeName:     TICKER_STROKE,
+		}, {
+			NSFontAttributeName:            font,
+			NSForegroundColorAttributeName: NSColor.colorWithDeviceWhite_alpha_(1., .75),
+		}]
+		self.layout_text()
 		self.redisplay_timer = NSTimer.scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(
-			1./self.fps,
+			1./self.ticker.fps,
 			self, "redisplay:", nil,
 			True
 		)
 		return self
 	
-	def redisplay_(self, timer):
-		self.setNeedsDisplay_(True)
+	def layout_text(self):
+		"""render the current message once, frames then only move the image"""
+		text = NSString.stringWithString_(self.text)
+		tw, th = text.sizeWithAttributes_(self.attributes[-1])
+		pad = TICKER_FONT_SIZE * TICKER_STROKE / 100.
+		self.text_width = tw
+		self.text_pad = pad
+		self.text_image = NSImage.alloc().initWithSize_((tw+2*pad, th+2*pad))
+		self.text_image.lockFocus()
+		for attr in self.attributes:
+			text.drawAtPoint_withAttributes_((pad, pad), attr)
+		self.text_image.unlockFocus()
 	
-	def check_input(self):
-		while True:
-			ready, _, _ = select.select([sys.stdin], [], [], 0)
-			if not ready:
-				break
-			line = sys.stdin.readline().decode('utf-8')
-			self.input_lines.append(line.rstrip())
+	def redisplay_(self, timer):
+		if self.ticker.due():
+			redraw.invalidate("message")
 	
 	def drawRect_(self, rect):
+		redraw.drew("message")
+		frame = instruments.frame("message")
+		begin = self.ticker.begin_frame()
 		if self.should_check:
-			self.check_input()
-			try:
-				self.text = self.input_lines.pop(0)
-			except IndexError:
-				pass
-			else:
-				self.start = time.time()
+			text = feed_queue.get()
+			if text is not None:
+				stream_publish({"t": "ticker", "text": text})
+				self.text = text
+				self.layout_text()
+				self.ticker.restart()
 				self.should_check = False
-		text = NSString.stringWithString_(self.text)
-		x = rect.size.width - self.pps*(time.time()-self.start)
-		for attr in [{
-			NSFontAttributeName:            NSFont.labelFontOfSize_(30),
-			NSStrokeColorAttributeName:     NSColor.colorWithDeviceWhite_alpha_(0., .75),
-			NSStrokeWidthAttributeName:     20.,
-		}, {
-			NSFontAttributeName:            NSFont.labelFontOfSize_(30),
-			NSForegroundColorAttributeName: NSColor.colorWithDeviceWhite_alpha_(1., .75),
-		}]:
-			text.drawAtPoint_withAttributes_((x, 4.), attr)
-		tw, _ = text.sizeWithAttributes_(attr)
-		if x < -tw:
+			frame.phase("layout")
+		x = self.ticker.position(self.bounds().size.width)
+		self.text_image.drawAtPoint_fromRect_operation_fraction_(
+			(x-self.text_pad, TICKER_Y-self.text_pad),
+			NSZeroRect, NSCompositingOperationSourceOver, 1.
+		)
+		if x < -self.text_width:
 			self.should_check = True
+		self.ticker.end_frame(begin)
+		frame.phase("text")
+		frame.end()
 
 
 # presenter view #############################################################
 
-def extract_annotations(page,box=None):
-	temp1, temp2 = None, None
+def frame_links(page):
 	for annotation in page.annotations():
-		if type(annotation) == PDFAnnotationLink:
-			width, _ = annotation.bounds().size
-			if width < 2:
-				destination = annotation.destination()
-				if destination:
-					temp1 = temp2
-					temp2 = pdf.indexForPage_(destination.page())
-			elif box is not None:
-				box(annotation)
-	return temp1,temp2
+		if type(annotation) != PDFAnnotationLink:
+			continue
+		bounds = annotation.bounds()
+		if not is_section_link(bounds):
+			NSFrameRectWithWidth(bounds, .5)
 
 class PresenterView(NSView):
 	transform = NSAffineTransform.transform()
@@ -570,61 +1145,167 @@ class PresenterView(NSView):
 	start_time = time.time()
 	duration_change_time = 0
 	show_help = True
+	show_instruments = False
+	show_overview = False # shown once the deck is indexed
+	overview_grid = None
+	overview_scroll = 0.
+	overview_selection = 0
+	overview_follow = False # scroll to the selection on the next draw
+	search_query = None # typed query while searching
+	search_results = []
+	search_selection = 0
+	jump_query = None # typed label, #page or section title while jumping
+	show_sections = False
+	indexing = False # an action waits for the deck index
 	annotation_state = None
+	page_transform = None
+	clock_rect = None
 	
 	def drawRect_(self, rect):
-		global curr_section_start_page, next_section_start_page
-		bounds = self.bounds()
-		width, height = bounds.size
-		
-		margin = width / 40.
-		if window_present:
-			current_width = width-2*margin
-		else:
-			current_width = (width-3*margin)*2/3.
-		font_size = margin
-		
-		NSRectFillUsingOperation(bounds, NSCompositingOperationCopy)
-		
-		# current 
-		self.page = pdf.pageAtIndex_(current_page)
-		page_rect = self.page.boundsForBox_(kPDFDisplayBoxCropBox)
-		_, (w, h) = page_rect
-		r = current_width/w
-		
-		NSGraphicsContext.saveGraphicsState()
-		transform = NSAffineTransform.transform()
-		transform.translateXBy_yBy_(margin, height-margin)
-		transform.scaleXBy_yBy_(r, r)
-		transform.translateXBy_yBy_(0., -h)
-		transform.concat()
-		
-		NSGraphicsContext.saveGraphicsState()
-		
-		draw_page(self.page)
-		if state == DRAW:
-			return
-		
-		# links
-		NSColor.blueColor().setFill()
-		curr_section_start_page, next_section_start_page = extract_annotations(self.page,lambda annotation : NSFrameRectWithWidth(annotation.bounds(), .5))
-		self.transform = transform
-		self.transform.prependTransform_(bbox)
-		self.resetCursorRects()
-		self.transform.invert()
-		
-		NSGraphicsContext.restoreGraphicsState()
-
-		if window_present:
-			return
-
-		# screen border
-		NSColor.grayColor().setFill()
-		NSFrameRect(page_rect)
-		NSGraphicsContext.restoreGraphicsState()
-		
+		redraw.drew("presenter")
+		frame = instruments.frame("presenter")
+		try:
+			bounds = self.bounds()
+			layout = PresenterLayout(bounds.size, window_present)
+			
+			if self.overview_shown():
+				NSRectFillUsingOperation(rect, NSCompositingOperationCopy)
+				self.clock_rect = None
+				grid = self.overview_grid = overview_layout(bounds.size)
+				scroll = grid.clamp_scroll(self.overview_scroll)
+				if self.overview_follow:
+					scroll = grid.scroll_to(self.overview_selection, scroll)
+					self.overview_follow = False
+				self.overview_scroll = scroll
+				draw_overview(grid, scroll, self.overview_selection,
+				              pixel_size(self, (grid.tile_width, grid.tile_height)))
+				frame.phase("overview")
+				return
+			
+			# only the clock ticked
+			if self.clock_rect and NSContainsRect(self.clock_rect, rect):
+				NSColor.blackColor().setFill()
+				NSRectFillUsingOperation(rect, NSCompositingOperationCopy)
+				self.draw_clock(layout)
+				# long labels reach under the clock, drawing is clipped to rect
+				image = self.page_number_layer(layout)
+				if NSIntersectsRect((layout.page_number_origin, image.size()), rect):
+					draw_layer(image, layout.page_number_origin)
+				frame.phase("clock")
+				return
+			
+			NSRectFillUsingOperation(rect, NSCompositingOperationCopy)
+			
+			# current 
+			self.page = pdf.pageAtIndex_(current_page)
+			page_rect = self.page.boundsForBox_(kPDFDisplayBoxCropBox)
+			_, (w, h) = page_rect
+			x, y, r = layout.current((w, h))
+			
+			NSGraphicsContext.saveGraphicsState()
+			transform = NSAffineTransform.transform()
+			transform.translateXBy_yBy_(x, y)
+			transform.scaleXBy_yBy_(r, r)
+			transform.concat()
+			
+			NSGraphicsContext.saveGraphicsState()
+			
+			draw_page(current_page, pixel_size(self, (w*r, h*r)))
+			frame.phase("page")
+			if state == DRAW:
+				return
+			
+			# links
+			NSColor.blueColor().setFill()
+			frame_links(self.page)
+			self.transform = transform
+			self.transform.prependTransform_(bbox)
+			self.page_transform = NSAffineTransform.transformWithTransform_(self.transform)
+			self.resetCursorRects()
+			self.transform.invert()
+			frame.phase("links")
+			
+			NSGraphicsContext.restoreGraphicsState()
+	
+			if window_present:
+				self.clock_rect = None
+				return
+	
+			# screen border
+			NSColor.grayColor().setFill()
+			NSFrameRect(page_rect)
+			NSGraphicsContext.restoreGraphicsState()
+			
+			
+			# time
+			self.draw_clock(layout)
+			frame.phase("clock")
 		
-		# time
+			# page number
+			draw_layer(self.page_number_layer(layout), layout.page_number_origin)
+			frame.phase("page_number")
+			
+			# notes
+			note = "\n".join(notes[current_page])
+			if note:
+				draw_layer(text_layers.get((note, layout.notes_font_size)),
+				           layout.notes_origin)
+			frame.phase("notes")
+			
+			# search, jump, sections, help or timings
+			if self.indexing and get_deck() is None:
+				self.draw_lines(["indexing..."], layout)
+				frame.phase("indexing")
+			elif self.search_query is not None:
+				self.draw_search(layout)
+				frame.phase("search")
+			elif self.jump_query is not None:
+				self.draw_jump(layout)
+				frame.phase("jump")
+			elif self.show_sections:
+				self.draw_sections(layout)
+				frame.phase("sections")
+			elif self.show_instruments:
+				timings = NSString.stringWithString_("\n".join(instruments.lines()))
+				timings.drawAtPoint_withAttributes_(layout.help_origin, {
+					NSFontAttributeName:            NSFont.userFixedPitchFontOfSize_(layout.notes_font_size*.8),
+					NSForegroundColorAttributeName: NSColor.whiteColor(),
+				})
+				frame.phase("timings")
+			elif self.show_help:
+				draw_layer(help_layers.get((self.help_sections(), HELP_FONT_SIZE)),
+				           layout.help_origin)
+				frame.phase("help")
+			
+			# next page
+			try:
+				page = pdf.pageAtIndex_(current_page+1)
+				page_rect = page.boundsForBox_(kPDFDisplayBoxCropBox)
+			except:
+				return
+			_, (w, h) = page_rect
+			x, y, r = layout.next((w, h))
+			
+			NSGraphicsContext.saveGraphicsState()
+			transform = NSAffineTransform.transform()
+			transform.translateXBy_yBy_(x, y)
+			transform.scaleXBy_yBy_(r, r)
+			transform.concat()
+			
+			draw_page_image(current_page+1, pixel_size(self, (w*r, h*r)))
+			NSColor.colorWithCalibratedWhite_alpha_(.25, .25).setFill()
+			NSRectFillUsingOperation(page_rect, NSCompositingOperationSourceAtop)
+			NSGraphicsContext.restoreGraphicsState()
+			frame.phase("next")
+		finally:
+			frame.end()
+	
+	def page_number_layer(self, layout):
+		page_number = "%s/%s (%s/%s)" % (
+			pdf.pageAtIndex_(current_page).label(), last_frame, current_page+1, page_count)
+		return text_layers.get((page_number, layout.font_size))
+	
+	def draw_clock(self, layout):
 		now = time.time()
 		if now - self.duration_change_time <= 1: # duration changed, display it
 			clock = time.gmtime(self.duration)
@@ -635,83 +1316,172 @@ class PresenterView(NSView):
 			clock = time.gmtime(abs(self.duration - running_duration))
 		clock = NSString.stringWithString_(time.strftime("%H:%M:%S", clock))
 		attr = {
-			NSFontAttributeName:            NSFont.labelFontOfSize_(margin*1.5),
+			NSFontAttributeName:            NSFont.labelFontOfSize_(layout.clock_font_size),
 			NSForegroundColorAttributeName: NSColor.whiteColor(),
 		}
-		tw, _ = clock.sizeWithAttributes_(attr)
-		clock.drawAtPoint_withAttributes_((width-margin-tw, height-2.*margin), attr)
+		tw, th = clock.sizeWithAttributes_(attr)
+		x, y = layout.clock_origin(tw)
+		clock.drawAtPoint_withAttributes_((x, y), attr)
 		app.dockTile().setBadgeLabel_(clock)
-	
-		# page number
-		page_number = NSString.stringWithString_("%s/%s (%s/%s)" % (
-			self.page.label(), last_frame, current_page+1, page_count))
-		attr = {
-			NSFontAttributeName:            NSFont.labelFontOfSize_(font_size),
-			NSForegroundColorAttributeName: NSColor.whiteColor(),
-		}
-		tw, _ = page_number.sizeWithAttributes_(attr)
-		page_number.drawAtPoint_withAttributes_((margin*1.5+current_width,
-		                                         height-1.4*margin), attr)
 		
-		# notes
-		note = NSString.stringWithString_("\n".join(notes[current_page]))
-		note.drawAtPoint_withAttributes_((margin, 0), {
-			NSFontAttributeName:            NSFont.labelFontOfSize_(font_size*0.6),
+		# some slack, so that a slightly wider time still fits in
+		pad = layout.margin/2.
+		self.clock_rect = ((x-pad, y), (tw+pad, th))
+	
+	def draw_search(self, layout):
+		lines = ["/%s_" % self.search_query]
+		if search_index is None:
+			lines.append("indexing...")
+		for i, page_number in enumerate(self.search_results):
+			lines.append("%s %-6s %s" % (">" if i == self.search_selection else " ",
+				pdf.pageAtIndex_(page_number).label(), search_index.titles[page_number]))
+		self.draw_lines(lines, layout)
+	
+	def draw_jump(self, layout):
+		lines = ["goto %s_" % self.jump_query]
+		deck = get_deck()
+		page_number = deck.resolve(self.jump_query) if deck is not None and self.jump_query else None
+		if deck is None:
+			lines.append("indexing...")
+		elif page_number is not None:
+			lines.append("%s/%s (page %s)" % (pdf.pageAtIndex_(page_number).label(),
+			                                 last_frame, page_number+1))
+		elif self.jump_query:
+			lines.append("no such slide")
+		self.draw_lines(lines, layout)
+	
+	def draw_sections(self, layout):
+		deck = get_deck()
+		if deck is None:
+			self.draw_lines(["indexing..."], layout)
+			return
+		current = deck.section_index(current_page)
+		first = max(min(current - SECTION_LINES//2, len(deck.sections) - SECTION_LINES), 0)
+		lines = []
+		for i, (start, end, title) in enumerate(deck.sections[first:first+SECTION_LINES], first):
+			lines.append("%s %-6s %s" % (">" if i == current else " ",
+				pdf.pageAtIndex_(start).label(), title or "(pages %s-%s)" % (start+1, end+1)))
+		self.draw_lines(lines, layout)
+	
+	def draw_lines(self, lines, layout):
+		text = NSString.stringWithString_("\n".join(lines))
+		text.drawAtPoint_withAttributes_(layout.help_origin, {
+			NSFontAttributeName:            NSFont.userFixedPitchFontOfSize_(layout.notes_font_size*.8),
 			NSForegroundColorAttributeName: NSColor.whiteColor(),
 		})
-		
-		# help
-		if self.show_help:
-			help_text = _h("".join([
-				"<table style='color: white; font-family: LucidaGrande; font-size: 8pt;'>"
-			] + [
-				"<tr><th style='padding: 0 1em;' align='right'>%s</th><td>%s</td></tr>" % h for h in self.genHelp()
-			] + [
-				"</table>"
-			]))
-			help_text.drawAtPoint_((2*margin+current_width, 0))
-		
-		# next page
-		try:
-			page = pdf.pageAtIndex_(current_page+1)
-			page_rect = page.boundsForBox_(kPDFDisplayBoxCropBox)
-		except:
+	
+	def search_key(self, c):
+		"""handle key c while searching, returns whether it did"""
+		if c == chr(27): # esc
+			self.search_query = None
+		elif c in ("\r", "\x03"): # return or enter
+			if self.search_results:
+				goto_page(self.search_results[self.search_selection])
+			self.search_query = None
+		elif c in (NSUpArrowFunctionKey, NSDownArrowFunctionKey):
+			step = 1 if c == NSDownArrowFunctionKey else -1
+			self.search_selection = max(0, min(self.search_selection + step,
+			                                   len(self.search_results)-1))
+		elif c in (chr(127), chr(8)): # delete-back or backspace
+			self.update_search(self.search_query[:-1])
+		elif len(c) == 1 and c >= " " and not "\uf700" <= c <= "\uf8ff": # not a function key
+			self.update_search(self.search_query + c)
+		else:
+			return False
+		return True
+	
+	def jump_key(self, c):
+		"""handle key c while jumping, returns whether it did"""
+		if c == chr(27): # esc
+			self.jump_query = None
+		elif c in ("\r", "\x03"): # return or enter
+			if get_deck() is None: # the prompt stays, showing indexing
+				return True
+			page_number = get_deck().resolve(self.jump_query)
+			if page_number is not None:
+				goto_page(page_number)
+			self.jump_query = None
+		elif c in (chr(127), chr(8)): # delete-back or backspace
+			self.jump_query = self.jump_query[:-1]
+		elif len(c) == 1 and c >= " " and not "\uf700" <= c <= "\uf8ff": # not a function key
+			self.jump_query += c
+		else:
+			return False
+		return True
+	
+	def update_search(self, query):
+		self.search_query = query
+		self.search_results = search_index.search(query) if search_index else []
+		self.search_selection = 0
+	
+	def overview_shown(self):
+		# the deck is indexed again after a reload
+		return self.show_overview and get_deck() is not None
+	
+	def show_indexing(self):
+		"""tell that the deck is not indexed yet, until it is"""
+		self.indexing = True
+		redraw.invalidate("presenter")
+	
+	def toggle_overview(self):
+		if not self.show_overview and get_deck() is None:
+			self.show_indexing()
 			return
-		_, (w, h) = page_rect
-		r = current_width/2./w
-		
-		NSGraphicsContext.saveGraphicsState()
-		transform = NSAffineTransform.transform()
-		transform.translateXBy_yBy_(2*margin+current_width, height-2.5*margin)
-		transform.scaleXBy_yBy_(r, r)
-		transform.translateXBy_yBy_(0., -h)
-		transform.concat()
-		bbox.concat()
-		
-		NSEraseRect(page_rect)
-		page.drawWithBox_(kPDFDisplayBoxCropBox)
-		NSColor.colorWithCalibratedWhite_alpha_(.25, .25).setFill()
-		NSRectFillUsingOperation(page_rect, NSCompositingOperationSourceAtop)
-		NSGraphicsContext.restoreGraphicsState()
+		self.show_overview = not self.show_overview
+		if self.show_overview:
+			self.overview_selection = get_deck().frame_ordinal(current_page)
+			self.overview_follow = True
+		self.annotation_state = None
+		self.discardCursorRects()
+		self.removeAllToolTips()
 	
-	def genHelp(self):
-		help = HELP
+	def overview_key(self, c):
+		"""handle key c in the overview, returns whether it did"""
+		moves = {
+			NSLeftArrowFunctionKey:  (-1,  0),
+			NSRightArrowFunctionKey: ( 1,  0),
+			NSUpArrowFunctionKey:    ( 0, -1),
+			NSDownArrowFunctionKey:  ( 0,  1),
+		}
+		grid = self.overview_grid
+		if c in moves and grid is not None:
+			self.overview_selection = grid.move(self.overview_selection, *moves[c])
+			self.overview_follow = True
+		elif c in (NSPageUpFunctionKey, NSPageDownFunctionKey) and grid is not None:
+			rows = max(int(grid.view_height//grid.row_height), 1)
+			self.overview_selection = grid.move(self.overview_selection, 0,
+				rows if c == NSPageDownFunctionKey else -rows)
+			self.overview_follow = True
+		elif c in ("\r", "\x03"): # return or enter
+			self.overview_goto(self.overview_selection)
+		elif c in ("o", chr(27)):
+			self.toggle_overview()
+		else:
+			return False
+		return True
+	
+	def overview_goto(self, i):
+		self.toggle_overview()
+		goto_page(get_deck().frame_starts[i])
+	
+	def help_sections(self):
+		sections = ["keys"]
 		if self.absolute_time:
-			help = help + HELP_CLOCK
+			sections.append("clock")
 		else:
-			help = help + HELP_TIMER
+			sections.append("timer")
 #		if not movie_view.isHidden():
-#			help = help + HELP_MOVIE
+#			sections.append("movie")
 		if not web_view.isHidden():
-			help = help + HELP_WEB
+			sections.append("web")
 		if not poll_view.isHidden():
-			help = help + HELP_POLL
+			sections.append("poll")
 		if not slide_view.isHidden():
-			help = help + HELP_SLIDES
+			sections.append("slides")
 			if drawings[current_page]:
-				help = help + HELP_ANNOTATIONS
-
-		return help
+				sections.append("annotations")
+		
+		return tuple(sections)
 		
 	def resetCursorRects(self):
 		# updates rectangles only if needed (so that tooltip timeouts work)
@@ -719,6 +1489,7 @@ class PresenterView(NSView):
 		if self.annotation_state == annotation_state:
 			return
 		self.annotation_state = annotation_state
+		instruments.count("cursor_rects")
 		
 		# reset cursor rects and tooltips
 		self.discardCursorRects()
@@ -744,11 +1515,33 @@ class PresenterView(NSView):
 	def keyDown_(self, event):
 		c = event.characters()
 		
+		if self.search_query is not None and self.search_key(c):
+			redraw.invalidate("presenter")
+			return
+		self.indexing = False
+		if self.overview_shown() and self.overview_key(c):
+			redraw.invalidate("presenter")
+			return
+		if self.jump_query is not None and self.jump_key(c):
+			redraw.invalidate("presenter")
+			return
+		# prompts open on plain keys, the web view keeps its own
+		plain = not event.modifierFlags() & (NSCommandKeyMask | NSAlternateKeyMask)
+		if c == "/" and plain:
+			self.update_search("")
+			redraw.invalidate("presenter")
+			return
+		if (c in ("g", "#") or c.isdigit()) and plain and web_view.isHidden():
+			self.jump_query = "" if c == "g" else c
+			redraw.invalidate("presenter")
+			return
+		
 		if event.modifierFlags() & NSAlternateKeyMask:
 			c = event.charactersIgnoringModifiers()
 			if c == "i": # reset bbox to identity
 				global bbox
 				bbox = NSAffineTransform.transform()
+				invalidate_slides()
 		elif event.modifierFlags() & NSCommandKeyMask:
 			if c == NSLeftArrowFunctionKey:
 				c = NSPrevFunctionKey
@@ -759,9 +1552,9 @@ class PresenterView(NSView):
 			app.terminate_(self)
 		
 		elif c ==  "\uf72c": # remote pointer - back
-			prev_page()
+			dispatcher.dispatch("prev")
 		elif c ==  "\uf72d": # remote pointer - forward
-			next_page()
+			dispatcher.dispatch("next")
 
 		elif c == chr(27): # esc
 			toggle_fullscreen(fullscreen=False)
@@ -772,8 +1565,16 @@ class PresenterView(NSView):
 		elif c == "?":
 			self.show_help = not self.show_help
 		
+		elif c == "l":
+			self.show_sections = not self.show_sections
+		
+		elif c == "i" and not event.modifierFlags() & NSAlternateKeyMask:
+			# timings overlay, instruments run while it is shown
+			self.show_instruments = not self.show_instruments
+			instruments.enabled = self.show_instruments or instrument
+		
 		elif c == chr(127) or c == chr(8): # delete-back or backspace
-			prev_page()
+			dispatcher.dispatch("prev")
 		
 #		elif c == " " and movie_view.isHidden(): # next page
 #			next_page()
@@ -829,36 +1630,42 @@ class PresenterView(NSView):
 			clip.scaleUnitSquareToSize_(scale)
 			document.setNeedsLayout_(True)
 		
-		elif c == 'e': # erase annotation
-			del drawings[current_page]
-		
 		else:
-			action = {
-				"F":                     toggle_windowed_fullscreen,
-				"f":                     toggle_fullscreen,
-				NSF5FunctionKey:         toggle_fullscreen,
-				".":                     toggle_black_view,
-				"b":                     toggle_black_view,
-				"w":                     toggle_web_view,
-#				"m":                     toggle_movie_view,
-				"s":                     presentation_show,
-				"p":                     toggle_poll_view,
-				NSUpArrowFunctionKey:    prev_frame,
-				NSLeftArrowFunctionKey:  prev_page,
-				NSPageUpFunctionKey:     prev_section,
-				NSDownArrowFunctionKey:  next_frame,
-				NSRightArrowFunctionKey: next_page,
-				NSPageDownFunctionKey:   next_section,
-				NSHomeFunctionKey:       home_page,
-				NSEndFunctionKey:        end_page,
-				NSPrevFunctionKey:       back,
-				NSNextFunctionKey:       forward,
-			}.get(c, nop)
-			action()
+			command = {
+				"e":                     "erase",
+				"o":                     "overview",
+				"u":                     "undo",
+				"U":                     "redo",
+				"F":                     "windowed-fullscreen",
+				"f":                     "fullscreen",
+				NSF5FunctionKey:         "fullscreen",
+				".":                     "black",
+				"b":                     "black",
+				"w":                     "web",
+#				"m":                     "movie",
+				"s":                     "slide",
+				"p":                     "poll",
+				NSUpArrowFunctionKey:    "prev-frame",
+				NSLeftArrowFunctionKey:  "prev",
+				NSPageUpFunctionKey:     "prev-section",
+				NSDownArrowFunctionKey:  "next-frame",
+				NSRightArrowFunctionKey: "next",
+				NSPageDownFunctionKey:   "next-section",
+				NSHomeFunctionKey:       "first",
+				NSEndFunctionKey:        "last",
+				NSPrevFunctionKey:       "back",
+				NSNextFunctionKey:       "forward",
+			}.get(c)
+			if command:
+				dispatcher.dispatch(command)
 		
-		refresher.refresh_()
+		redraw.invalidate("presenter")
 	
 	def scrollWheel_(self, event):
+		if self.show_overview:
+			self.overview_scroll -= event.scrollingDeltaY()
+			redraw.invalidate("presenter")
+			return
 		if not (event.modifierFlags() & NSAlternateKeyMask):
 			return
 		p = event.locationInWindow()
@@ -866,13 +1673,23 @@ class PresenterView(NSView):
 		bbox.translateXBy_yBy_(p.x, p.y)
 		bbox.scaleBy_(exp(event.deltaY()*0.01))
 		bbox.translateXBy_yBy_(-p.x, -p.y)
-		refresher.refresh_()
+		invalidate_slides()
 	
 	def mouseDown_(self, event):
 		global state
 		assert state == IDLE
+		if self.overview_shown():
+			i = self.overview_grid and self.overview_grid.index_at(
+				self.convertPoint_fromView_(event.locationInWindow(), None),
+				self.overview_scroll)
+			if i is not None:
+				self.overview_goto(i)
+			return
 		if event.modifierFlags() & NSAlternateKeyMask:
 			state = BBOX
+		elif event.modifierFlags() & NSShiftKeyMask:
+			state = ERASE
+			self.erase_(event)
 		else:
 			self.press_location = event.locationInWindow()
 			state = CLIC
@@ -883,25 +1700,32 @@ class PresenterView(NSView):
 			location = event.locationInWindow()
 			if hypot(location.x-self.press_location.x, location.y-self.press_location.y) < 5:
 				return
-			self.path = NSBezierPath.bezierPath()
-			self.path.setLineCapStyle_(NSRoundLineCapStyle)
-			self.path.moveToPoint_(self.transform.transformPoint_(self.press_location))
-			self.path.lineToPoint_(self.transform.transformPoint_(location))
-			drawings[current_page].append(self.path)
+			stroke_begin(self.transform.transformPoint_(self.press_location), event.pressure())
+			stroke_add(self.transform.transformPoint_(location), event.pressure())
 			state = DRAW
 		elif state == DRAW:
-			self.path.lineToPoint_(self.transform.transformPoint_(event.locationInWindow()))
+			stroke_add(self.transform.transformPoint_(event.locationInWindow()), event.pressure())
+		elif state == ERASE:
+			self.erase_(event)
 		elif state == BBOX:
 			delta = self.transform.transformSize_((event.deltaX(), -event.deltaY()))
 			bbox.translateXBy_yBy_(delta.width, delta.height)
-		refresher.refresh_()
+			invalidate_slides()
 	
 	def mouseUp_(self, event):
 		global state
 		if state == CLIC:
 			self.click_(event)
+		elif state == DRAW:
+			stroke_end()
 		state = IDLE
-		refresher.refresh_()
+		redraw.invalidate("presenter")
+	
+	def erase_(self, event):
+		"""erase the strokes under the pointer"""
+		point = self.transform.transformPoint_(event.locationInWindow())
+		radius = hypot(*self.transform.transformSize_((ERASER_RADIUS, 0.)))
+		edit_drawings(lambda strokes: strokes.erase(strokes.hit(point.x, point.y, radius)))
 	
 	def click_(self, event):
 		point = self.transform.transformPoint_(event.locationInWindow())
@@ -912,8 +1736,8 @@ class PresenterView(NSView):
 		if type(annotation) != PDFAnnotationLink:
 			return
 		
-		if annotation in movies:
-			movie, _ = movies[annotation]
+		if annotation in movies[current_page]:
+			movie, _ = movies[current_page][annotation]
 			movie_view.setMovie_(movie)
 			presentation_show(movie_view)
 			movie_view.play_(self)
@@ -984,6 +1808,85 @@ def add_subview(view, subview, autoresizing_mask=NSViewWidthSizable|NSViewHeight
 	view.addSubview_(subview)
 
 
+# audience stream ############################################################
+
+# browsers mirror the audience window from events (see stream.py): the page
+# shown, the strokes added or removed and the ticker messages, the pages
+# themselves being images loaded once, the web view being captured while
+# it is shown
+
+STREAM_IMAGE_WIDTH = 1280   # pixels of the page images rendered on demand
+STREAM_FRAME_INTERVAL = 1.  # seconds between captures of the web view
+
+def stream_page_image(page_number):
+	"""png of a page (as a future, rendering happens on the main thread)"""
+	def render():
+		if not 0 <= page_number < page_count:
+			return None
+		w, h = document.size(page_number)
+		size = STREAM_IMAGE_WIDTH, int(round(STREAM_IMAGE_WIDTH*h/w))
+		return encode_png(page_cache.get(page_number, size, IDENTITY, exact=True))
+	return call_on_main_thread(render)
+
+stream_server = None
+if stream_address:
+	stream_host, stream_port = stream_address
+	stream_server = stream.StreamServer(
+		stream.directory_images(stream_images) if stream_images else stream_page_image,
+		stream_port, stream_host).start()
+	instruments.gauge("stream", stream_server.stats)
+
+def stream_publish(event):
+	if stream_server is not None:
+		stream_server.publish(event)
+
+def stream_page():
+	if stream_server is None:
+		return
+	strokes = drawings[current_page].strokes
+	stream_publish({
+		"t":       "page",
+		"page":    current_page,
+		"size":    list(document.size(current_page)),
+		"strokes": [stream.encode_stroke(i, strokes[i]) for i in sorted(strokes)],
+	})
+
+def stream_edit(page_number, before):
+	"""publish the strokes added and removed since the ids before"""
+	strokes = drawings[page_number].strokes
+	removed = sorted(before.difference(strokes))
+	added = sorted(set(strokes).difference(before))
+	if removed:
+		stream_publish({"t": "erase", "page": page_number, "ids": removed})
+	if added:
+		stream_publish({"t": "add", "page": page_number,
+		                "strokes": [stream.encode_stroke(i, strokes[i]) for i in added]})
+
+def stream_ink(page_number, stroke, start):
+	"""publish the points of the stroke being drawn from start on"""
+	if stream_server is not None and len(stroke) > start:
+		stream_publish({"t": "ink", "page": page_number, "width": stroke.width,
+		                "points": stream.rounded(stroke.points[2*start:])})
+
+class StreamFramer(NSObject):
+	def capture_(self, timer):
+		if web_view.isHidden():
+			return
+		bounds = web_view.bounds()
+		bitmap = web_view.bitmapImageRepForCachingDisplayInRect_(bounds)
+		web_view.cacheDisplayInRect_toBitmapImageRep_(bounds, bitmap)
+		stream_server.set_frame(bytes(
+			bitmap.representationUsingType_properties_(NSBitmapImageFileTypePNG, {})))
+
+if stream_server is not None:
+	stream_page()
+	stream_framer = StreamFramer.alloc().init()
+	stream_framer_timer = NSTimer.scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(
+		STREAM_FRAME_INTERVAL,
+		stream_framer, "capture:",
+		nil, YES)
+
+
 # presentation window ########################################################
 
 presentation_window = create_window(file_name)
@@ -994,6 +1897,7 @@ presentation_frame = presentation_view.frame()
 
 slide_view = SlideView.alloc().initWithFrame_(presentation_frame)
 add_subview(presentation_view, slide_view)
+redraw.register("slide", slide_view)
 
 # black view
 
@@ -1043,16 +1947,29 @@ add_subview(presentation_view, web_view)
 # message view
 
 if show_feed:
+	feed_queue = feed.FeedQueue(feed_size, feed_policy)
+	feed_server = feed.FeedServer(feed_queue, feed_sources).start()
+	instruments.gauge("feed", feed_server.stats)
+	
 	presentation_frame.size.height = 40
 	message_view = MessageView.alloc().initWithFrame_(presentation_frame)
 	add_subview(presentation_view, message_view, NSViewWidthSizable)
+	redraw.register("message", message_view)
+	instruments.gauge("ticker", message_view.ticker.stats)
 
 
 # views visibility
 
+def view_name(visible_view):
+	for name, view in [("slide", slide_view), ("black", black_view),
+	                   ("web", web_view), ("poll", poll_view)]:
+		if view == visible_view:
+			return name
+
 def presentation_show(visible_view=slide_view):
 	for view in [slide_view, black_view, web_view, poll_view]: #, movie_view
 		view.setHidden_(view != visible_view)
+	stream_publish({"t": "view", "view": view_name(visible_view)})
 
 def toggle_view(view):
 	presentation_show(view if view.isHidden() else slide_view)
@@ -1070,6 +1987,7 @@ presentation_show()
 
 presenter_window = create_window(file_name)
 presenter_view   = create_view(presenter_window, PresenterView)
+redraw.register("presenter", presenter_view)
 
 presenter_window.center()
 presenter_window.makeFirstResponder_(presenter_view)
@@ -1188,6 +2106,20 @@ class ApplicationDelegate(NSObject):
 	
 	def applicationWillTerminate_(self, notification):
 		presentation_show()
+		if redraw_stats:
+			for name, stats in sorted(redraw.stats().items()):
+				sys.stderr.write("%s: %s\n" % (name, " ".join(
+					"%s=%s" % item for item in sorted(stats.items()))))
+			if show_feed:
+				sys.stderr.write("ticker: %s\n" % " ".join(
+					"%s=%.4f" % item for item in sorted(message_view.ticker.stats().items())))
+		if cache_rss:
+			sys.stderr.write("rss: %s\ncache: %s\n" % tuple(" ".join(
+				"%s=%s" % item for item in sorted(stats.items()))
+				for stats in (rss(), page_cache.stats())))
+		if instrument_dump:
+			instruments.dump(instrument_dump)
+		ink_writer.flush(INK_FLUSH_TIMEOUT)
 
 application_delegate = ApplicationDelegate.alloc().init()
 app.setDelegate_(application_delegate)
@@ -1199,12 +2131,412 @@ if restarted:
 		NSApplicationDidFinishLaunchingNotification, app)
 
 
+# commands ###################################################################
+
+def edit_drawings(edit, page_number=None):
+	"""apply edit to the strokes of a page (the current one by default), then
+	redraw and save what changed"""
+	if page_number is None:
+		page_number = current_page
+	strokes = drawings[page_number]
+	version = strokes.version
+	before = set(strokes.strokes) if stream_server is not None else None
+	edit(strokes)
+	if strokes.version == version:
+		return
+	if before is not None:
+		stream_edit(page_number, before)
+	for added, removed in strokes.changes_since(version) or []:
+		for bounds in [removed] + [padded(strokes.strokes[i].bounds, strokes.strokes[i].width)
+		                           for i in added if i in strokes.strokes]:
+			if bounds is not None:
+				x0, y0, x1, y1 = bounds
+				invalidate_stroke((x0, y0), (x1, y1), 0.)
+	save_drawings()
+
+def search_slides(query):
+	if search_index is None:
+		raise control.CommandError("search index not ready")
+	return [dict(page=page+1, label=pdf.pageAtIndex_(page).label(),
+	             title=search_index.titles[page])
+	        for page in search_index.search(query)]
+
+def toggle_overview():
+	presenter_view.toggle_overview()
+	redraw.invalidate("presenter")
+
+def erase_drawings():
+	edit_drawings(PageStrokes.clear)
+
+def undo_drawings():
+	edit_drawings(PageStrokes.undo)
+
+def redo_drawings():
+	edit_drawings(PageStrokes.redo)
+
+def list_sections():
+	"""sections of the deck, from its outline or its section links"""
+	deck = get_deck()
+	if deck is None:
+		raise control.CommandError("deck not indexed yet")
+	return [dict(page=start, last_page=end, label=pdf.pageAtIndex_(start).label(), title=title)
+	        for start, end, title in deck.sections]
+
+def goto_label(label):
+	deck = get_deck()
+	if deck is None:
+		raise control.CommandError("deck not indexed yet")
+	page = deck.resolve(label)
+	if page is None:
+		raise control.CommandError("no page labelled '%s'" % label)
+	goto_page(page)
+
+def goto_page_number(number):
+	try:
+		goto_page(int(number)-1)
+	except ValueError:
+		raise control.CommandError("invalid page number '%s'" % number)
+
+def presentation_state():
+	views = [slide_view, black_view, web_view, poll_view]
+	return {
+		"page":       current_page,
+		"label":      pdf.pageAtIndex_(current_page).label(),
+		"page_count": page_count,
+		"last_label": last_frame,
+		"view":       ([view_name(view) for view in views if not view.isHidden()] or [None])[0],
+		"fullscreen": bool(presenter_view.isInFullScreenMode()),
+	}
+
+dispatcher = control.Dispatcher()
+for command, action, description in [
+	("next",                next_page,                  "next slide"),
+	("prev",                prev_page,                  "previous slide"),
+	("next-frame",          next_frame,                 "next frame"),
+	("prev-frame",          prev_frame,                 "previous frame"),
+	("next-section",        next_section,               "next section"),
+	("prev-section",        prev_section,               "previous section"),
+	("first",               home_page,                  "first page"),
+	("last",                end_page,                   "last page"),
+	("back",                back,                       "back in history"),
+	("forward",             forward,                    "forward in history"),
+	("black",               toggle_black_view,          "toggle black view"),
+	("web",                 toggle_web_view,            "toggle web view"),
+	("poll",                toggle_poll_view,           "toggle poll view"),
+	("slide",               presentation_show,          "show slide view"),
+	("fullscreen",          toggle_fullscreen,          "toggle fullscreen"),
+	("windowed-fullscreen", toggle_windowed_fullscreen, "toggle windowed fullscreen"),
+	("erase",               erase_drawings,             "erase on-screen annotations"),
+	("undo",                undo_drawings,              "undo last annotation change"),
+	("redo",                redo_drawings,              "redo last undone annotation change"),
+	("overview",            toggle_overview,            "show/hide overview of the frames"),
+	("state",               presentation_state,         "current page and view"),
+	("sections",            list_sections,              "sections with their first and last pages"),
+	("help",                lambda: dispatcher.help(),  "list commands"),
+	("stats",               instruments.report,         "timings, counters and gauges"),
+	("export-ink",          lambda: export_ink(),       "write a copy of the pdf with the annotations"),
+]:
+	dispatcher.register(command, action, description)
+dispatcher.register("goto", goto_label,       "go to the first page with label, #<page> or outline title", "<label>")
+dispatcher.register("page", goto_page_number, "go to page number (from 1)", "<n>")
+dispatcher.register("search", search_slides,  "pages matching words (the last one as prefix)", "<words>")
+dispatcher.register("dump", instruments.dump,  "write timings as json to path", "<path>")
+
+class MainThreadCaller(NSObject):
+	def call_(self, request):
+		function, future = request
+		try:
+			future.set_result(function())
+		except Exception as error:
+			future.set_exception(error)
+		redraw.invalidate("presenter")
+main_thread_caller = MainThreadCaller.alloc().init()
+
+def call_on_main_thread(function):
+	future = Future()
+	main_thread_caller.performSelectorOnMainThread_withObject_waitUntilDone_(
+		"call:", [function, future], False)
+	return future
+
+if control_path:
+	control_server = control.ControlServer(dispatcher, control_path,
+	                                       call_on_main_thread).start()
+
+
+# pen annotations ############################################################
+
+# strokes are saved next to the pdf (see inkfile.py), read in the background
+# at launch then decoded page by page, and written in the background
+
+INK_FLUSH_TIMEOUT = 5. # seconds waited on quit for the last save
+
+ink_writer = inkfile.Writer(pdf_path,
+	lambda error: NSLog("unable to save annotations: %@", str(error)))
+
+def save_drawings():
+	ink_writer.save(dict((page, list(strokes)) for page, strokes in drawings.items()))
+
+def ink_pages():
+	"""pages with saved strokes"""
+	return ink_writer.source.pages() if ink_writer.source else []
+
+def attach_ink(ink):
+	if ink is not None:
+		drawings.set_loader(ink.strokes)
+		stream_page() # strokes of the pages shown so far renumbered
+		invalidate_slides()
+	ink_writer.attach(ink)
+
+def load_ink():
+	try:
+		ink = inkfile.find(pdf_path)
+	except (IOError, OSError, ValueError):
+		ink = None
+	if ink is None:
+		for path in inkfile.stale_paths(pdf_path): # never overwritten, see inkfile.save
+			NSLog("annotations of another build of %@ kept in %@", file_name, path)
+	call_on_main_thread(lambda: attach_ink(ink))
+
+ink_loader = threading.Thread(target=load_ink, name="ink-loader")
+ink_loader.daemon = True
+ink_loader.start()
+
+def export_ink():
+	"""copy of the pdf with the strokes as ink annotations, returns its path"""
+	drawings.load_all(ink_pages())
+	document = PDFDocument.alloc().initWithURL_(url)
+	for page_number, strokes in sorted(drawings.items()):
+		if not strokes or page_number >= document.pageCount():
+			continue
+		x0, y0, x1, y1 = strokes.bounds
+		pad = max(stroke.width for stroke in strokes)
+		origin = x0-pad, y0-pad
+		annotation = PDFAnnotationInk.alloc().initWithBounds_(
+			(origin, (x1-x0+2*pad, y1-y0+2*pad)))
+		annotation.setColor_(NSColor.blackColor())
+		border = PDFBorder.alloc().init()
+		border.setLineWidth_(pad/2.)
+		annotation.setBorder_(border)
+		for stroke in strokes:
+			annotation.addBezierPath_(stroke_path(stroke, origin))
+		document.pageAtIndex_(page_number).addAnnotation_(annotation)
+	path = "%s-annotated.pdf" % os.path.splitext(pdf_path)[0]
+	if not document.writeToFile_(path):
+		raise control.CommandError("unable to write '%s'" % path)
+	return path
+
+
+# search #####################################################################
+
+# once the pages are parsed, the search index is loaded (see search.py) or
+# built from the text of a document of its own, in the background
+
+search_index = None
+search_generation = 0 # bumped on reload, to drop indexes of an older pdf
+
+def index_pages(records, generation):
+	with objc.autorelease_pool():
+		try:
+			index = search.find(pdf_path)
+		except (IOError, OSError):
+			index = None
+		if index is None or len(index) != len(records):
+			document = PDFDocument.alloc().initWithURL_(url)
+			texts = [document.pageAtIndex_(page_number).string() or ""
+			         for page_number in range(document.pageCount())]
+			index = search.SearchIndex.build(texts, records)
+			try:
+				search.save(pdf_path, index)
+			except (IOError, OSError) as error:
+				NSLog("unable to save search index: %@", str(error))
+	call_on_main_thread(lambda: set_search_index(index, generation))
+
+def set_search_index(index, generation):
+	global search_index
+	if generation != search_generation or len(index) != page_count:
+		return
+	search_index = index
+	instruments.gauge("search", index.stats)
+	if presenter_view.search_query is not None:
+		presenter_view.update_search(presenter_view.search_query)
+		redraw.invalidate("presenter")
+
+def start_indexing():
+	global search_index, search_generation
+	search_index = None
+	search_generation += 1
+	thread = threading.Thread(target=index_pages, name="search",
+	                          args=(list(page_table.records), search_generation))
+	thread.daemon = True
+	thread.start()
+
+
+# live reload ################################################################
+
+# pages are matched across rebuilds by their keys (serializing and hashing
+# every page), computed on worker threads from documents of their own: the
+# keys of the open pdf as soon as it is opened, as PDFKit reads pages lazily
+# from a file that will have been rewritten by the time of the reload (pages
+# not keyed yet count as changed), and those of the rebuilt pdf before the
+# reload, which only remaps the presentation state on the main thread
+
+def page_key(document, page_number):
+	"""label and content hash of a page, to match it across rebuilds"""
+	return document.label(page_number), document.digest(page_number)
+
+def start_keying(function, name):
+	"""run function(worker_pdf) on a worker thread, worker_pdf being None if
+	the pdf cannot be read (probably still being written)"""
+	def run():
+		with objc.autorelease_pool():
+			worker_pdf = PDFDocument.alloc().initWithURL_(url)
+			if not worker_pdf or worker_pdf.pageCount() == 0:
+				worker_pdf = None
+		try:
+			function(worker_pdf and QuartzDocument(worker_pdf))
+		except Exception as error:
+			NSLog("keying pages failed: %@", str(error))
+	thread = threading.Thread(target=run, name=name)
+	thread.daemon = True
+	thread.start()
+
+def key_pages(keys):
+	"""fill keys with the keys of the pages of the open pdf, in the background"""
+	def key(worker_document):
+		if worker_document is None:
+			return
+		for page_number in range(min(len(keys), worker_document.page_count)):
+			with objc.autorelease_pool():
+				keys[page_number] = page_key(worker_document, page_number)
+	start_keying(key, "keys")
+
+page_keys = [(None, page) for page in range(page_count)] # unique until keyed
+key_pages(page_keys)
+reload_generation = 0
+
+def start_reload():
+	"""key the rebuilt pdf in the background, then reload it"""
+	global reload_generation
+	reload_generation += 1
+	generation = reload_generation
+	def key(worker_document):
+		if worker_document is None:
+			return # probably still being written, wait for the next change
+		new_keys = []
+		for page_number in range(worker_document.page_count):
+			with objc.autorelease_pool():
+				new_keys.append(page_key(worker_document, page_number))
+		call_on_main_thread(lambda: reload_pdf(new_keys, generation))
+	start_keying(key, "reload")
+
+def reload_pdf(new_keys, generation):
+	global pdf, document, page_count, last_page, last_frame, current_page, from_sidecar
+	global page_keys
+	if generation != reload_generation:
+		return # rebuilt again meanwhile
+	new_pdf = PDFDocument.alloc().initWithURL_(url)
+	if not new_pdf or new_pdf.pageCount() != len(new_keys):
+		return # rewritten since it was keyed, the watcher reports it again
+	
+	new_document = QuartzDocument(new_pdf)
+	page_map, moved, _ = match_pages(page_keys, new_keys)
+	
+	# unchanged pages keep their records, the others are parsed again
+	records = [None] * len(new_keys)
+	for old, new in moved.items():
+		record = page_table.records[old]
+		if record is not None:
+			records[new] = dict(record, links=remap_links(record["links"], page_map))
+	
+	pdf, document = new_pdf, new_document
+	page_keys = new_keys
+	page_count = pdf.pageCount()
+	last_page = page_count-1
+	last_frame = pdf.pageAtIndex_(last_page).label()
+	set_page_table(PageTable(page_count, extract_page, records))
+	from_sidecar = False
+	page_cache.remap(moved)
+	thumbnails.invalidate()
+	
+	current_page = page_map.get(current_page, last_page)
+	past_pages[:] = remap_pages(past_pages, page_map)
+	future_pages[:] = remap_pages(future_pages, page_map)
+	drawings.load_all(ink_pages()) # saved pages are numbered for the old pdf
+	ink_writer.source = None
+	remapped_drawings = remap_table(drawings, page_map)
+	drawings.clear()
+	drawings.update((page, PageStrokes(strokes))
+	                for page, strokes in remapped_drawings.items())
+	save_drawings()
+	
+	if stream_server is not None:
+		stream_server.invalidate()
+	stream_page()
+	presenter_view.annotation_state = None
+	warmer.restart()
+	invalidate_slides()
+	NSLog("reloaded %@: %d pages, %d changed", file_name, page_count, page_count-len(moved))
+
+class Reloader(NSObject):
+	def poll_(self, timer):
+		if watcher.poll():
+			start_reload()
+reloader = Reloader.alloc().init()
+watcher = FileWatcher(pdf_path)
+
+reloader_timer = NSTimer.scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(
+	RELOAD_INTERVAL,
+	reloader, "poll:",
+	nil, YES)
+
+
 # main loop ##################################################################
 
+WARM_PAGES = 32 # pages parsed per run loop turn while warming
+
+class Warmer(NSObject):
+	timer = None
+	profile = profile_startup
+	
+	def start(self):
+		if self.timer is not None:
+			return
+		if self.profile:
+			sys.stderr.write("first slide: %.3fs (%s/%s pages parsed)\n" % (
+				time.time()-launch_time, page_count-page_table.missing, page_count))
+		self.schedule()
+	
+	def restart(self):
+		if self.timer is not None:
+			self.timer.invalidate()
+		self.profile = False # launch is long gone
+		self.schedule()
+	
+	def schedule(self):
+		self.timer = NSTimer.scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(
+			0.,
+			self, "warm:",
+			nil, YES)
+	
+	def warm_(self, timer):
+		if not page_table.warm(WARM_PAGES):
+			return
+		build_deck()
+		if presenter_view.indexing or presenter_view.show_overview or presenter_view.show_sections:
+			redraw.invalidate("presenter")
+		start_indexing()
+		timer.invalidate()
+		if self.profile:
+			sys.stderr.write("full index: %.3fs\n" % (time.time()-launch_time))
+warmer = Warmer.alloc().init()
+
 class Refresher(NSObject):
 	def refresh_(self, timer=None):
-		for window in app.windows():
-			window.contentView().setNeedsDisplay_(True)
+		# only the clock changes with time, the rest is redrawn on events
+		if presenter_view.show_instruments:
+			redraw.invalidate("presenter")
+		elif presenter_view.clock_rect:
+			redraw.invalidate("presenter", presenter_view.clock_rect)
 refresher = Refresher.alloc().init()
 
 refresher_timer = NSTimer.scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(
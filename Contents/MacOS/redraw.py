@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Redraw scheduling for the presentation tool
+
+Views are invalidated by name, either entirely or only in a dirty rect, by
+the events that actually change what they show (clock ticks, page changes,
+pen strokes). Invalidations and redraws are counted per view so that the
+savings can be checked.
+"""
+
+
+# imports ####################################################################
+
+from collections import defaultdict
+
+
+# helpers ####################################################################
+
+def segment_rect(p0, p1, pad=0.):
+	"""bounding rect of the segment p0-p1, grown by pad on each side"""
+	(x0, y0), (x1, y1) = p0, p1
+	return ((min(x0, x1)-pad, min(y0, y1)-pad),
+	        (abs(x1-x0)+2*pad, abs(y1-y0)+2*pad))
+
+
+# redraw scheduler ###########################################################
+
+class Redraw(object):
+	"""dispatches invalidations to views and counts them
+
+	mark(view, rect) is called to actually invalidate view, rect being None
+	when the whole view is dirty.
+	"""
+
+	def __init__(self, mark):
+		self.mark = mark
+		self.views = {}
+		self.invalidations = defaultdict(int)
+		self.redraws = defaultdict(int)
+
+	def register(self, name, view):
+		self.views[name] = view
+
+	def invalidate(self, name, rect=None):
+		view = self.views.get(name)
+		if view is None:
+			return
+		self.invalidations[name] += 1
+		self.mark(view, rect)
+
+	def drew(self, name):
+		self.redraws[name] += 1
+
+	def stats(self):
+		return dict((name, dict(invalidations=self.invalidations[name],
+		                        redraws=self.redraws[name]))
+		            for name in sorted(self.views))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Live reload support for the presentation tool
+
+The presented file is polled for changes, and a rebuilt deck is diffed
+against the previous one by page key (label and content hash) so that the
+presentation state (current page, history, drawings, caches) can be moved to
+the corresponding new pages. Pure python, so that it can be tested headless.
+"""
+
+
+# imports ####################################################################
+
+import os
+
+from difflib import SequenceMatcher
+
+
+# file watching ##############################################################
+
+class FileWatcher(object):
+	"""polls a file, reporting a change once it has settled"""
+
+	def __init__(self, path):
+		self.path = path
+		self.stamp = self.read_stamp()
+		self.pending = None
+
+	def read_stamp(self):
+		try:
+			stat = os.stat(self.path)
+		except OSError:
+			return None
+		return stat.st_mtime, stat.st_size
+
+	def poll(self):
+		"""True if the file changed and did not change since the last poll"""
+		stamp = self.read_stamp()
+		if stamp is None or stamp == self.stamp:
+			self.pending = None
+			return False
+		if stamp != self.pending: # still being written, wait for next poll
+			self.pending = stamp
+			return False
+		self.stamp, self.pending = stamp, None
+		return True
+
+
+# diffing ####################################################################
+
+def match_pages(old_keys, new_keys):
+	"""match the pages of two versions of a deck given their keys
+
+	returns (page_map, moved, changed):
+	page_map: every old page to the new page that best corresponds to it
+	moved:    unchanged old pages to their new page number
+	changed:  sorted new pages that have no unchanged old counterpart
+	"""
+	last_page = len(new_keys)-1
+	matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+	page_map, moved = {}, {}
+	for tag, i0, i1, j0, j1 in matcher.get_opcodes():
+		for i in range(i0, i1):
+			if tag == "equal":
+				moved[i] = page_map[i] = j0 + (i-i0)
+			else:
+				# edited or removed pages go to the same place in the new deck
+				page_map[i] = max(min(j0 + (i-i0), j1-1, last_page), 0)
+	changed = sorted(set(range(len(new_keys))) - set(moved.values()))
+	return page_map, moved, changed
+
+
+def remap_pages(pages, page_map):
+	"""page list (e.g. navigation history) in new page numbers"""
+	return [page_map[page] for page in pages if page in page_map]
+
+
+def remap_table(table, page_map):
+	"""page -> list table (e.g. drawings) in new page numbers, merging lists
+	of pages that collapsed into the same new page"""
+	remapped = {}
+	for page, items in table.items():
+		if items and page in page_map:
+			remapped.setdefault(page_map[page], []).extend(items)
+	return remapped
+
+
+def remap_links(links, page_map):
+	"""section links of an unchanged page, pointing to new page numbers"""
+	return [(rect, page_map.get(destination, destination))
+	        for rect, destination in links]
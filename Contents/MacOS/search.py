@@ -0,0 +1,199 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+Full-text search of the presentation tool
+
+The text of every page, its notes and its questions are split into terms
+(lowercase, without accents) and indexed in an inverted index: term -> pages
+with the number of occurrences in each. Terms are also kept sorted, so that
+the last word of a query is matched as a prefix with a binary search while
+it is being typed. Pages are ranked by the occurrences of the query terms.
+
+The index is saved next to the sidecar (see sidecar.py) and is valid under
+the same conditions, same pdf size and mtime or, failing that, same content
+hash. This module is pure python, so that decks can be indexed off a Mac
+(the page text is then read with pypdf):
+
+	search.py build <doc.pdf>
+	search.py query <doc.pdf> <words>...
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import re
+import json
+import unicodedata
+
+from bisect import bisect_left
+from collections import Counter
+
+import sidecar
+
+
+# constants ##################################################################
+
+VERSION = 1
+EXTENSION = "search.json"
+MAX_EXPANSIONS = 256 # terms a prefix may match
+MAX_RESULTS = 50
+TITLE_LENGTH = 60    # characters of the first line of a page kept as title
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+# terms ######################################################################
+
+def fold(text):
+	"""lowercase text without accents"""
+	text = unicodedata.normalize("NFKD", text.lower())
+	return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+	return WORD.findall(fold(text))
+
+
+def title(text):
+	"""first non empty line of text, shortened"""
+	for line in text.splitlines():
+		line = " ".join(line.split())
+		if line:
+			return line[:TITLE_LENGTH]
+	return ""
+
+
+# index ######################################################################
+
+class SearchIndex(object):
+	"""postings: term -> flat list of page, count pairs, in page order"""
+
+	def __init__(self, postings, titles):
+		self.postings = postings
+		self.titles = titles
+		self.terms = sorted(postings)
+
+	def __len__(self):
+		return len(self.titles)
+
+	@classmethod
+	def build(cls, texts, records=None):
+		"""index of the pages with texts, and notes and questions of records"""
+		postings = {}
+		for page, text in enumerate(texts):
+			parts = [text or ""]
+			if records is not None and records[page] is not None:
+				parts.extend(records[page]["notes"])
+				parts.extend(records[page]["questions"])
+			for term, count in sorted(Counter(tokenize("\n".join(parts))).items()):
+				postings.setdefault(term, []).extend((page, count))
+		return cls(postings, [title(text or "") for text in texts])
+
+	def matches(self, word, prefix=False):
+		"""page -> occurrences of word, or of the terms it is a prefix of"""
+		if not prefix:
+			postings = self.postings.get(word, ())
+			return dict(zip(postings[::2], postings[1::2]))
+		pages = Counter()
+		i = bisect_left(self.terms, word)
+		for term in self.terms[i:i+MAX_EXPANSIONS]:
+			if not term.startswith(word):
+				break
+			postings = self.postings[term]
+			for page, count in zip(postings[::2], postings[1::2]):
+				pages[page] += count
+		return pages
+
+	def search(self, query, limit=MAX_RESULTS):
+		"""pages matching all words of query, best first; the last word is
+		a prefix unless query ends with a space"""
+		words = tokenize(query)
+		if not words:
+			return []
+		prefix = not query[-1:].isspace()
+		scores = None
+		for i, word in enumerate(words):
+			matches = self.matches(word, prefix and i == len(words)-1)
+			if scores is None:
+				scores = dict(matches)
+			else:
+				scores = dict((page, scores[page] + count)
+				              for page, count in matches.items() if page in scores)
+			if not scores:
+				return []
+		return sorted(scores, key=lambda page: (-scores[page], page))[:limit]
+
+	def stats(self):
+		return dict(pages=len(self.titles), terms=len(self.terms))
+
+
+# persistence ################################################################
+
+def find(pdf_path):
+	"""saved index of pdf_path if there is a valid one, else None"""
+	for path in sidecar.sidecar_paths(pdf_path, EXTENSION):
+		try:
+			with open(path) as f:
+				data = json.load(f)
+		except (IOError, OSError, ValueError):
+			continue
+		if data.get("version") != VERSION or \
+		   not sidecar.valid(pdf_path, data["size"], data["mtime"], data["hash"]):
+			continue
+		return SearchIndex(data["postings"], data["titles"])
+	return None
+
+
+def save(pdf_path, index, digest=None):
+	"""save index of pdf_path, returns the file path"""
+	stat = os.stat(pdf_path)
+	data = {
+		"version":  VERSION,
+		"file":     os.path.basename(pdf_path),
+		"size":     stat.st_size,
+		"mtime":    stat.st_mtime,
+		"hash":     digest or sidecar.content_hash(pdf_path),
+		"titles":   index.titles,
+		"postings": index.postings,
+	}
+	for path in sidecar.sidecar_paths(pdf_path, EXTENSION):
+		try:
+			sidecar.write_json(path, data)
+		except (IOError, OSError):
+			continue
+		return path
+
+
+def extract_texts(pdf_path):
+	"""text of every page of pdf_path, read with pypdf (not needed on Mac OS X)"""
+	from pypdf import PdfReader # optional, only for indexing off a Mac
+	return [page.extract_text() or "" for page in PdfReader(pdf_path).pages]
+
+
+# command line ###############################################################
+
+def main(args):
+	if len(args) < 2 or args[0] not in ("build", "query"):
+		sys.stderr.write(__doc__)
+		return 1
+	command, path = args[:2]
+	if command == "build":
+		records = sidecar.load(path) or sidecar.extract(path)
+		index = SearchIndex.build(extract_texts(path), records)
+		sys.stdout.write("%s: %s terms\n" % (save(path, index), len(index.terms)))
+		return 0
+	index = find(path)
+	if index is None:
+		sys.stderr.write("no valid search index for '%s'\n" % path)
+		return 1
+	for page in index.search(" ".join(args[2:])):
+		sys.stdout.write("%5s %s\n" % (page+1, index.titles[page]))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
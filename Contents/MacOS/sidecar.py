@@ -0,0 +1,244 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+Sidecar index of a pdf for the presentation tool
+
+Labels, section links, notes and questions of every page are saved as
+compact json next to the pdf (or in a cache directory if that one is not
+writable), so that warm starts skip annotation parsing. A sidecar is only
+used if the pdf has the same size and mtime as when it was written or,
+failing that, the same content hash: it invalidates itself when the pdf is
+rebuilt. Other files kept next to the pdf (annotations, search index) are
+checked with valid() and written with write_atomic() the same way.
+
+This module is pure python, so that sidecars can be inspected (and built,
+if pypdf is installed) on machines without PDFKit:
+
+	sidecar.py show <doc.pdf>|<sidecar.json>
+	sidecar.py build <doc.pdf>
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import json
+import hashlib
+
+
+# constants ##################################################################
+
+VERSION = 1
+CHUNK_SIZE = 1 << 20
+
+
+# locations ##################################################################
+
+def cache_dir():
+	if sys.platform == "darwin":
+		base = os.path.expanduser("~/Library/Caches")
+	else:
+		base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+	return os.path.join(base, "presentation")
+
+
+def sidecar_paths(pdf_path, extension="json"):
+	"""candidate sidecar files of pdf_path, preferred one first"""
+	pdf_path = os.path.abspath(pdf_path)
+	directory, name = os.path.split(pdf_path)
+	key = hashlib.sha1(pdf_path.encode("utf-8")).hexdigest()
+	return [
+		os.path.join(directory, ".%s.presentation.%s" % (name, extension)),
+		os.path.join(cache_dir(), "%s.%s" % (key, extension)),
+	]
+
+
+def content_hash(pdf_path):
+	digest = hashlib.sha1()
+	with open(pdf_path, "rb") as f:
+		for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def valid(pdf_path, size, mtime, hash):
+	"""whether a file saved for a pdf of size, mtime and content hash is
+	valid for pdf_path: same size and mtime or, failing that (touched,
+	copied or rebuilt), same size and content"""
+	stat = os.stat(pdf_path)
+	if (size, mtime) == (stat.st_size, stat.st_mtime):
+		return True
+	return size == stat.st_size and hash == content_hash(pdf_path)
+
+
+def write_atomic(path, data, binary=False):
+	"""write data (bytes if binary, else text) to path, creating its
+	directory if needed; written then renamed, so that a reader never sees
+	a partial file"""
+	directory = os.path.dirname(path)
+	if not os.path.isdir(directory):
+		os.makedirs(directory, exist_ok=True)
+	temp = "%s.%s" % (path, os.getpid())
+	with open(temp, "wb" if binary else "w") as f:
+		f.write(data)
+	os.rename(temp, path)
+
+
+# reading and writing ########################################################
+
+def read(path):
+	"""raw content of a sidecar file, None if missing or unreadable"""
+	try:
+		with open(path) as f:
+			data = json.load(f)
+	except (IOError, OSError, ValueError):
+		return None
+	if data.get("version") != VERSION:
+		return None
+	return data
+
+
+def find(pdf_path):
+	"""path and content of the valid sidecar of pdf_path, (None, None) if none"""
+	for path in sidecar_paths(pdf_path):
+		data = read(path)
+		if data is None or not valid(pdf_path, data["size"], data["mtime"], data["hash"]):
+			continue
+		mtime = os.stat(pdf_path).st_mtime
+		if data["mtime"] != mtime: # same content, the next check is cheap again
+			data["mtime"] = mtime
+			try:
+				write_json(path, data)
+			except (IOError, OSError):
+				pass
+		return path, data
+	return None, None
+
+
+def load(pdf_path):
+	"""page records saved for pdf_path, None if there is no valid sidecar"""
+	_, data = find(pdf_path)
+	if data is None:
+		return None
+	return [page_record(record) for record in data["pages"]]
+
+
+def save(pdf_path, records):
+	"""save page records for pdf_path, returns the sidecar path"""
+	stat = os.stat(pdf_path)
+	data = {
+		"version": VERSION,
+		"file":    os.path.basename(pdf_path),
+		"size":    stat.st_size,
+		"mtime":   stat.st_mtime,
+		"hash":    content_hash(pdf_path),
+		"pages":   [dict((key, record[key]) for key in PAGE_KEYS)
+		            for record in records],
+	}
+	for path in sidecar_paths(pdf_path):
+		try:
+			write_json(path, data)
+		except (IOError, OSError):
+			continue
+		return path
+
+
+def write_json(path, data):
+	write_atomic(path, json.dumps(data, separators=(",", ":")))
+
+
+# page records ###############################################################
+
+PAGE_KEYS = ["label", "links", "notes", "questions"]
+
+def page_record(data):
+	"""page record from its json form (rects and links back to tuples)"""
+	return {
+		"label":     data["label"],
+		"links":     [(((x, y), (w, h)), destination)
+		              for ((x, y), (w, h)), destination in data["links"]],
+		"notes":     list(data["notes"]),
+		"questions": list(data["questions"]),
+	}
+
+
+def extract(pdf_path):
+	"""page records of pdf_path, read with pypdf (not needed on Mac OS X)"""
+	from pypdf import PdfReader # optional, only for building off a Mac
+	from deck import is_section_link
+
+	reader = PdfReader(pdf_path)
+	labels = reader.page_labels
+	records = []
+	for page_number, page in enumerate(reader.pages):
+		record = dict(label=labels[page_number], links=[], notes=[], questions=[])
+		for annotation in page.get("/Annots") or []:
+			annotation = annotation.get_object()
+			subtype = annotation.get("/Subtype")
+			x0, y0, x1, y1 = [float(v) for v in annotation["/Rect"]]
+			rect = ((min(x0, x1), min(y0, y1)), (abs(x1-x0), abs(y1-y0)))
+			if subtype == "/Link" and is_section_link(rect):
+				destination = annotation.get("/Dest")
+				if destination is None:
+					action = annotation.get("/A") or {}
+					destination = action.get("/D")
+				record["links"].append((rect, _page_index(reader, destination)))
+			elif subtype == "/Text":
+				contents = annotation.get("/Contents") or ""
+				if contents.startswith("Q:"):
+					record["questions"].append(contents[2:])
+				else:
+					record["notes"].append(contents)
+		records.append(record)
+	return records
+
+
+def _page_index(reader, destination):
+	if destination is None:
+		return None
+	if not isinstance(destination, list):
+		destination = reader.named_destinations.get(str(destination))
+		if destination is None:
+			return None
+		return reader.get_destination_page_number(destination)
+	return reader.get_page_number(destination[0].get_object())
+
+
+# command line ###############################################################
+
+def show(path):
+	if path.endswith(".json"):
+		data = read(path)
+	else:
+		_, data = find(path)
+	if data is None:
+		sys.stderr.write("no valid sidecar for '%s'\n" % path)
+		return 1
+	pages = data["pages"]
+	sys.stdout.write("%s: %s pages, hash %s\n" % (data["file"], len(pages), data["hash"]))
+	for page_number, record in enumerate(pages):
+		sections = [destination for _, destination in record["links"]]
+		sys.stdout.write("%5s %-8s sections %s\n" % (page_number, record["label"], sections))
+		for note in record["notes"]:
+			sys.stdout.write("%14s %s\n" % ("note", note))
+		for question in record["questions"]:
+			sys.stdout.write("%14s %s\n" % ("Q:", question))
+	return 0
+
+
+def main(args):
+	if len(args) != 2 or args[0] not in ("show", "build"):
+		sys.stderr.write(__doc__)
+		return 1
+	command, path = args
+	if command == "build":
+		sys.stdout.write("%s\n" % save(path, extract(path)))
+		return 0
+	return show(path)
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,751 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+Audience streaming server of the presentation tool
+
+Remote attendees follow the audience window in a browser: the server serves
+a small viewer page, the images of the pages (exported beforehand, or
+rendered once on demand) and a websocket of compact json events, so that
+only what changes goes over the network:
+	state   everything below at once, on connection and after an overflow
+	page    page shown, its size and its strokes
+	view    view shown (slide, black, web or poll)
+	add     strokes added to a page, [id, width, points, widths or null]
+	erase   ids of the strokes removed from a page
+	ink     points of the stroke being drawn
+	ticker  message of the feed ticker
+	frame   version of the web view capture, only sent while it is shown
+
+Events are encoded once and queued to every client. The queue of a client
+is bounded, in events and in lag: a client that does not keep up (its
+oldest event not yet handed to the kernel is more than MAX_LAG seconds
+old) has its queue dropped and gets a state event instead, the others
+never wait for it. Everything runs on one asyncio loop in a thread,
+publish() may be called from any thread.
+
+	stream.py export <doc.pdf>|synthetic:<pages> <dir> [<width>]
+	stream.py bench [-c <clients>] [-s <slow clients>] [-e <events/s>]
+	                [-d <seconds>]
+
+export writes the page images (page-<n>.png) served with --stream-images,
+bench runs the server against synthetic clients and prints the latencies
+and the overflows, exiting with 2 if a slow client was never resynced.
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import re
+import json
+import time
+import socket
+import struct
+import base64
+import hashlib
+import getopt
+import threading
+import asyncio
+
+from collections import deque
+from concurrent.futures import Future
+
+
+# constants ##################################################################
+
+LOCALHOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_BACKLOG = 64     # events queued per client before it is resynced
+MAX_LAG = 1.             # seconds an event may wait before its client is resynced
+DEFAULT_IMAGE_WIDTH = 1280 # pixels of the exported page images
+PRECISION = 1            # decimals of the coordinates sent
+
+SEND_BUFFER = 1 << 13    # bytes buffered per client (kernel and transport)
+MAX_HEADERS = 64         # lines of a http request
+MAX_MESSAGE = 1 << 12    # bytes of a client websocket message
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+TEXT, CLOSE, PING, PONG = 0x1, 0x8, 0x9, 0xa
+
+PAGE_PATH = re.compile(r"^/pages/(\d+)\.png$")
+
+
+# events #####################################################################
+
+def rounded(values):
+	return [round(value, PRECISION) for value in values]
+
+
+def encode_stroke(i, stroke):
+	"""compact description of stroke i"""
+	widths = rounded(stroke.widths) if stroke.widths is not None else None
+	return [i, round(stroke.width, 2), rounded(stroke.points), widths]
+
+
+def encode(event):
+	return json.dumps(event, separators=(",", ":")).encode("utf-8")
+
+
+class StreamState(object):
+	"""what the audience sees, as known from the events published"""
+
+	def __init__(self):
+		self.page = 0
+		self.size = None
+		self.view = "slide"
+		self.strokes = {}
+		self.ticker = ""
+		self.frame = 0
+		self.generation = 0
+
+	def apply(self, event):
+		kind = event["t"]
+		if kind == "page":
+			self.page, self.size = event["page"], event["size"]
+			self.generation = event.get("g", self.generation)
+			self.strokes = dict((stroke[0], stroke) for stroke in event["strokes"])
+		elif kind == "view":
+			self.view = event["view"]
+		elif kind == "add" and event["page"] == self.page:
+			for stroke in event["strokes"]:
+				self.strokes[stroke[0]] = stroke
+		elif kind == "erase" and event["page"] == self.page:
+			for i in event["ids"]:
+				self.strokes.pop(i, None)
+		elif kind == "ticker":
+			self.ticker = event["text"]
+		elif kind == "frame":
+			self.frame = event["v"]
+
+	def snapshot(self):
+		return {
+			"t":      "state",
+			"page":   self.page,
+			"size":   self.size,
+			"g":      self.generation,
+			"view":   self.view,
+			"strokes": [self.strokes[i] for i in sorted(self.strokes)],
+			"ticker": self.ticker,
+			"v":      self.frame,
+		}
+
+
+# websocket ##################################################################
+
+def accept_key(key):
+	digest = hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()
+	return base64.b64encode(digest).decode("ascii")
+
+
+def ws_frame(payload, opcode=TEXT):
+	"""unmasked (server) websocket frame"""
+	length = len(payload)
+	if length < 126:
+		header = struct.pack("!BB", 0x80 | opcode, length)
+	elif length < 1 << 16:
+		header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+	else:
+		header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+	return header + payload
+
+
+async def read_ws_frame(reader, limit=MAX_MESSAGE):
+	"""opcode and payload of the next websocket frame (masked or not)"""
+	first, second = await reader.readexactly(2)
+	length = second & 0x7f
+	if length == 126:
+		length, = struct.unpack("!H", await reader.readexactly(2))
+	elif length == 127:
+		length, = struct.unpack("!Q", await reader.readexactly(8))
+	if length > limit:
+		raise ValueError("websocket message too long")
+	mask = await reader.readexactly(4) if second & 0x80 else None
+	payload = await reader.readexactly(length)
+	if mask:
+		payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+	return first & 0x0f, payload
+
+
+# server #####################################################################
+
+class Client(object):
+	"""a websocket connection and its bounded queue of frames"""
+
+	def __init__(self, writer, backlog, max_lag=MAX_LAG):
+		self.writer = writer
+		self.backlog = backlog
+		self.max_lag = max_lag
+		self.frames = deque()  # (frame, time) not written yet
+		self.written = deque() # (end offset, time) of the frames in the transport
+		self.offset = 0        # bytes written to the transport
+		self.ready = asyncio.Event()
+		self.resync = True # starts with a state event
+		self.overflows = 0
+
+	def write(self, frame, published):
+		self.writer.write(frame)
+		self.offset += len(frame)
+		self.written.append((self.offset, published))
+
+	def lag(self, now):
+		"""age of the oldest frame not handed to the kernel yet"""
+		flushed = self.offset - self.writer.transport.get_write_buffer_size()
+		while self.written and self.written[0][0] <= flushed:
+			self.written.popleft()
+		if self.written:
+			return now - self.written[0][1]
+		if self.frames:
+			return now - self.frames[0][1]
+		return 0.
+
+	def push(self, frame, now):
+		if self.resync:
+			return # the state event will hold it
+		if len(self.frames) >= self.backlog or self.lag(now) > self.max_lag:
+			self.frames.clear()
+			self.resync = True
+			self.overflows += 1
+		else:
+			self.frames.append((frame, now))
+		self.ready.set()
+
+
+class StreamServer(object):
+	"""images(page) gives the png of a page, as bytes or a Future of bytes,
+	None if there is none"""
+
+	def __init__(self, images, port=DEFAULT_PORT, host=LOCALHOST, backlog=DEFAULT_BACKLOG):
+		self.images = images
+		self.host, self.port = host, port
+		self.backlog = backlog
+		self.state = StreamState()
+		self.clients = set()
+		self.snapshot = None # frame of the state event, until the state changes
+		self.pages = {}      # page -> png, for the current generation
+		self.frame_data = None
+		self.frame_digest = None
+		self.connections = self.requests = self.events = 0
+		self.sent = self.overflows = self.peak = 0
+		self.loop = asyncio.new_event_loop()
+		self.ready = threading.Event()
+		self.thread = threading.Thread(target=self.run, name="stream")
+		self.thread.daemon = True
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def run(self):
+		asyncio.set_event_loop(self.loop)
+		self.loop.run_until_complete(self.listen())
+		self.ready.set()
+		self.loop.run_forever()
+
+	async def listen(self):
+		try:
+			self.server = await asyncio.start_server(self.handle, self.host, self.port)
+		except OSError as error:
+			sys.stderr.write("stream server %s:%s failed: %s\n" % (self.host, self.port, error))
+			return
+		self.port = self.server.sockets[0].getsockname()[1] # when given 0
+
+	def stop(self):
+		self.loop.call_soon_threadsafe(self.loop.stop)
+
+	# events (any thread)
+
+	def publish(self, event):
+		self.loop.call_soon_threadsafe(self._publish, event)
+
+	def set_frame(self, data):
+		"""capture of the web view, only published while it is shown"""
+		self.loop.call_soon_threadsafe(self._set_frame, data)
+
+	def invalidate(self):
+		"""forget the page images (the document changed), clients load them
+		again from the next page event"""
+		self.loop.call_soon_threadsafe(self._invalidate)
+
+	def _invalidate(self):
+		self.pages.clear()
+		self.state.generation += 1
+
+	def _publish(self, event):
+		if event["t"] == "page":
+			event = dict(event, g=self.state.generation)
+		self.state.apply(event)
+		self.snapshot = None
+		self.events += 1
+		frame = ws_frame(encode(event))
+		now = time.time()
+		for client in self.clients:
+			client.push(frame, now)
+
+	def _set_frame(self, data):
+		if self.state.view != "web":
+			return
+		digest = hashlib.sha1(data).digest()
+		if digest == self.frame_digest:
+			return
+		self.frame_data, self.frame_digest = data, digest
+		self._publish({"t": "frame", "v": self.state.frame + 1})
+
+	def state_frame(self):
+		if self.snapshot is None:
+			self.snapshot = ws_frame(encode(self.state.snapshot()))
+		return self.snapshot
+
+	# connections
+
+	async def handle(self, reader, writer):
+		self.connections += 1
+		try:
+			request = (await reader.readline()).decode("latin-1").split()
+			headers = {}
+			for _ in range(MAX_HEADERS):
+				line = (await reader.readline()).decode("latin-1")
+				if not line.strip():
+					break
+				name, _, value = line.partition(":")
+				headers[name.strip().lower()] = value.strip()
+			if len(request) < 2 or request[0] != "GET":
+				await self.respond(writer, "405 Method Not Allowed")
+				return
+			self.requests += 1
+			path = request[1].partition("?")[0]
+			if path == "/events" and headers.get("upgrade", "").lower() == "websocket":
+				await self.serve_events(reader, writer, headers.get("sec-websocket-key", ""))
+			else:
+				await self.serve_file(writer, path)
+		except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+			pass
+		finally:
+			writer.close()
+
+	async def respond(self, writer, status, body=b"", content_type="text/plain", cache="no-store"):
+		writer.write(("HTTP/1.0 %s\r\n"
+		              "Content-Type: %s\r\n"
+		              "Content-Length: %s\r\n"
+		              "Cache-Control: %s\r\n"
+		              "Connection: close\r\n\r\n" % (
+		              status, content_type, len(body), cache)).encode("ascii") + body)
+		await writer.drain()
+
+	async def serve_file(self, writer, path):
+		if path == "/":
+			await self.respond(writer, "200 OK", VIEWER.encode("utf-8"), "text/html; charset=utf-8")
+			return
+		if path == "/frame" and self.frame_data is not None:
+			await self.respond(writer, "200 OK", self.frame_data, "image/png")
+			return
+		match = PAGE_PATH.match(path)
+		try:
+			data = match and await self.page_image(int(match.group(1))-1)
+		except Exception as error: # requested again by the next viewer
+			sys.stderr.write("stream image of %s failed: %s\n" % (path, error))
+			await self.respond(writer, "500 Internal Server Error")
+			return
+		if data:
+			# urls hold the generation, cached images are never stale
+			await self.respond(writer, "200 OK", data, "image/png", "max-age=86400")
+			return
+		await self.respond(writer, "404 Not Found")
+
+	async def page_image(self, page):
+		if page in self.pages:
+			return self.pages[page]
+		generation = self.state.generation
+		data = self.images(page)
+		if isinstance(data, Future):
+			data = await asyncio.wrap_future(data)
+		if data is not None and generation == self.state.generation:
+			self.pages[page] = data # not if the document changed meanwhile
+		return data
+
+	async def serve_events(self, reader, writer, key):
+		if not key:
+			await self.respond(writer, "400 Bad Request")
+			return
+		writer.write(("HTTP/1.1 101 Switching Protocols\r\n"
+		              "Upgrade: websocket\r\n"
+		              "Connection: Upgrade\r\n"
+		              "Sec-WebSocket-Accept: %s\r\n\r\n" % accept_key(key)).encode("ascii"))
+		# small buffers, so that a slow client overflows its queue soon
+		# rather than lagging behind by megabytes
+		sock = writer.get_extra_info("socket")
+		if sock is not None:
+			sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+		writer.transport.set_write_buffer_limits(SEND_BUFFER)
+		client = Client(writer, self.backlog)
+		client.ready.set()
+		self.clients.add(client)
+		self.peak = max(self.peak, len(self.clients))
+		sending = self.loop.create_task(self.send(client))
+		try:
+			while True:
+				opcode, payload = await read_ws_frame(reader)
+				if opcode == CLOSE:
+					writer.write(ws_frame(payload[:2], CLOSE))
+					break
+				if opcode == PING:
+					writer.write(ws_frame(payload, PONG))
+		finally:
+			self.clients.discard(client)
+			self.overflows += client.overflows
+			sending.cancel()
+
+	async def send(self, client):
+		try:
+			while True:
+				await client.ready.wait()
+				client.ready.clear()
+				if client.resync:
+					client.resync = False
+					client.written.clear() # what is left of the backlog has MAX_LAG to go
+					client.write(self.state_frame(), time.time())
+					self.sent += 1
+				# frames go to the transport as it empties, the queue being
+				# dropped if the client falls behind meanwhile
+				while client.frames:
+					client.write(*client.frames.popleft())
+					self.sent += 1
+					await client.writer.drain()
+				await client.writer.drain()
+		except ConnectionError:
+			pass
+
+	def stats(self):
+		return dict(clients=len(self.clients), peak=self.peak,
+		            connections=self.connections, requests=self.requests,
+		            events=self.events, sent=self.sent,
+		            overflows=self.overflows + sum(c.overflows for c in self.clients),
+		            pages=len(self.pages), frame=self.state.frame)
+
+
+def directory_images(path):
+	"""images(page) reading the page-<n>.png files of a directory"""
+	def images(page):
+		try:
+			with open(os.path.join(path, "page-%d.png" % (page+1)), "rb") as f:
+				return f.read()
+		except (IOError, OSError):
+			return None
+	return images
+
+
+def parse_address(spec):
+	"""host and port of [<host>:]<port>"""
+	host, _, port = spec.rpartition(":")
+	try:
+		return host or LOCALHOST, int(port)
+	except ValueError:
+		raise ValueError("invalid stream address '%s'" % spec)
+
+
+# viewer #####################################################################
+
+VIEWER = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>presentation</title>
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+html, body { margin: 0; height: 100%; background: black; overflow: hidden; }
+canvas { display: block; }
+#ticker { position: fixed; bottom: 8px; white-space: nowrap; color: rgba(255,255,255,.75);
+          font: 24px sans-serif; text-shadow: 0 0 3px black; }
+</style></head><body>
+<canvas id="view"></canvas><div id="ticker"></div>
+<script>
+var canvas = document.getElementById("view"), ctx = canvas.getContext("2d");
+var ticker = document.getElementById("ticker");
+var state = null, strokes = new Map(), ink = [], image = null, frame = null;
+
+function load(src, set) {
+	var img = new Image();
+	img.onload = function() { set(img); draw(); };
+	img.src = src;
+}
+
+function showPage() {
+	var page = state.page, g = state.g;
+	image = null;
+	load("pages/" + (page+1) + ".png?g=" + g,
+	     function(img) { if (state.page == page && state.g == g) image = img; });
+}
+
+function showFrame() {
+	load("frame?v=" + state.v, function(img) { frame = img; });
+}
+
+function setTicker(text) {
+	ticker.textContent = text;
+	ticker.animate([{transform: "translateX(" + innerWidth + "px)"},
+	                {transform: "translateX(-100%)"}],
+	               {duration: 40 * (innerWidth + ticker.offsetWidth)});
+}
+
+function fit(w, h) {
+	var s = Math.min(canvas.width/w, canvas.height/h);
+	return [s, (canvas.width - s*w)/2, (canvas.height - s*h)/2];
+}
+
+function drawStroke(points, width, widths, s, x0, y0, h) {
+	ctx.lineCap = ctx.lineJoin = "round";
+	function X(i) { return x0 + s*points[2*i]; }
+	function Y(i) { return y0 + s*(h - points[2*i+1]); }
+	var n = points.length/2;
+	if (!widths) {
+		ctx.lineWidth = s*width;
+		ctx.beginPath();
+		ctx.moveTo(X(0), Y(0));
+		for (var i = 1; i < n; i++) ctx.lineTo(X(i), Y(i));
+		if (n == 1) ctx.lineTo(X(0), Y(0));
+		ctx.stroke();
+		return;
+	}
+	for (var i = 1; i < n; i++) {
+		ctx.lineWidth = s*(widths[i-1] + widths[i])/2;
+		ctx.beginPath();
+		ctx.moveTo(X(i-1), Y(i-1));
+		ctx.lineTo(X(i), Y(i));
+		ctx.stroke();
+	}
+}
+
+function draw() {
+	ctx.fillStyle = "black";
+	ctx.fillRect(0, 0, canvas.width, canvas.height);
+	if (!state) return;
+	if (state.view == "web") {
+		if (frame) {
+			var f = fit(frame.width, frame.height);
+			ctx.drawImage(frame, f[1], f[2], f[0]*frame.width, f[0]*frame.height);
+		}
+		return;
+	}
+	if (state.view != "slide" || !state.size) return;
+	var w = state.size[0], h = state.size[1], f = fit(w, h);
+	if (image) ctx.drawImage(image, f[1], f[2], f[0]*w, f[0]*h);
+	else { ctx.fillStyle = "white"; ctx.fillRect(f[1], f[2], f[0]*w, f[0]*h); }
+	ctx.strokeStyle = "black";
+	Array.from(strokes.keys()).sort(function(a, b) { return a - b; }).forEach(function(i) {
+		var stroke = strokes.get(i);
+		drawStroke(stroke[2], stroke[1], stroke[3], f[0], f[1], f[2], h);
+	});
+	if (ink.length) drawStroke(ink, state.inkWidth || 1, null, f[0], f[1], f[2], h);
+}
+
+function setStrokes(list) {
+	strokes = new Map();
+	list.forEach(function(stroke) { strokes.set(stroke[0], stroke); });
+	ink = [];
+}
+
+var handlers = {
+	state: function(e) {
+		var old = state || {};
+		state = e;
+		setStrokes(e.strokes);
+		if (e.page !== old.page || e.g !== old.g) showPage();
+		if (e.view == "web" && e.v !== old.v) showFrame();
+		if (e.ticker && e.ticker != old.ticker) setTicker(e.ticker);
+	},
+	page: function(e) {
+		state.page = e.page; state.size = e.size; state.g = e.g;
+		setStrokes(e.strokes);
+		showPage();
+	},
+	view: function(e) {
+		state.view = e.view;
+		if (e.view == "web") showFrame();
+	},
+	add: function(e) {
+		if (e.page != state.page) return;
+		e.strokes.forEach(function(stroke) { strokes.set(stroke[0], stroke); });
+		ink = [];
+	},
+	erase: function(e) {
+		if (e.page != state.page) return;
+		e.ids.forEach(function(i) { strokes.delete(i); });
+	},
+	ink: function(e) {
+		if (e.page != state.page) return;
+		ink = ink.concat(e.points);
+		state.inkWidth = e.width;
+	},
+	ticker: function(e) { state.ticker = e.text; setTicker(e.text); },
+	frame: function(e) { state.v = e.v; showFrame(); }
+};
+
+function connect() {
+	var socket = new WebSocket(location.href.replace(/^http/, "ws").replace(/[^\\/]*$/, "events"));
+	socket.onmessage = function(message) {
+		var e = JSON.parse(message.data);
+		if (state || e.t == "state") handlers[e.t](e);
+		draw();
+	};
+	socket.onclose = function() { setTimeout(connect, 1000); };
+}
+
+function resize() {
+	canvas.width = innerWidth; canvas.height = innerHeight;
+	draw();
+}
+addEventListener("resize", resize);
+resize();
+connect();
+</script></body></html>
+"""
+
+
+# export #####################################################################
+
+def export(spec, path, width=DEFAULT_IMAGE_WIDTH):
+	"""write the page images of a document (see tiles.open_document)"""
+	from document import IDENTITY, encode_png
+	from tiles import open_document
+	document = open_document(spec)
+	if not os.path.isdir(path):
+		os.makedirs(path)
+	for page in range(document.page_count):
+		w, h = document.size(page)
+		image, _ = document.render(page, (width, int(round(width*h/w))), IDENTITY)
+		with open(os.path.join(path, "page-%d.png" % (page+1)), "wb") as f:
+			f.write(encode_png(image))
+	return document.page_count
+
+
+# benchmark ##################################################################
+
+BENCH_CLIENTS = 200
+BENCH_SLOW = 10
+BENCH_RATE = 100.   # events per second
+BENCH_DURATION = 5. # seconds
+BENCH_POINTS = 64   # points per ink event
+SLOW_BUFFER = 4096  # receive buffer of the slow clients, in bytes
+SLOW_DELAY = .05    # seconds a slow client sleeps between reads
+BENCH_DRAIN = 10.   # seconds given to the clients to catch up at the end
+
+
+class BenchClient(object):
+	def __init__(self, slow):
+		self.slow = slow
+		self.latencies = []
+		self.events = self.resyncs = self.last = 0
+
+	async def run(self, host, port, stopped):
+		sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		if self.slow:
+			sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SLOW_BUFFER)
+		sock.setblocking(False)
+		await asyncio.get_event_loop().sock_connect(sock, (host, port))
+		reader, writer = await asyncio.open_connection(
+			sock=sock, limit=SLOW_BUFFER if self.slow else 1 << 20)
+		key = base64.b64encode(os.urandom(16)).decode("ascii")
+		writer.write(("GET /events HTTP/1.1\r\nHost: %s\r\n"
+		              "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+		              "Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n" % (
+		              host, key)).encode("ascii"))
+		status = await reader.readline()
+		if b" 101 " not in status:
+			raise ValueError("handshake failed: %r" % status)
+		while (await reader.readline()).strip():
+			pass
+		try:
+			while not stopped.is_set():
+				_, payload = await read_ws_frame(reader, float("inf"))
+				event = json.loads(payload.decode("utf-8"))
+				self.events += 1
+				if event["t"] == "state":
+					self.resyncs += 1
+				elif "ts" in event:
+					self.latencies.append(time.time() - event["ts"])
+					self.last = event["n"]
+				if self.slow:
+					await asyncio.sleep(SLOW_DELAY)
+		except (ConnectionError, asyncio.IncompleteReadError):
+			pass
+		finally:
+			writer.close()
+
+
+def percentile(values, p):
+	values = sorted(values)
+	return values[min(int(p*len(values)), len(values)-1)] if values else float("nan")
+
+
+def bench(clients=BENCH_CLIENTS, slow=BENCH_SLOW, rate=BENCH_RATE, duration=BENCH_DURATION):
+	server = StreamServer(lambda page: None, port=0).start()
+	server.ready.wait()
+	server.publish({"t": "page", "page": 0, "size": [362.83, 272.13], "strokes": []})
+
+	async def run():
+		stopped = asyncio.Event()
+		bench_clients = [BenchClient(i < slow) for i in range(clients)]
+		tasks = [asyncio.ensure_future(client.run(LOCALHOST, server.port, stopped))
+		         for client in bench_clients]
+		while len(server.clients) < clients:
+			await asyncio.sleep(.01)
+		start = time.time()
+		count = 0
+		while time.time() - start < duration:
+			count += 1
+			points = [float(count % 300 + i) for i in range(2*BENCH_POINTS)]
+			server.publish({"t": "ink", "page": 0, "width": 2., "points": points,
+			                "n": count, "ts": time.time()})
+			await asyncio.sleep(max(start + count/rate - time.time(), 0.))
+		# let the clients catch up, the slow ones by a resync
+		deadline = time.time() + BENCH_DRAIN
+		while time.time() < deadline and not all(
+			client.last == count or client.resyncs > 1 for client in bench_clients):
+			await asyncio.sleep(.05)
+		stopped.set()
+		for task in tasks:
+			task.cancel()
+		await asyncio.sleep(.1)
+		return bench_clients, count
+
+	bench_clients, count = asyncio.new_event_loop().run_until_complete(run())
+	for kind, group in [("fast", [c for c in bench_clients if not c.slow]),
+	                    ("slow", [c for c in bench_clients if c.slow])]:
+		if not group:
+			continue
+		latencies = [l for client in group for l in client.latencies]
+		sys.stdout.write("%s clients: %4d  events %.0f/%d  latency p50 %.1fms p95 %.1fms max %.1fms  resyncs %.1f\n" % (
+			kind, len(group), sum(c.events for c in group)/float(len(group)), count,
+			1000*percentile(latencies, .5), 1000*percentile(latencies, .95),
+			1000*max(latencies or [float("nan")]),
+			sum(c.resyncs - 1 for c in group)/float(len(group))))
+	sys.stdout.write("server: %s\n" % json.dumps(server.stats(), sort_keys=True))
+	# slow clients must have been resynced rather than left behind
+	stuck = [c for c in bench_clients if c.slow and c.resyncs < 2]
+	if stuck:
+		sys.stdout.write("%s slow clients never resynced\n" % len(stuck))
+	return not stuck
+
+
+# command line ###############################################################
+
+def main(args):
+	if args[:1] == ["export"] and len(args) in (3, 4):
+		count = export(args[1], args[2], *[int(value) for value in args[3:]])
+		sys.stdout.write("%s: %s pages\n" % (args[2], count))
+		return 0
+	if args[:1] == ["bench"]:
+		try:
+			options, rest = getopt.getopt(args[1:], "c:s:e:d:")
+		except getopt.GetoptError as error:
+			rest = [error]
+		if not rest:
+			values = dict(options)
+			passed = bench(int(values.get("-c", BENCH_CLIENTS)), int(values.get("-s", BENCH_SLOW)),
+			               float(values.get("-e", BENCH_RATE)), float(values.get("-d", BENCH_DURATION)))
+			return 0 if passed else 2
+	sys.stderr.write(__doc__)
+	return 1
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
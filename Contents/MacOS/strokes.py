@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Pen strokes of the presentation tool
+
+Strokes are polylines in page coordinates, their points kept in flat float
+arrays (x0, y0, x1, y1, ...) with their bounds updated as points are added.
+Committed strokes are simplified (Douglas-Peucker) and each page keeps the
+union of the bounds of its strokes and a version, renewed on every change,
+so that views can cache an overlay of the committed strokes per version.
+Pure python, independent of the drawing backend.
+
+Pages index their strokes by id in a grid of GRID points cells, so that
+erasing at a point or finding the strokes of a rect only looks at the
+strokes of the cells around. Adding, erasing and clearing are undone and
+redone per page, each in time proportional to the strokes it touched, and
+a log of the recent changes (strokes added, rect of the strokes removed)
+lets views update their overlay instead of rendering it again.
+
+Input goes through an inking pipeline, a generator fed the raw pen points
+(x, y, pressure) that drops the points closer than a minimum distance to
+the previous one, maps the pressure to a width and yields the smoothed
+stroke as cubic Bezier segments of a Catmull-Rom spline through the kept
+points:
+
+	pipeline = inking(width)
+	next(pipeline)
+	segments = pipeline.send((x, y, pressure)) # for every input event
+	segments = pipeline.send(None)             # the last segments
+
+Strokes only keep the points of the spline (and their widths if they vary),
+their segments are computed again when they are drawn.
+"""
+
+
+# imports ####################################################################
+
+from array import array
+from collections import namedtuple, deque
+import itertools
+
+
+# constants ##################################################################
+
+SIMPLIFY_TOLERANCE = .25 # page points a simplified stroke may deviate by
+MIN_DISTANCE = 1.        # page points between the points kept from the input
+MAX_POINTS = 1024        # points of a stroke, longer ones are split
+GRID = 32.               # page points per cell of the stroke index
+CHANGES = 64             # changes logged per page, for incremental overlays
+MIN_WIDTH = .3           # fraction of the width at null pressure
+PRESSURE_GAMMA = .6
+
+EMPTY_BOUNDS = None
+
+versions = itertools.count(1) # shared, so that a version never names two contents
+
+
+# geometry ###################################################################
+
+def union(bounds, other):
+	"""union of (x0, y0, x1, y1) bounds, None being empty"""
+	if bounds is None:
+		return other
+	if other is None:
+		return bounds
+	return (min(bounds[0], other[0]), min(bounds[1], other[1]),
+	        max(bounds[2], other[2]), max(bounds[3], other[3]))
+
+
+def padded(bounds, pad):
+	x0, y0, x1, y1 = bounds
+	return x0-pad, y0-pad, x1+pad, y1+pad
+
+
+def intersects(bounds, other):
+	return (bounds is not None and other is not None and
+	        bounds[0] <= other[2] and other[0] <= bounds[2] and
+	        bounds[1] <= other[3] and other[1] <= bounds[3])
+
+
+def _distance2(px, py, ax, ay, bx, by):
+	"""squared distance of p to the segment ab"""
+	dx, dy = bx-ax, by-ay
+	length2 = dx*dx + dy*dy
+	if length2 == 0.:
+		return (px-ax)**2 + (py-ay)**2
+	t = max(0., min(1., ((px-ax)*dx + (py-ay)*dy)/length2))
+	return (px-ax-t*dx)**2 + (py-ay-t*dy)**2
+
+
+def stroke_distance2(stroke, x, y):
+	"""squared distance of (x, y) to the polyline through the stroke points"""
+	points = stroke.points
+	if len(points) == 2:
+		return (x-points[0])**2 + (y-points[1])**2
+	return min(_distance2(x, y, points[i], points[i+1], points[i+2], points[i+3])
+	           for i in range(0, len(points)-2, 2))
+
+
+def douglas_peucker(points, tolerance):
+	"""indices of the points (flat x, y array) kept by the simplification"""
+	count = len(points)//2
+	if count <= 2:
+		return list(range(count))
+	keep = [False]*count
+	keep[0] = keep[-1] = True
+	tolerance2 = tolerance*tolerance
+	stack = [(0, count-1)]
+	while stack:
+		first, last = stack.pop()
+		ax, ay = points[2*first], points[2*first+1]
+		bx, by = points[2*last], points[2*last+1]
+		farthest, distance = None, tolerance2
+		for i in range(first+1, last):
+			d = _distance2(points[2*i], points[2*i+1], ax, ay, bx, by)
+			if d > distance:
+				farthest, distance = i, d
+		if farthest is not None:
+			keep[farthest] = True
+			stack.append((first, farthest))
+			stack.append((farthest, last))
+	return [i for i in range(count) if keep[i]]
+
+
+Segment = namedtuple("Segment", "p0 c0 c1 p1 w0 w1")
+Segment.__doc__ = "cubic Bezier segment from p0 to p1, widths w0 and w1 at its ends"
+
+
+def catmull_rom(p0, p1, p2, p3, w1, w2):
+	"""segment of the Catmull-Rom spline from p1 to p2"""
+	return Segment(p1, (p1[0] + (p2[0]-p0[0])/6., p1[1] + (p2[1]-p0[1])/6.),
+	                   (p2[0] - (p3[0]-p1[0])/6., p2[1] - (p3[1]-p1[1])/6.), p2, w1, w2)
+
+
+def segment_bounds(segment):
+	"""bounds of the control points, which contain the curve"""
+	xs = segment.p0[0], segment.c0[0], segment.c1[0], segment.p1[0]
+	ys = segment.p0[1], segment.c0[1], segment.c1[1], segment.p1[1]
+	return min(xs), min(ys), max(xs), max(ys)
+
+
+# strokes ####################################################################
+
+class Stroke(object):
+	"""points of a spline, with their widths when they are not all width"""
+
+	def __init__(self, points=(), width=2., widths=None):
+		self.width = width
+		self.points = array("f")
+		self.widths = None
+		self.bounds = EMPTY_BOUNDS
+		for i in range(0, len(points), 2):
+			self.append(points[i], points[i+1], widths[i//2] if widths else None)
+
+	def __len__(self):
+		return len(self.points)//2
+
+	def __iter__(self):
+		points = self.points
+		for i in range(0, len(points), 2):
+			yield points[i], points[i+1]
+
+	def point(self, i):
+		return self.points[2*i], self.points[2*i+1]
+
+	def point_width(self, i):
+		return self.width if self.widths is None else self.widths[i]
+
+	def _extend(self, bounds):
+		self.bounds = union(self.bounds, bounds)
+
+	def append(self, x, y, width=None):
+		if width is not None and self.widths is None and width != self.width:
+			self.widths = array("f", [self.width])*len(self)
+		if self.widths is not None:
+			self.widths.append(self.width if width is None else width)
+		self.points.append(x)
+		self.points.append(y)
+		self._extend((x, y, x, y))
+		# the spline bulges out of the points, up to the control points of
+		# the segments of the new point
+		count = len(self)
+		for i in range(max(count-3, 0), count-1):
+			self._extend(segment_bounds(self.segment(i)))
+
+	def last(self):
+		return self.points[-2], self.points[-1]
+
+	def segment(self, i):
+		"""segment from point i to point i+1"""
+		last = len(self)-1
+		return catmull_rom(self.point(max(i-1, 0)), self.point(i),
+		                   self.point(i+1), self.point(min(i+2, last)),
+		                   self.point_width(i), self.point_width(i+1))
+
+	def segments(self):
+		if len(self) == 1:
+			p = self.point(0)
+			w = self.point_width(0)
+			return [Segment(p, p, p, p, w, w)]
+		return [self.segment(i) for i in range(len(self)-1)]
+
+	def simplified(self, tolerance=SIMPLIFY_TOLERANCE):
+		points = self.points
+		kept, widths = array("f"), array("f")
+		for i in douglas_peucker(points, tolerance):
+			kept.append(points[2*i])
+			kept.append(points[2*i+1])
+			widths.append(self.point_width(i))
+		return Stroke(kept, self.width, widths if self.widths is not None else None)
+
+
+class PageStrokes(object):
+	"""committed strokes of a page"""
+
+	def __init__(self, strokes=()):
+		self.strokes = {}  # id -> stroke
+		self.grid = {}     # cell -> ids of the strokes over it
+		self.bounds = EMPTY_BOUNDS # grows as strokes are added, until cleared
+		self.version = next(versions)
+		self.ids = itertools.count()
+		self.undos, self.redos = [], []
+		self.changes = deque(maxlen=CHANGES) # (version before, ids added, removed bounds)
+		for stroke in strokes:
+			self._add(next(self.ids), stroke)
+
+	def __len__(self):
+		return len(self.strokes)
+
+	def __iter__(self):
+		"""strokes in drawing order"""
+		strokes = self.strokes
+		return (strokes[i] for i in sorted(strokes))
+
+	# index
+
+	def _cells(self, bounds):
+		x0, y0, x1, y1 = bounds
+		return [(i, j) for i in range(int(x0//GRID), int(x1//GRID)+1)
+		               for j in range(int(y0//GRID), int(y1//GRID)+1)]
+
+	def _add(self, i, stroke):
+		self.strokes[i] = stroke
+		for cell in self._cells(padded(stroke.bounds, stroke.width/2.)):
+			self.grid.setdefault(cell, set()).add(i)
+		self.bounds = union(self.bounds, stroke.bounds)
+
+	def _remove(self, i):
+		stroke = self.strokes.pop(i)
+		for cell in self._cells(padded(stroke.bounds, stroke.width/2.)):
+			ids = self.grid[cell]
+			ids.discard(i)
+			if not ids:
+				del self.grid[cell]
+		if not self.strokes:
+			self.bounds = EMPTY_BOUNDS
+		return stroke
+
+	def _candidates(self, bounds):
+		ids = set()
+		for cell in self._cells(bounds):
+			ids.update(self.grid.get(cell, ()))
+		return ids
+
+	# changes
+
+	def _change(self, added, removed):
+		"""add (id, stroke) pairs and remove ids, as one logged change"""
+		removed_bounds = EMPTY_BOUNDS
+		for i in removed:
+			stroke = self._remove(i)
+			removed_bounds = union(removed_bounds, padded(stroke.bounds, stroke.width))
+		for i, stroke in added:
+			self._add(i, stroke)
+		self.changes.append((self.version, [i for i, _ in added], removed_bounds))
+		self.version = next(versions)
+
+	def _do(self, added, removed):
+		"""change that can be undone"""
+		removed = [(i, self.strokes[i]) for i in removed]
+		self._change(added, [i for i, _ in removed])
+		self.undos.append((added, removed))
+		del self.redos[:]
+
+	def append(self, stroke):
+		self._do([(next(self.ids), stroke)], [])
+
+	def extend(self, strokes):
+		self._do([(next(self.ids), stroke) for stroke in strokes], [])
+
+	def erase(self, ids):
+		if ids:
+			self._do([], ids)
+
+	def clear(self):
+		self.erase(list(self.strokes))
+
+	def undo(self):
+		"""undo the last change, returns whether there was one"""
+		if not self.undos:
+			return False
+		added, removed = self.undos.pop()
+		self._change(removed, [i for i, _ in added])
+		self.redos.append((added, removed))
+		return True
+
+	def redo(self):
+		if not self.redos:
+			return False
+		added, removed = self.redos.pop()
+		self._change(added, [i for i, _ in removed])
+		self.undos.append((added, removed))
+		return True
+
+	def changes_since(self, version):
+		"""changes (ids added, bounds of the strokes removed) since version,
+		None if they are not all logged"""
+		changes = []
+		for before, added, removed in reversed(self.changes):
+			changes.append((added, removed))
+			if before == version:
+				return changes[::-1]
+		return [] if version == self.version else None
+
+	def damage_since(self, version):
+		"""how to bring a rendering of version up to date: strokes to draw on
+		top of it, and a rect to clear then the strokes to draw clipped to it,
+		None if it has to be rendered again"""
+		changes = self.changes_since(version)
+		if changes is None:
+			return None
+		added, bounds = set(), EMPTY_BOUNDS
+		for ids, removed in changes:
+			added.update(ids)
+			bounds = union(bounds, removed)
+		added = sorted(i for i in added if i in self.strokes)
+		on_top = bounds is None and not any(
+			j > i and j not in added
+			for i in added
+			for j in self._candidates(self._padded_bounds(i)))
+		if on_top:
+			return [self.strokes[i] for i in added], None, []
+		# strokes inserted under others (undone erasures) are redrawn in place
+		for i in added:
+			bounds = union(bounds, self._padded_bounds(i))
+		return [], bounds, self.within(bounds)
+
+	def _padded_bounds(self, i):
+		stroke = self.strokes[i]
+		return padded(stroke.bounds, stroke.width)
+
+	# queries
+
+	def within(self, bounds):
+		"""strokes whose bounds intersect bounds, in drawing order"""
+		if not intersects(self.bounds, bounds):
+			return []
+		strokes = self.strokes
+		return [strokes[i] for i in sorted(self._candidates(bounds))
+		        if intersects(padded(strokes[i].bounds, strokes[i].width/2.), bounds)]
+
+	def hit(self, x, y, radius):
+		"""ids of the strokes passing within radius of (x, y)"""
+		hits = []
+		for i in sorted(self._candidates((x-radius, y-radius, x+radius, y+radius))):
+			stroke = self.strokes[i]
+			if stroke_distance2(stroke, x, y) <= (radius + stroke.width/2.)**2:
+				hits.append(i)
+		return hits
+
+
+class Drawings(dict):
+	"""page -> PageStrokes, the strokes of a page loaded on first access by
+	load(page) (returning a list of strokes) once a loader is set"""
+
+	def __init__(self):
+		dict.__init__(self)
+		self.load = None
+
+	def __missing__(self, page):
+		strokes = self[page] = PageStrokes(self.load(page) if self.load else ())
+		return strokes
+
+	def set_loader(self, load):
+		"""load pages from now on, the pages already accessed get their
+		saved strokes first"""
+		self.load = load
+		for page, strokes in list(self.items()):
+			self[page] = PageStrokes(load(page) + list(strokes))
+
+	def load_all(self, pages):
+		"""access pages, so that none is left to load"""
+		for page in pages:
+			self[page]
+		self.load = None
+
+
+# inking #####################################################################
+
+def pressure_width(pressure, width):
+	"""width of the pen at pressure (0 to 1)"""
+	pressure = max(0., min(1., pressure))
+	return width*(MIN_WIDTH + (1.-MIN_WIDTH)*pressure**PRESSURE_GAMMA)
+
+
+def inking(width=2., min_distance=MIN_DISTANCE, pressure=True):
+	"""generator fed (x, y, pressure) input points, that yields the list of
+	the segments completed by each point and, when fed None, the last ones
+
+	a segment is completed once the point after its end is kept, so the
+	segments yielded are final (the segments of the stroke of the points
+	kept) and can be drawn as they come"""
+	knots = []     # last points kept, (x, y, width)
+	count = 0      # points kept
+	pending = None # last input point, when too close to the last one kept
+	segments = []
+	min_distance2 = min_distance*min_distance
+	while True:
+		point = yield segments
+		segments = []
+		if point is None:
+			break
+		x, y, p = point
+		knot = x, y, pressure_width(p, width) if pressure else width
+		if knots and (x-knots[-1][0])**2 + (y-knots[-1][1])**2 < min_distance2:
+			pending = knot
+			continue
+		pending = None
+		knots.append(knot)
+		del knots[:-4]
+		count += 1
+		if count >= 3:
+			segments.append(_segment(knots[-min(count, 4)], knots[-3], knots[-2], knots[-1]))
+
+	if pending is not None:
+		knots.append(pending)
+		del knots[:-4]
+		count += 1
+		if count >= 3:
+			segments.append(_segment(knots[-min(count, 4)], knots[-3], knots[-2], knots[-1]))
+	if count == 1:
+		segments.append(_segment(knots[0], knots[0], knots[0], knots[0]))
+	elif count >= 2:
+		segments.append(_segment(knots[-min(count, 3)], knots[-2], knots[-1], knots[-1]))
+	yield segments
+
+
+def _segment(k0, k1, k2, k3):
+	return catmull_rom(k0[:2], k1[:2], k2[:2], k3[:2], k1[2], k2[2])
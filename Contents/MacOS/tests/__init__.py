@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the pure python modules of the presentation tool, run from this
+directory with python -m unittest (or pytest)
+"""
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+
+import threading
+import unittest
+
+from cache import PageCache, MB, parse_budget
+
+
+class Renderer(object):
+	"""renders pages as (page, size) tuples costing their width, pages in
+	slow ((started, released) events) being held until released"""
+
+	def __init__(self):
+		self.rendered = []
+		self.slow = {}
+
+	def __call__(self, page, size, transform):
+		if page in self.slow:
+			started, released = self.slow[page]
+			started.set()
+			released.wait()
+		self.rendered.append(page)
+		return (page, size), size[0]
+
+
+class PageCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.render = Renderer()
+
+	def test_hits(self):
+		cache = PageCache(self.render, budget=100)
+		self.assertEqual(cache.get(0, (10, 10)), (0, (10, 10)))
+		cache.get(0, (10, 10))
+		self.assertEqual(self.render.rendered, [0])
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+	def test_least_recently_used_evicted(self):
+		cache = PageCache(self.render, budget=30)
+		for page in (0, 1, 2):
+			cache.get(page, (10, 10))
+		cache.get(0, (10, 10))
+		cache.get(3, (10, 10))
+		self.assertEqual([key[0] for key in cache.images], [2, 0, 3])
+		self.assertEqual(cache.used, 30)
+
+	def test_oversized_image_kept(self):
+		cache = PageCache(self.render, budget=10)
+		cache.get(0, (50, 10))
+		self.assertEqual(len(cache), 1)
+
+	def test_prefetch(self):
+		cache = PageCache(self.render, prefetch=2)
+		self.assertEqual(list(cache.neighbours(5, 0, 6)), [6, 4, 3])
+		cache.prefetch(5, (10, 10), first_page=0, last_page=6)
+		for page in (6, 4, 3):
+			cache.get(page, (10, 10)) # rendered at most once, here or ahead
+		self.assertEqual(sorted(self.render.rendered), [3, 4, 6])
+
+	def test_stale_rendering_dropped(self):
+		cache = PageCache(self.render)
+		started, released = self.render.slow[0] = threading.Event(), threading.Event()
+		thread = threading.Thread(target=cache.get, args=(0, (10, 10)))
+		thread.start()
+		started.wait()
+		cache.invalidate()
+		released.set()
+		thread.join()
+		self.assertEqual(len(cache), 0)
+
+	def test_remap(self):
+		cache = PageCache(self.render)
+		for page in (0, 1, 2):
+			cache.get(page, (10, 10))
+		cache.remap({0: 0, 2: 1})
+		self.assertEqual([key[0] for key in cache.images], [0, 1])
+		self.assertEqual(cache.used, 20)
+		cache.invalidate([1])
+		self.assertEqual([key[0] for key in cache.images], [0])
+
+
+	def test_parse_budget(self):
+		self.assertEqual(parse_budget("64"), 64*MB)
+		for spec in ("0", "-5", "abc"):
+			self.assertRaises(ValueError, parse_budget, spec)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import json
+import shutil
+import socket
+import tempfile
+import unittest
+
+import control
+from control import Dispatcher, CommandError, respond, call_now
+
+
+class DispatcherTest(unittest.TestCase):
+	def setUp(self):
+		self.calls = []
+		self.dispatcher = Dispatcher()
+		self.dispatcher.register("next", lambda: self.calls.append("next"), "next slide")
+		self.dispatcher.register("goto", lambda label: "at %s" % label, "go to a slide", "<label>")
+
+	def test_dispatch(self):
+		self.assertEqual(self.dispatcher.dispatch("next\n"), None)
+		self.assertEqual(self.calls, ["next"])
+		self.assertEqual(self.dispatcher.dispatch("goto  A 1"), "at A 1")
+		self.assertTrue("goto" in self.dispatcher)
+
+	def test_errors(self):
+		for line in ("", "  ", "previous", "goto", "next 2"):
+			self.assertRaises(CommandError, self.dispatcher.dispatch, line)
+		self.assertEqual(self.calls, [])
+
+	def test_help(self):
+		self.assertEqual(self.dispatcher.help(), ["next - next slide", "goto <label> - go to a slide"])
+
+	def test_respond(self):
+		self.assertEqual(json.loads(respond(self.dispatcher, "goto 3")), {"ok": True, "result": "at 3"})
+		self.assertEqual(json.loads(respond(self.dispatcher, "jump")),
+		                 {"ok": False, "error": "unknown command 'jump'"})
+		def fail():
+			raise RuntimeError("no pdf")
+		self.dispatcher.register("fail", fail)
+		self.assertEqual(json.loads(respond(self.dispatcher, "fail")), {"ok": False, "error": "no pdf"})
+		self.assertTrue(respond(self.dispatcher, "next").endswith("\n"))
+
+
+class CallNowTest(unittest.TestCase):
+	def test_call_now(self):
+		self.assertEqual(call_now(lambda: 3).result(), 3)
+		self.assertRaises(ZeroDivisionError, call_now(lambda: 1/0).result)
+
+
+class ControlServerTest(unittest.TestCase):
+	def test_socket(self):
+		directory = tempfile.mkdtemp()
+		path = os.path.join(directory, "control")
+		dispatcher = Dispatcher()
+		dispatcher.register("echo", lambda text: text, argument="<text>")
+		server = control.ControlServer(dispatcher, path).start()
+		try:
+			server.ready.wait(5)
+			client = socket.socket(socket.AF_UNIX)
+			client.connect(path)
+			client.settimeout(5)
+			answers = client.makefile("r")
+			client.sendall(b"echo hi\nnope\n")
+			self.assertEqual(json.loads(answers.readline()), {"ok": True, "result": "hi"})
+			self.assertFalse(json.loads(answers.readline())["ok"])
+			client.shutdown(socket.SHUT_WR)
+			self.assertEqual(answers.readline(), "") # closed by the server
+			self.assertEqual(server.commands, 2)
+			client.close()
+		finally:
+			server.stop()
+			shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+
+import random
+import unittest
+
+import deck
+from deck import DeckIndex, PageTable
+
+
+NAVIGATION_LINK = ((2., 260.), (0., 6.))
+CONTENT_LINK    = ((40., 20.), (60., 10.))
+
+
+# page walks of the original presentation.py, the reference semantics
+
+def walk_next_frame(labels, page):
+	label = labels[page]
+	while page < len(labels) and labels[page] == label:
+		page += 1
+	return page
+
+
+def walk_prev_frame(labels, page):
+	if page-1 < 0:
+		return None
+	label = labels[page-1]
+	page -= 1
+	while page >= 0 and labels[page] == label:
+		page -= 1
+	return page+1
+
+
+def random_labels(count, seed):
+	generator = random.Random(seed)
+	labels, frame = [], 0
+	while len(labels) < count:
+		frame += 1
+		labels.extend([str(frame)] * generator.randint(1, 4))
+	return labels[:count]
+
+
+class DeckIndexTest(unittest.TestCase):
+	def test_frames_match_page_walks(self):
+		for seed in range(5):
+			labels = random_labels(60, seed)
+			deck = DeckIndex(labels)
+			for page in range(len(labels)):
+				self.assertEqual(deck.next_frame(page), walk_next_frame(labels, page))
+				self.assertEqual(deck.prev_frame(page), walk_prev_frame(labels, page))
+				self.assertEqual(deck.frame_start(page), labels.index(labels[page]))
+				self.assertEqual(deck.frame_starts[deck.frame_ordinal(page)], deck.frame_start(page))
+
+	def test_walks_match_index(self):
+		labels = random_labels(60, 0)
+		index = DeckIndex(labels)
+		label = labels.__getitem__
+		for page in range(len(labels)):
+			self.assertEqual(deck.walk_next_frame(label, page, len(labels)), index.next_frame(page))
+			self.assertEqual(deck.walk_prev_frame(label, page), index.prev_frame(page))
+
+	def test_labels(self):
+		index = DeckIndex(["1", "1", "2", "3", "3", "A-1"])
+		self.assertEqual(index.page_for_label("3"), 3)
+		self.assertEqual(index.page_for_label("4"), None)
+		self.assertEqual(index.resolve("A-1"), 5)
+		self.assertEqual(index.resolve("#2"), 1)
+		self.assertEqual(index.resolve("#7"), None)
+		self.assertEqual(index.resolve("#x"), None)
+
+	def test_sections_from_links(self):
+		links = [[(NAVIGATION_LINK, 3), (NAVIGATION_LINK, 7), (CONTENT_LINK, 5)]] + [[]]*9
+		deck = DeckIndex([str(page) for page in range(10)], links)
+		self.assertEqual(deck.section_source, "links")
+		self.assertEqual(deck.section_starts, [0, 3, 7])
+		self.assertEqual(deck.next_section(4), 7)
+		self.assertEqual(deck.next_section(8), 9) # last page past the last section
+		self.assertEqual(deck.prev_section(5), 3) # start of the current section
+		self.assertEqual(deck.prev_section(3), 0) # already there, previous one
+		self.assertEqual(deck.prev_section(0), 0)
+
+	def test_sections_from_outline(self):
+		outline = [("Deck", 0, 0), ("Intro", 1, 1), ("Details", 2, 2),
+		           ("Results", 5, 1), ("Missing", None, 1)]
+		links = [[(NAVIGATION_LINK, 3)]] + [[]]*9
+		deck = DeckIndex([str(page) for page in range(10)], links, outline)
+		self.assertEqual(deck.section_source, "outline")
+		self.assertEqual(deck.sections, [(0, 0, ""), (1, 4, "Intro"), (5, 9, "Results")])
+		self.assertEqual(deck.section(6), (5, 9, "Results"))
+		self.assertEqual(deck.resolve("  details "), 2)
+
+	def test_empty_deck(self):
+		deck = DeckIndex([])
+		self.assertEqual(deck.frame_starts, [])
+		self.assertEqual(deck.sections, [])
+
+
+class PageTableTest(unittest.TestCase):
+	def test_lazy_extraction(self):
+		extracted = []
+		def extract(page):
+			extracted.append(page)
+			return dict(label=str(page))
+		table = PageTable(5, extract, [None, dict(label="one"), None, None, None])
+		self.assertEqual(table[1]["label"], "one")
+		self.assertEqual(table.column("label")[0], "0")
+		self.assertFalse(table.warm(2))
+		self.assertTrue(table.warm())
+		self.assertEqual(sorted(extracted), [0, 2, 3, 4])
+
+
+if __name__ == "__main__":
+	unittest.main()
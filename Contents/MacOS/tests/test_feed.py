@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import time
+import shutil
+import socket
+import tempfile
+import unittest
+
+import feed
+from feed import FeedQueue, DROP_OLDEST, COALESCE, RATE_LIMIT, COALESCE_SEPARATOR
+
+
+class Clock(object):
+	def __init__(self):
+		self.now = 0.
+
+	def __call__(self):
+		return self.now
+
+
+def drain(queue):
+	return list(iter(queue.get, None))
+
+
+class FeedQueueTest(unittest.TestCase):
+	def test_drop_oldest(self):
+		queue = FeedQueue(2, DROP_OLDEST)
+		for message in "abc":
+			self.assertTrue(queue.put(message))
+		self.assertEqual(drain(queue), ["b", "c"])
+		self.assertEqual(queue.stats()["dropped"], 1)
+
+	def test_coalesce(self):
+		queue = FeedQueue(1, COALESCE)
+		for message in "abc":
+			self.assertTrue(queue.put(message))
+		self.assertEqual(drain(queue), [COALESCE_SEPARATOR.join("abc")])
+		self.assertEqual(queue.stats()["coalesced"], 2)
+
+	def test_rate_limit(self):
+		clock = Clock()
+		queue = FeedQueue(10, RATE_LIMIT, rate=2., burst=3, clock=clock)
+		self.assertEqual([queue.put(str(i)) for i in range(5)], [True]*3 + [False]*2)
+		clock.now += 1. # two more tokens
+		self.assertEqual([queue.put(str(i)) for i in range(3)], [True, True, False])
+		self.assertEqual(len(queue), 5)
+		self.assertEqual(queue.stats()["dropped"], 3)
+
+	def test_rate_limit_full_queue(self):
+		queue = FeedQueue(1, RATE_LIMIT, clock=Clock())
+		self.assertTrue(queue.put("a"))
+		self.assertFalse(queue.put("b"))
+		self.assertEqual(drain(queue), ["a"])
+
+	def test_invalid(self):
+		self.assertRaises(ValueError, FeedQueue, 0)
+		self.assertRaises(ValueError, FeedQueue, 1, "drop-newest")
+
+
+class SourcesTest(unittest.TestCase):
+	def test_parse_source(self):
+		self.assertTrue(isinstance(feed.parse_source("stdin"), feed.StdinSource))
+		self.assertEqual(str(feed.parse_source("unix:/tmp/feed")), "unix:/tmp/feed")
+		self.assertEqual(str(feed.parse_source("fifo:/tmp/feed")), "fifo:/tmp/feed")
+		self.assertEqual(str(feed.parse_source("http:8000")), "http:127.0.0.1:8000")
+		self.assertEqual(str(feed.parse_source("http:0.0.0.0:8000")), "http:0.0.0.0:8000")
+		for spec in ("stdin:x", "unix:", "tcp:8000", "http:port"):
+			self.assertRaises(ValueError, feed.parse_source, spec)
+
+	def test_parse_size(self):
+		self.assertEqual(feed.parse_size("5"), 5)
+		for spec in ("0", "-1", "five"):
+			self.assertRaises(ValueError, feed.parse_size, spec)
+
+	def test_unix_source(self):
+		directory = tempfile.mkdtemp()
+		path = os.path.join(directory, "feed")
+		queue = FeedQueue()
+		server = feed.FeedServer(queue, [feed.UnixSource(path)]).start()
+		try:
+			deadline = time.time() + 5
+			while not os.path.exists(path) and time.time() < deadline:
+				time.sleep(.01)
+			client = socket.socket(socket.AF_UNIX)
+			client.connect(path)
+			client.sendall("hello\nwörld\n".encode("utf-8"))
+			client.close()
+			while len(queue) < 2 and time.time() < deadline:
+				time.sleep(.01)
+			self.assertEqual(drain(queue), ["hello", "wörld"])
+		finally:
+			server.stop()
+			shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+	unittest.main()
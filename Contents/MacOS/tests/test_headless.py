@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+
+import unittest
+
+from document import StubDocument, PdfiumDocument
+from headless import HeadlessRenderer
+
+
+# checksums of the drawing of the synthetic deck, any change to the drawing
+# code shows here (update them if it is intended)
+SLIDE_CHECKSUM     = "4ff0814a4c924dc7a12c0d4b254d8fc036a7984c"
+PRESENTER_CHECKSUM = "3d0a3d4b6b7db402bbae2d4c8bb3beaae780935e"
+
+
+class HeadlessTest(unittest.TestCase):
+	def setUp(self):
+		self.renderer = HeadlessRenderer(StubDocument.uniform(3), prefetch=False)
+
+	def test_slide(self):
+		self.assertEqual(self.renderer.render_slide(0, (320, 240)).checksum(), SLIDE_CHECKSUM)
+
+	def test_presenter(self):
+		raster = self.renderer.render_presenter(1, (320, 240), notes=["a note"])
+		self.assertEqual(raster.checksum(), PRESENTER_CHECKSUM)
+
+	def test_cached_rendering(self):
+		first = self.renderer.render_slide(0, (320, 240)).checksum()
+		self.assertEqual(self.renderer.render_slide(0, (320, 240)).checksum(), first)
+
+
+class PdfiumTest(unittest.TestCase):
+	def test_unsupported_transforms(self):
+		document = PdfiumDocument.__new__(PdfiumDocument) # checked before any rendering
+		for transform in ((0., 1., -1., 0., 0., 0.), (2., 0., 0., 1., 0., 0.), (-1., 0., 0., -1., 0., 0.)):
+			self.assertRaises(ValueError, document.render, 0, (320, 240), transform)
+
+
+if __name__ == "__main__":
+	unittest.main()
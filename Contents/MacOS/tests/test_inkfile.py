@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import inkfile
+from strokes import Stroke
+
+
+def same_strokes(test, strokes, decoded):
+	test.assertEqual(len(strokes), len(decoded))
+	for stroke, other in zip(strokes, decoded):
+		test.assertEqual(stroke.width, other.width)
+		test.assertEqual(list(stroke.points), list(other.points))
+		test.assertEqual(stroke.widths is None, other.widths is None)
+		if stroke.widths is not None:
+			test.assertEqual(list(stroke.widths), list(other.widths))
+
+
+class EncodingTest(unittest.TestCase):
+	def test_round_trip(self):
+		strokes = [
+			Stroke([0., 0., 10.5, -3.25, 612., 792.], 2.),
+			Stroke([1., 1., 2., 2.], 3., [1.5, 2.75]),
+			Stroke([], 2.),
+		]
+		same_strokes(self, strokes, inkfile.decode_page(inkfile.encode_page(strokes)))
+
+	def test_quantization(self):
+		stroke, = inkfile.decode_page(inkfile.encode_page([Stroke([.3, 100.001], 2.)]))
+		self.assertAlmostEqual(stroke.points[0], round(.3*64)/64.)
+		self.assertAlmostEqual(stroke.points[1], 100.)
+
+
+class FileTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.pdf_path = os.path.join(self.directory, "deck.pdf")
+		with open(self.pdf_path, "wb") as f:
+			f.write(b"%PDF-1.4 not really\n")
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_save_and_find(self):
+		first, third = [Stroke([0., 0., 5., 5.], 2.)], [Stroke([1., 2., 3., 4.], 1., [1., 2.])]
+		path = inkfile.save(self.pdf_path, {0: first, 1: [], 2: third})
+		self.assertEqual(os.path.dirname(path), self.directory)
+		ink = inkfile.find(self.pdf_path)
+		try:
+			self.assertEqual(sorted(ink.pages()), [0, 2])
+			same_strokes(self, first, ink.strokes(0))
+			same_strokes(self, third, ink.strokes(2))
+		finally:
+			ink.close()
+
+	def test_source_pages_kept(self):
+		first, second = [Stroke([0., 0., 5., 5.], 2.)], [Stroke([1., 2., 3., 4.], 1.)]
+		inkfile.save(self.pdf_path, {0: first})
+		source = inkfile.find(self.pdf_path)
+		try:
+			inkfile.save(self.pdf_path, {1: second}, source)
+		finally:
+			source.close()
+		ink = inkfile.find(self.pdf_path)
+		try:
+			self.assertEqual(sorted(ink.pages()), [0, 1])
+			same_strokes(self, first, ink.strokes(0))
+		finally:
+			ink.close()
+
+	def test_stale_file_ignored(self):
+		inkfile.save(self.pdf_path, {0: [Stroke([0., 0., 5., 5.], 2.)]})
+		with open(self.pdf_path, "ab") as f:
+			f.write(b"edited\n")
+		self.assertEqual(inkfile.find(self.pdf_path), None)
+
+	def rebuild(self, content=b"%PDF-1.4 rebuilt\n"):
+		with open(self.pdf_path, "wb") as f:
+			f.write(content)
+
+	def test_stale_file_kept(self):
+		old, new = [Stroke([0., 0., 5., 5.], 2.)], [Stroke([1., 2., 3., 4.], 1.)]
+		inkfile.save(self.pdf_path, {0: old})
+		self.rebuild()
+		self.assertEqual(inkfile.find(self.pdf_path), None)
+		path = inkfile.save(self.pdf_path, {1: new})
+		ink = inkfile.find(self.pdf_path)
+		try:
+			self.assertEqual(ink.path, path)
+			self.assertEqual(ink.pages(), [1])
+		finally:
+			ink.close()
+		stale, = inkfile.stale_paths(self.pdf_path)
+		ink = inkfile.InkFile(stale)
+		try:
+			same_strokes(self, old, ink.strokes(0))
+		finally:
+			ink.close()
+
+		self.rebuild(b"%PDF-1.4 not really\n") # back to the first build
+		ink = inkfile.find(self.pdf_path)
+		try:
+			self.assertEqual(ink.path, stale)
+			same_strokes(self, old, ink.strokes(0))
+		finally:
+			ink.close()
+
+	def test_own_file_replaced(self):
+		inkfile.save(self.pdf_path, {0: [Stroke([0., 0., 5., 5.], 2.)]})
+		source = inkfile.find(self.pdf_path)
+		writer = inkfile.Writer(self.pdf_path)
+		writer.attach(source)
+		self.rebuild() # reloaded, all strokes remapped by the caller
+		writer.source = None
+		writer.save({1: [Stroke([0., 0., 5., 5.], 2.)]})
+		self.assertTrue(writer.flush(5))
+		source.close()
+		self.assertEqual(inkfile.stale_paths(self.pdf_path), [])
+		ink = inkfile.find(self.pdf_path)
+		try:
+			self.assertEqual(ink.pages(), [1])
+		finally:
+			ink.close()
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from instrument import Instruments, NULL_FRAME, percentile, format_stats
+
+
+class Clock(object):
+	def __init__(self):
+		self.now = 0.
+
+	def __call__(self):
+		return self.now
+
+
+class InstrumentsTest(unittest.TestCase):
+	def setUp(self):
+		self.clock = Clock()
+		self.instruments = Instruments(True, window=3, clock=self.clock)
+
+	def test_frames(self):
+		frame = self.instruments.frame("slide")
+		self.clock.now += .002
+		frame.phase("page")
+		self.clock.now += .001
+		frame.phase("clock")
+		frame.end()
+		timings = self.instruments.report()["timings"]
+		self.assertEqual(list(timings), ["slide.page", "slide.clock", "slide"])
+		self.assertAlmostEqual(timings["slide.page"]["p50"], 2.)
+		self.assertAlmostEqual(timings["slide.clock"]["max"], 1.)
+		self.assertAlmostEqual(timings["slide"]["p99"], 3.)
+
+	def test_window(self):
+		for duration in (.004, .001, .002, .003):
+			self.instruments.record("draw", duration)
+		timing = self.instruments.report()["timings"]["draw"]
+		self.assertEqual(timing["count"], 3)
+		self.assertAlmostEqual(timing["max"], 3.)
+
+	def test_counters_and_gauges(self):
+		self.instruments.count("redraw")
+		self.instruments.count("redraw", 2)
+		calls = []
+		self.instruments.gauge("cache", lambda: calls.append(1) or dict(hits=3, ratio=.5))
+		self.assertEqual(calls, []) # gauges are only read by reports
+		report = self.instruments.report()
+		self.assertEqual(report["counters"], {"redraw": 3})
+		self.assertEqual(report["gauges"]["cache"], dict(hits=3, ratio=.5))
+		self.assertEqual(self.instruments.lines(), ["redraw                 3",
+		                                            "cache                  hits=3 ratio=0.5"])
+
+	def test_reset(self):
+		self.instruments.count("redraw")
+		self.instruments.record("draw", .001)
+		self.instruments.reset()
+		report = self.instruments.report()
+		self.assertEqual((report["timings"], report["counters"]), ({}, {}))
+
+	def test_disabled(self):
+		instruments = Instruments(clock=self.clock)
+		self.assertTrue(instruments.frame("slide") is NULL_FRAME)
+		NULL_FRAME.phase("page")
+		NULL_FRAME.end()
+		instruments.count("redraw")
+		self.assertEqual(instruments.report()["counters"], {})
+
+	def test_dump(self):
+		directory = tempfile.mkdtemp()
+		try:
+			self.instruments.count("redraw")
+			path = self.instruments.dump(os.path.join(directory, "stats.json"))
+			with open(path) as f:
+				self.assertEqual(json.load(f)["counters"], {"redraw": 1})
+		finally:
+			shutil.rmtree(directory)
+
+
+class HelpersTest(unittest.TestCase):
+	def test_percentile(self):
+		values = list(range(100))
+		self.assertEqual(percentile([], .5), 0.)
+		self.assertEqual(percentile(values, .5), 50)
+		self.assertEqual(percentile(values, .99), 99)
+		self.assertEqual(percentile(values, 1.), 99)
+
+	def test_format_stats(self):
+		self.assertEqual(format_stats(3), "3")
+		self.assertEqual(format_stats(dict(b=1, a=dict(ratio=1/3.))), "a=ratio=0.333 b=1")
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+
+import unittest
+
+from layers import LayerCache
+
+
+class LayerCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.rendered = []
+		def render(key):
+			self.rendered.append(key)
+			return "layer %s" % (key,)
+		self.layers = LayerCache(render, size=2)
+
+	def test_hits(self):
+		self.assertEqual(self.layers.get(("notes", 1)), "layer ('notes', 1)")
+		self.assertEqual(self.layers.get(("notes", 1)), "layer ('notes', 1)")
+		self.assertEqual(self.rendered, [("notes", 1)])
+		self.assertEqual(self.layers.stats(), dict(layers=1, hits=1, misses=1))
+
+	def test_least_recently_used_evicted(self):
+		self.layers.get("help")
+		self.layers.get("number")
+		self.layers.get("help")
+		self.layers.get("notes")
+		self.assertEqual(len(self.layers), 2)
+		self.layers.get("help")
+		self.layers.get("number")
+		self.assertEqual(self.rendered, ["help", "number", "notes", "number"])
+
+	def test_clear(self):
+		self.layers.get("help")
+		self.layers.clear()
+		self.layers.get("help")
+		self.assertEqual(self.rendered, ["help", "help"])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+
+import io
+import unittest
+import contextlib
+
+from overview import GridLayout, ThumbnailCache, priority
+
+
+class GridLayoutTest(unittest.TestCase):
+	def setUp(self):
+		# tiles of 88x66 points, rows of 92 points, 4 rows of 2
+		self.layout = GridLayout(7, (212, 100), (4, 3), columns=2)
+
+	def test_index_at(self):
+		layout = self.layout
+		self.assertEqual(layout.index_at((50, 50), 0), 0)
+		self.assertEqual(layout.index_at((150, 50), 0), 1)
+		self.assertEqual(layout.index_at((105, 50), 0), None) # between columns
+		self.assertEqual(layout.index_at((5, 50), 0), None)
+		self.assertEqual(layout.index_at((50, 95), 0), None) # above the first row
+		self.assertEqual(layout.index_at((50, 50), 92), 2)
+		self.assertEqual(layout.index_at((50, 50), 276), 6)
+		self.assertEqual(layout.index_at((150, 50), 276), None) # past the last tile
+
+	def test_index_of_tile_rect(self):
+		for i in range(7):
+			(x, y), (w, h) = self.layout.tile_rect(i, 92)
+			self.assertEqual(self.layout.index_at((x + w/2, y + h/2), 92), i)
+
+	def test_visible(self):
+		self.assertEqual(self.layout.visible(0), range(0, 4))
+		self.assertEqual(self.layout.visible(0, ahead=1), range(0, 6))
+		self.assertEqual(self.layout.visible(276, ahead=5), range(4, 7))
+
+	def test_scroll_to(self):
+		self.assertEqual(self.layout.scroll_to(6, 0), 280)
+		self.assertEqual(self.layout.scroll_to(0, 280), 0)
+		self.assertEqual(self.layout.scroll_to(3, 150), 92)
+
+	def test_move(self):
+		layout = self.layout
+		self.assertEqual([layout.move(0, 1, 0), layout.move(1, 1, 0), layout.move(0, -1, 0)], [1, 2, 0])
+		self.assertEqual([layout.move(5, 0, -1), layout.move(6, 0, 1), layout.move(6, 1, 0)], [3, 6, 6])
+
+	def test_priority(self):
+		self.assertEqual(priority(range(0, 4), range(4, 6), 2), [2, 1, 3, 0, 4, 5])
+		self.assertEqual(priority([0, 1], [1, 2]), [0, 1, 2])
+
+
+class ThumbnailCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.done = []
+		def render(page, size):
+			if page == 3:
+				raise ValueError("broken page")
+			return ("thumbnail", page, size), 10
+		self.thumbnails = ThumbnailCache(render, budget=30, workers=2, done=self.done.append)
+
+	def test_request(self):
+		self.assertEqual(self.thumbnails.get(0, (40, 30)), None)
+		self.thumbnails.request([0, 1], (40, 30))
+		self.assertTrue(self.thumbnails.wait(5))
+		self.assertEqual(self.thumbnails.get(1, (40, 30)), ("thumbnail", 1, (40, 30)))
+		self.assertEqual(sorted(self.done), [0, 1])
+
+	def test_budget(self):
+		self.thumbnails.request([0, 1, 2, 4], (40, 30))
+		self.assertTrue(self.thumbnails.wait(5))
+		self.assertEqual(len(self.thumbnails), 3)
+		self.assertEqual(self.thumbnails.stats()["evictions"], 1)
+
+	def test_render_errors(self):
+		with contextlib.redirect_stderr(io.StringIO()) as errors:
+			self.thumbnails.request([3, 0], (40, 30))
+			self.assertTrue(self.thumbnails.wait(5))
+		self.assertTrue("broken page" in errors.getvalue())
+		self.assertEqual(self.thumbnails.get(3, (40, 30)), None)
+		self.assertNotEqual(self.thumbnails.get(0, (40, 30)), None)
+
+	def test_invalidate(self):
+		self.thumbnails.request([0], (40, 30))
+		self.assertTrue(self.thumbnails.wait(5))
+		self.thumbnails.invalidate()
+		self.assertEqual((len(self.thumbnails), self.thumbnails.used), (0, 0))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+
+import unittest
+
+from document import StubDocument, IDENTITY
+from pagestore import PageStore
+
+
+class PageStoreTest(unittest.TestCase):
+	def setUp(self):
+		self.document = StubDocument.uniform(4)
+		self.store = PageStore(self.document.render, self.document.downsample, prefetch=0)
+
+	def test_smaller_sizes_derived(self):
+		self.store.get(0, (400, 300), IDENTITY)
+		self.store.get(0, (200, 150), IDENTITY)
+		stats = self.store.stats()
+		self.assertEqual((stats["rendered"], stats["derived"]), (1, 1))
+
+	def test_scalable_master_reused(self):
+		store = PageStore(self.document.render, self.document.downsample, prefetch=0, scalable=True)
+		master = store.get(0, (400, 300), IDENTITY)
+		self.assertTrue(store.get(0, (200, 150), IDENTITY) is master)
+		self.assertFalse(store.get(0, (200, 150), IDENTITY, exact=True) is master)
+
+	def test_remap(self):
+		self.store.get(1, (400, 300), IDENTITY)
+		self.store.get(2, (400, 300), IDENTITY)
+		self.store.remap({1: 0})
+		key = self.store.key(0, (400, 300), IDENTITY)
+		self.assertEqual(list(self.store.images), [key])
+		self.assertEqual(self.store.masters, {(0, key[2]): (400, 300)})
+		self.assertEqual(self.store.used, self.store.images[key][1])
+
+	def test_invalidate(self):
+		for page in range(4):
+			self.store.get(page, (40, 30), IDENTITY)
+		self.store.get(3, (20, 15), IDENTITY)
+		self.store.invalidate([3])
+		self.assertEqual(sorted(page for page, _, _ in self.store.images), [0, 1, 2])
+		self.assertEqual(sorted(page for page, _ in self.store.masters), [0, 1, 2])
+		self.store.invalidate()
+		self.assertEqual((self.store.used, self.store.masters), (0, {}))
+
+	def test_eviction_forgets_masters(self):
+		store = PageStore(self.document.render, self.document.downsample, budget=1, prefetch=0)
+		store.get(0, (40, 30), IDENTITY)
+		store.get(1, (40, 30), IDENTITY)
+		self.assertEqual(len(store.images), 1)
+		self.assertEqual(store.get(0, (20, 15), IDENTITY).width, 20) # rendered again
+		self.assertEqual(store.stats()["rendered"], 3)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+
+import unittest
+
+from redraw import Redraw, segment_rect
+
+
+class RedrawTest(unittest.TestCase):
+	def setUp(self):
+		self.marked = []
+		self.redraw = Redraw(lambda view, rect: self.marked.append((view, rect)))
+
+	def test_invalidate(self):
+		self.redraw.register("slide", "slide view")
+		self.redraw.invalidate("slide")
+		self.redraw.invalidate("slide", ((0, 0), (10, 10)))
+		self.assertEqual(self.marked, [("slide view", None), ("slide view", ((0, 0), (10, 10)))])
+
+	def test_unregistered_view_ignored(self):
+		self.redraw.invalidate("presenter")
+		self.assertEqual(self.marked, [])
+		self.assertEqual(self.redraw.stats(), {})
+
+	def test_stats(self):
+		self.redraw.register("slide", "slide view")
+		self.redraw.register("presenter", "presenter view")
+		self.redraw.invalidate("slide")
+		self.redraw.invalidate("slide")
+		self.redraw.drew("slide")
+		self.assertEqual(self.redraw.stats(), {
+			"presenter": dict(invalidations=0, redraws=0),
+			"slide":     dict(invalidations=2, redraws=1),
+		})
+
+
+class SegmentRectTest(unittest.TestCase):
+	def test_any_direction(self):
+		self.assertEqual(segment_rect((10, 5), (2, 9)), ((2, 5), (8, 4)))
+		self.assertEqual(segment_rect((2, 9), (10, 5), 1.), ((1., 4.), (10., 6.)))
+
+
+if __name__ == "__main__":
+	unittest.main()
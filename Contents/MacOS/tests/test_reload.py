@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+
+import unittest
+
+from reload import match_pages, remap_pages, remap_table, remap_links
+
+
+class MatchPagesTest(unittest.TestCase):
+	def test_unchanged(self):
+		keys = [("1", "a"), ("2", "b"), ("3", "c")]
+		page_map, moved, changed = match_pages(keys, list(keys))
+		self.assertEqual(moved, {0: 0, 1: 1, 2: 2})
+		self.assertEqual(changed, [])
+
+	def test_inserted_and_edited(self):
+		old = [("1", "a"), ("2", "b"), ("3", "c"), ("4", "d")]
+		new = [("1", "a"), ("1b", "x"), ("2", "b"), ("3", "C"), ("4", "d")]
+		page_map, moved, changed = match_pages(old, new)
+		self.assertEqual(moved, {0: 0, 1: 2, 3: 4})
+		self.assertEqual(page_map[2], 3) # edited, same place
+		self.assertEqual(changed, [1, 3])
+
+	def test_removed_at_end(self):
+		old = [("1", "a"), ("2", "b"), ("3", "c")]
+		page_map, moved, changed = match_pages(old, old[:1])
+		self.assertEqual(moved, {0: 0})
+		self.assertEqual(page_map, {0: 0, 1: 0, 2: 0})
+
+
+class RemapTest(unittest.TestCase):
+	page_map = {0: 0, 1: 2, 2: 2, 3: 3}
+
+	def test_pages(self):
+		self.assertEqual(remap_pages([3, 1, 7], self.page_map), [3, 2])
+
+	def test_table_merges_collapsed_pages(self):
+		table = {1: ["a"], 2: ["b"], 3: [], 9: ["lost"]}
+		self.assertEqual(remap_table(table, self.page_map), {2: ["a", "b"]})
+
+	def test_links(self):
+		rect = ((2., 260.), (0., 6.))
+		self.assertEqual(remap_links([(rect, 1), (rect, 8)], self.page_map),
+		                 [(rect, 2), (rect, 8)])
+
+
+if __name__ == "__main__":
+	unittest.main()
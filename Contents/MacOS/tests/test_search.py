@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import search
+from search import SearchIndex
+
+
+TEXTS = [
+	"Introduction\nA short course on caches",
+	"Caching\ncache lines, cache misses and the cache hierarchy",
+	"Café\nnothing to see",
+	None,
+]
+
+RECORDS = [None, None, dict(notes=["about caching"], questions=["why cafés?"]), None]
+
+
+class SearchIndexTest(unittest.TestCase):
+	def setUp(self):
+		self.index = SearchIndex.build(TEXTS, RECORDS)
+
+	def test_terms(self):
+		self.assertEqual(search.tokenize("Café, CACHE-lines"), ["cafe", "cache", "lines"])
+		self.assertEqual(self.index.titles, ["Introduction", "Caching", "Café", ""])
+		self.assertEqual(len(self.index), 4)
+
+	def test_exact_words(self):
+		self.assertEqual(self.index.search("cache "), [1])
+		self.assertEqual(self.index.search("cafe "), [2])
+		self.assertEqual(self.index.search("course caches "), [0])
+		self.assertEqual(self.index.search("course cache "), [])
+		self.assertEqual(self.index.search(" "), [])
+
+	def test_prefix(self):
+		self.assertEqual(self.index.matches("cach", prefix=True), {0: 1, 1: 4, 2: 1})
+		self.assertEqual(self.index.search("caf"), [2])
+		self.assertEqual(self.index.search("cachez"), [])
+
+	def test_ranking(self):
+		# occurrences first, then page order
+		self.assertEqual(self.index.search("cach"), [1, 0, 2])
+		self.assertEqual(self.index.search("cach", limit=2), [1, 0])
+		self.assertEqual(self.index.search("to cach"), [2]) # notes included
+
+
+class PersistenceTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.pdf_path = os.path.join(self.directory, "deck.pdf")
+		with open(self.pdf_path, "wb") as f:
+			f.write(b"%PDF-1.4 not really\n")
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_save_and_find(self):
+		path = search.save(self.pdf_path, SearchIndex.build(TEXTS, RECORDS))
+		self.assertEqual(os.path.dirname(path), self.directory)
+		index = search.find(self.pdf_path)
+		self.assertEqual(index.search("cach"), [1, 0, 2])
+		self.assertEqual(index.titles[2], "Café")
+
+	def test_rebuilt_pdf(self):
+		search.save(self.pdf_path, SearchIndex.build(TEXTS, RECORDS))
+		with open(self.pdf_path, "wb") as f:
+			f.write(b"%PDF-1.4 not rebuilt\n")
+		self.assertEqual(search.find(self.pdf_path), None)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import sidecar
+
+
+RECORDS = [
+	dict(label="1", links=[(((2., 260.), (0., 6.)), 1)], notes=["hello"], questions=[]),
+	dict(label="2", links=[], notes=[], questions=["why?"]),
+]
+
+
+class SidecarTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.pdf_path = os.path.join(self.directory, "deck.pdf")
+		with open(self.pdf_path, "wb") as f:
+			f.write(b"%PDF-1.4 not really\n")
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_round_trip(self):
+		path = sidecar.save(self.pdf_path, [dict(record, movies={}) for record in RECORDS])
+		self.assertEqual(path, sidecar.sidecar_paths(self.pdf_path)[0])
+		self.assertEqual(sidecar.load(self.pdf_path), RECORDS)
+
+	def test_touched_pdf(self):
+		sidecar.save(self.pdf_path, RECORDS)
+		stat = os.stat(self.pdf_path)
+		os.utime(self.pdf_path, (stat.st_atime, stat.st_mtime + 10))
+		self.assertEqual(sidecar.load(self.pdf_path), RECORDS) # same content
+		path, data = sidecar.find(self.pdf_path)
+		self.assertEqual(data["mtime"], os.stat(self.pdf_path).st_mtime)
+
+	def test_rebuilt_pdf(self):
+		sidecar.save(self.pdf_path, RECORDS)
+		with open(self.pdf_path, "wb") as f:
+			f.write(b"%PDF-1.4 NOT REALLY\n") # same size
+		self.assertEqual(sidecar.load(self.pdf_path), None)
+		with open(self.pdf_path, "wb") as f:
+			f.write(b"%PDF-1.4 not at all\n")
+		self.assertEqual(sidecar.load(self.pdf_path), None)
+
+	def test_other_version(self):
+		path = sidecar.save(self.pdf_path, RECORDS)
+		with open(path, "w") as f:
+			f.write('{"version": 0}')
+		self.assertEqual(sidecar.load(self.pdf_path), None)
+
+	def test_valid(self):
+		stat = os.stat(self.pdf_path)
+		digest = sidecar.content_hash(self.pdf_path)
+		self.assertTrue(sidecar.valid(self.pdf_path, stat.st_size, stat.st_mtime, None))
+		self.assertTrue(sidecar.valid(self.pdf_path, stat.st_size, 0., digest))
+		self.assertFalse(sidecar.valid(self.pdf_path, stat.st_size, 0., "0"*40))
+		self.assertFalse(sidecar.valid(self.pdf_path, stat.st_size+1, 0., digest))
+
+	def test_write_atomic(self):
+		path = os.path.join(self.directory, "new", "file")
+		sidecar.write_atomic(path, b"\x00\x01", binary=True)
+		sidecar.write_atomic(path, "text")
+		with open(path) as f:
+			self.assertEqual(f.read(), "text")
+		self.assertEqual(os.listdir(os.path.dirname(path)), ["file"])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+
+import io
+import asyncio
+import unittest
+import contextlib
+
+from concurrent.futures import Future
+
+from stream import StreamState, Client, StreamServer
+
+
+class StreamStateTest(unittest.TestCase):
+	def test_apply(self):
+		state = StreamState()
+		state.apply({"t": "page", "page": 2, "size": [4, 3], "g": 1, "strokes": [[0, 2., [0, 0], None]]})
+		state.apply({"t": "add", "page": 2, "strokes": [[1, 2., [1, 1], None], [2, 2., [2, 2], None]]})
+		state.apply({"t": "add", "page": 5, "strokes": [[3, 2., [3, 3], None]]}) # not shown
+		state.apply({"t": "erase", "page": 2, "ids": [0, 9]})
+		state.apply({"t": "view", "view": "black"})
+		state.apply({"t": "ticker", "text": "hello"})
+		state.apply({"t": "frame", "v": 4})
+		self.assertEqual(state.snapshot(), {
+			"t": "state", "page": 2, "size": [4, 3], "g": 1, "view": "black",
+			"strokes": [[1, 2., [1, 1], None], [2, 2., [2, 2], None]],
+			"ticker": "hello", "v": 4,
+		})
+
+	def test_page_replaces_strokes(self):
+		state = StreamState()
+		state.apply({"t": "page", "page": 0, "size": [4, 3], "strokes": [[0, 2., [0, 0], None]]})
+		state.apply({"t": "page", "page": 1, "size": [4, 3], "strokes": []})
+		self.assertEqual((state.snapshot()["strokes"], state.generation), ([], 0))
+
+
+class Transport(object):
+	buffered = 0 # bytes not handed to the kernel yet
+
+	def get_write_buffer_size(self):
+		return self.buffered
+
+
+class Writer(object):
+	def __init__(self):
+		self.transport = Transport()
+		self.data = bytearray()
+
+	def write(self, data):
+		self.data += data
+		self.transport.buffered += len(data)
+
+	def flush(self):
+		self.transport.buffered = 0
+
+	async def drain(self):
+		pass
+
+
+class ClientTest(unittest.TestCase):
+	def setUp(self):
+		self.writer = Writer()
+		self.client = Client(self.writer, backlog=2, max_lag=1.)
+		self.client.resync = False # state event sent
+
+	def test_resync_holds_events(self):
+		self.client.resync = True
+		self.client.push(b"a", 0.)
+		self.assertEqual(len(self.client.frames), 0)
+
+	def test_backlog_overflow(self):
+		for frame in (b"a", b"b"):
+			self.client.push(frame, 0.)
+		self.assertEqual([frame for frame, _ in self.client.frames], [b"a", b"b"])
+		self.client.push(b"c", 0.)
+		self.assertEqual((len(self.client.frames), self.client.resync, self.client.overflows), (0, True, 1))
+
+	def test_lag(self):
+		self.client.write(b"abc", 0.)
+		self.assertEqual(self.client.lag(.5), .5)
+		self.writer.flush()
+		self.assertEqual(self.client.lag(.5), 0.)
+		self.client.push(b"d", 1.)
+		self.assertEqual(self.client.lag(1.5), .5) # queued, not written yet
+
+	def test_lagging_client_resynced(self):
+		self.client.write(b"abc", 0.)
+		self.client.push(b"d", .5)
+		self.assertFalse(self.client.resync)
+		self.client.push(b"e", 1.5) # the kernel took nothing for 1.5s
+		self.assertEqual((len(self.client.frames), self.client.resync), (0, True))
+
+
+class PageImagesTest(unittest.TestCase):
+	def setUp(self):
+		self.calls = []
+		self.results = {}
+		def images(page):
+			self.calls.append(page)
+			result = self.results[page]
+			if isinstance(result, Exception):
+				raise result
+			return result
+		self.server = StreamServer(images)
+
+	def tearDown(self):
+		self.server.loop.close()
+
+	def get(self, path):
+		writer = Writer()
+		asyncio.run(self.server.serve_file(writer, path))
+		return bytes(writer.data).split(b"\r\n")[0]
+
+	def test_cached(self):
+		self.results[0] = b"png"
+		self.assertEqual(self.get("/pages/1.png"), b"HTTP/1.0 200 OK")
+		self.assertEqual(self.get("/pages/1.png"), b"HTTP/1.0 200 OK")
+		self.assertEqual(self.calls, [0])
+
+	def test_not_found(self):
+		self.results[0] = None
+		self.assertEqual(self.get("/pages/1.png"), b"HTTP/1.0 404 Not Found")
+		self.assertEqual(self.get("/nothing"), b"HTTP/1.0 404 Not Found")
+
+	def test_render_errors(self):
+		failed = self.results[1] = Future()
+		failed.set_exception(RuntimeError("no pdfium"))
+		self.results[0] = ValueError("broken page")
+		with contextlib.redirect_stderr(io.StringIO()) as errors:
+			self.assertEqual(self.get("/pages/1.png"), b"HTTP/1.0 500 Internal Server Error")
+			self.assertEqual(self.get("/pages/2.png"), b"HTTP/1.0 500 Internal Server Error")
+		self.assertTrue("broken page" in errors.getvalue())
+		self.assertEqual(self.server.pages, {})
+
+	def test_stale_rendering_not_kept(self):
+		rendering = self.results[0] = Future()
+		async def request():
+			image = asyncio.ensure_future(self.server.page_image(0))
+			await asyncio.sleep(0)
+			self.server._invalidate() # the document changed meanwhile
+			rendering.set_result(b"old png")
+			return await image
+		self.assertEqual(asyncio.run(request()), b"old png")
+		self.assertEqual(self.server.pages, {})
+
+
+if __name__ == "__main__":
+	unittest.main()
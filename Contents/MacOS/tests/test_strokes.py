@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+
+import unittest
+
+from strokes import Stroke, PageStrokes
+
+
+def line(x0, y0, x1, y1, width=2.):
+	return Stroke([x0, y0, x1, y1], width)
+
+
+class StrokeTest(unittest.TestCase):
+	def test_points(self):
+		stroke = Stroke([0, 0, 10, 5], 3.)
+		stroke.append(20, 0)
+		self.assertEqual(len(stroke), 3)
+		self.assertEqual(list(stroke), [(0, 0), (10, 5), (20, 0)])
+		self.assertEqual(stroke.last(), (20, 0))
+		x0, y0, x1, y1 = stroke.bounds
+		self.assertTrue(x0 <= 0 and y0 <= 0 and x1 >= 20 and y1 >= 5)
+
+	def test_simplified(self):
+		stroke = Stroke([float(x) for i in range(11) for x in (i, 0.)])
+		simplified = stroke.simplified()
+		self.assertEqual(list(simplified), [(0, 0), (10, 0)])
+		self.assertEqual(simplified.width, stroke.width)
+
+
+class PageStrokesTest(unittest.TestCase):
+	def test_within(self):
+		a, b = line(0, 0, 10, 0), line(0, 100, 10, 100)
+		page = PageStrokes([a])
+		page.append(b)
+		self.assertEqual(list(page), [a, b])
+		self.assertEqual(page.within((0, 90, 10, 110)), [b])
+		self.assertEqual(page.within((-5, -5, 20, 120)), [a, b])
+		self.assertEqual(page.within((50, 50, 60, 60)), [])
+		self.assertEqual(page.within((0, .5, 10, 2)), [a]) # within half its width
+
+	def test_clear(self):
+		page = PageStrokes()
+		page.extend([line(0, 0, 10, 0), line(0, 50, 10, 50)])
+		self.assertEqual(len(page), 2)
+		page.clear()
+		self.assertEqual((len(page), page.within((0, 0, 10, 50))), (0, []))
+
+
+
+class EditingTest(unittest.TestCase):
+	def test_hit(self):
+		page = PageStrokes([line(0, 0, 10, 0), line(0, 50, 10, 50, 10.)])
+		self.assertEqual(page.hit(5, 1, 1), [0])
+		self.assertEqual(page.hit(5, 44, 1), [1]) # within half its width
+		self.assertEqual(page.hit(5, 25, 1), [])
+
+	def test_undo_redo(self):
+		page = PageStrokes()
+		a, b = line(0, 0, 10, 0), line(0, 50, 10, 50)
+		page.append(a)
+		page.append(b)
+		page.erase(page.hit(5, 0, 1))
+		self.assertEqual(list(page), [b])
+		self.assertTrue(page.undo())
+		self.assertEqual(list(page), [a, b])
+		self.assertTrue(page.undo())
+		self.assertEqual(list(page), [a])
+		self.assertTrue(page.redo())
+		self.assertTrue(page.redo())
+		self.assertEqual(list(page), [b])
+		self.assertFalse(page.redo())
+		page.clear()
+		self.assertEqual(len(page), 0)
+		self.assertTrue(page.undo())
+		self.assertEqual(list(page), [b])
+
+	def test_new_change_drops_redos(self):
+		page = PageStrokes()
+		page.append(line(0, 0, 10, 0))
+		page.undo()
+		page.append(line(0, 50, 10, 50))
+		self.assertFalse(page.redo())
+
+	def test_damage_of_strokes_on_top(self):
+		page = PageStrokes([line(0, 0, 10, 0)])
+		version = page.version
+		self.assertEqual(page.damage_since(version), ([], None, []))
+		c = line(0, 100, 10, 100)
+		page.append(c)
+		self.assertEqual(page.damage_since(version), ([c], None, []))
+
+	def test_damage_of_erasure(self):
+		a, b = line(0, 0, 10, 0), line(0, 200, 10, 200)
+		page = PageStrokes([a, b])
+		version = page.version
+		page.erase(page.hit(5, 0, 1))
+		strokes, bounds, within = page.damage_since(version)
+		self.assertEqual(strokes, [])
+		self.assertTrue(bounds[0] <= 0 and bounds[2] >= 10)
+		self.assertEqual(within, []) # b is out of the cleared rect
+
+	def test_damage_of_undone_erasure_under_a_stroke(self):
+		a, b = line(0, 0, 10, 0), line(0, 0, 10, 0, 4.)
+		page = PageStrokes([a, b])
+		page.erase([0])
+		version = page.version
+		page.undo() # a comes back, under b
+		strokes, bounds, within = page.damage_since(version)
+		self.assertEqual(strokes, [])
+		self.assertEqual(within, [a, b])
+
+	def test_damage_of_unlogged_version(self):
+		page = PageStrokes()
+		self.assertEqual(page.damage_since(-1), None)
+
+
+if __name__ == "__main__":
+	unittest.main()
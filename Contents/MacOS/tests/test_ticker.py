@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+
+import unittest
+
+from ticker import Ticker, parse_fps
+
+
+class Clock(object):
+	def __init__(self):
+		self.now = 100.
+
+	def __call__(self):
+		return self.now
+
+
+class TickerTest(unittest.TestCase):
+	def setUp(self):
+		self.clock = Clock()
+		self.ticker = Ticker(fps=10., pps=40., clock=self.clock)
+
+	def test_position_follows_the_clock(self):
+		self.assertEqual(self.ticker.position(800), 800)
+		self.clock.now += .5
+		self.assertEqual(self.ticker.position(800), 780)
+		self.ticker.restart()
+		self.assertEqual(self.ticker.position(800), 800)
+
+	def test_frame_rate_capped(self):
+		self.assertTrue(self.ticker.due())
+		self.ticker.end_frame(self.ticker.begin_frame())
+		self.clock.now += .05
+		self.assertFalse(self.ticker.due())
+		self.clock.now += .05
+		self.assertTrue(self.ticker.due())
+
+	def test_stats(self):
+		for _ in range(3):
+			begin = self.ticker.begin_frame()
+			self.clock.now += .02
+			self.ticker.end_frame(begin)
+			self.clock.now += .08
+		stats = self.ticker.stats()
+		self.assertAlmostEqual(stats["frame_time"], .02)
+		self.assertAlmostEqual(stats["fps"], 10.)
+
+	def test_invalid_frame_rate(self):
+		self.assertRaises(ValueError, Ticker, 0.)
+		self.assertEqual(parse_fps("12.5"), 12.5)
+		for spec in ("0", "-1", "nan", "fast"):
+			self.assertRaises(ValueError, parse_fps, spec)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import tiles
+
+
+WIDTHS = (64, 32)
+TILE = 32
+
+
+class ExportTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def export(self, spec="synthetic:3"):
+		return tiles.export(spec, self.directory, WIDTHS, TILE, workers=1)
+
+	def test_manifest(self):
+		stats = self.export()
+		self.assertEqual((stats["pages"], stats["rendered"], stats["reused"]), (3, 3, 0))
+		manifest = tiles.Manifest(stats["manifest"])
+		try:
+			self.assertEqual((len(manifest), manifest.tile, manifest.widths), (3, TILE, WIDTHS))
+			self.assertEqual(manifest.sizes(0), [(64, 48), (32, 24)])
+			self.assertEqual(len(manifest.tiles(0)), 2*2 + 1)
+			self.assertEqual(stats["tiles"], 3*5)
+			for page in range(3):
+				for level, (columns, rows) in enumerate([(2, 2), (1, 1)]):
+					for row in range(rows):
+						for column in range(columns):
+							self.assertTrue(os.path.exists(manifest.tile_path(page, level, column, row)))
+			self.assertEqual(manifest.tile_digest(0, 1, 0, 0), manifest.tiles(0)[4].hex())
+			self.assertRaises(IndexError, manifest.tile_digest, 0, 1, 1, 0)
+			self.assertRaises(IndexError, manifest.digest, 3)
+			self.assertEqual([manifest.level_for(w) for w in (20, 40, 100)], [1, 0, 0])
+		finally:
+			manifest.close()
+
+	def test_same_tiles_stored_once(self):
+		digest, new = tiles.write_tile(self.directory, b"png")
+		self.assertEqual(tiles.write_tile(self.directory, b"png"), (digest, False))
+		self.assertTrue(new)
+		with open(tiles.tile_path(self.directory, digest.hex()), "rb") as f:
+			self.assertEqual(f.read(), b"png")
+
+	def test_unchanged_pages_reused(self):
+		self.export()
+		stats = self.export("synthetic:3")
+		self.assertEqual((stats["rendered"], stats["reused"], stats["written"]), (0, 3, 0))
+		stats = self.export("synthetic:4") # the marker of every page moves
+		self.assertEqual((stats["pages"], stats["rendered"]), (4, 4))
+
+	def test_levels_changed(self):
+		self.export()
+		stats = tiles.export("synthetic:3", self.directory, (48,), TILE, workers=1)
+		self.assertEqual(stats["rendered"], 3)
+
+	def test_not_a_manifest(self):
+		path = os.path.join(self.directory, tiles.MANIFEST)
+		with open(path, "wb") as f:
+			f.write(b"PNG?")
+		self.assertRaises(ValueError, tiles.Manifest, path)
+		self.assertEqual(tiles.load(self.directory, WIDTHS, TILE), {})
+
+
+	def test_invalid_options(self):
+		self.assertRaises(ValueError, tiles.export, "synthetic:3", self.directory, WIDTHS, 0)
+		self.assertRaises(ValueError, tiles.export, "synthetic:3", self.directory, (64, 0), TILE)
+		for options in (["-t", "0"], ["-j", "x"], ["-w", "64,"], ["-w", "-1"]):
+			with contextlib.redirect_stderr(io.StringIO()) as errors:
+				self.assertEqual(tiles.main(["export"] + options + ["synthetic:3", self.directory]), 1)
+			self.assertTrue(errors.getvalue().startswith("invalid "))
+		self.assertEqual(tiles.parse_count("8", "tile size"), 8)
+
+	def test_pool(self):
+		self.export()
+		stats = tiles.export("synthetic:4", self.directory, WIDTHS, TILE, workers=2)
+		self.assertEqual((stats["pages"], stats["rendered"]), (4, 4))
+		stats = tiles.export("synthetic:4", self.directory, WIDTHS, TILE, workers=2)
+		self.assertEqual(stats["reused"], 4)
+
+
+if __name__ == "__main__":
+	unittest.main()
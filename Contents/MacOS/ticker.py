@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+
+"""
+Ticker timing for the presentation tool
+
+Scrolling position is derived from a monotonic clock (so that it neither
+jumps with wall clock changes nor depends on the frame rate), frames are
+capped to a maximum rate, and frame times are measured.
+"""
+
+
+# imports ####################################################################
+
+import time
+
+from collections import deque
+
+
+# constants ##################################################################
+
+DEFAULT_FPS = 20. # frames per second for animation
+DEFAULT_PPS = 40. # pixels per second for scrolling
+
+FRAME_WINDOW = 100 # frames over which times are measured
+
+
+# ticker #####################################################################
+
+def parse_fps(spec):
+	"""frame rate from its command line description"""
+	try:
+		fps = float(spec)
+	except ValueError:
+		fps = 0.
+	if not fps > 0.: # nan included
+		raise ValueError("invalid ticker frame rate '%s'" % spec)
+	return fps
+
+
+class Ticker(object):
+	def __init__(self, fps=DEFAULT_FPS, pps=DEFAULT_PPS, clock=time.monotonic):
+		if not fps > 0.:
+			raise ValueError("ticker frame rate must be positive")
+		self.fps, self.pps = fps, pps
+		self.clock = clock
+		self.start_time = clock()
+		self.last_frame = None
+		self.frame_times = deque(maxlen=FRAME_WINDOW)    # drawing durations
+		self.frame_intervals = deque(maxlen=FRAME_WINDOW) # between frames
+
+	def restart(self):
+		self.start_time = self.clock()
+
+	def position(self, width):
+		"""x of a message entering from the right edge of a view of width"""
+		return width - self.pps*(self.clock()-self.start_time)
+
+	def due(self):
+		"""True if enough time passed since the last frame for a new one"""
+		if self.last_frame is None:
+			return True
+		return self.clock() - self.last_frame >= .9/self.fps # some jitter slack
+
+	def begin_frame(self):
+		now = self.clock()
+		if self.last_frame is not None:
+			self.frame_intervals.append(now - self.last_frame)
+		self.last_frame = now
+		return now
+
+	def end_frame(self, begin):
+		self.frame_times.append(self.clock() - begin)
+
+	def stats(self):
+		"""mean and max frame time, and measured frame rate"""
+		times, intervals = self.frame_times, self.frame_intervals
+		return dict(
+			frame_time=sum(times)/len(times) if times else 0.,
+			max_frame_time=max(times) if times else 0.,
+			fps=len(intervals)/sum(intervals) if sum(intervals) else 0.,
+		)
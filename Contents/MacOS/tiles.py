@@ -0,0 +1,337 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""
+Tiled page images of the presentation tool
+
+A deck is exported once as an image pyramid: every page rendered at several
+widths, each rendering cut in square tiles saved as png files named after
+the hash of their content, so that identical tiles (plain backgrounds,
+overlays of a frame) are stored once. Pages are rendered on a pool of
+processes, and a page whose digest (see document.Document.digest) is found
+in the previous export is not rendered again.
+
+The manifest is a flat binary file that readers map in memory, the tiles of
+any page and level being found by arithmetic (little endian):
+	header  "PTIL", version u16, tile size u16, level count u16, 0 u16,
+	        page count u32, then the width of each level u32
+	pages   page digest 20 bytes, index of its first tile u32, then per
+	        level its width and height in pixels u32
+	tiles   tile digests 20 bytes, per page, level, row (top down), column
+Tiles are stored as tiles/<2 first hex digits>/<digest>.png.
+
+	tiles.py export [-j <workers>] [-w <width>,...] [-t <tile size>]
+	                <doc.pdf>|synthetic:<pages> <dir>
+	tiles.py show <dir>
+"""
+
+
+# imports ####################################################################
+
+import sys
+import os
+import mmap
+import time
+import struct
+import hashlib
+import getopt
+
+from concurrent.futures import ProcessPoolExecutor
+
+import document as backends
+from document import IDENTITY, encode_png
+
+
+# constants ##################################################################
+
+MAGIC = b"PTIL"
+VERSION = 1
+MANIFEST = "manifest.bin"
+TILES = "tiles"
+
+DEFAULT_WIDTHS = (3840, 1920, 960, 480, 240) # pixels, 4K down to thumbnails
+DEFAULT_TILE = 512
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+HEADER = struct.Struct("<4sHHHHI")
+PAGE   = struct.Struct("<20sI")
+LEVEL  = struct.Struct("<II")
+DIGEST = 20
+
+
+# manifest ###################################################################
+
+def grid(size, tile):
+	"""columns and rows of tiles of a size"""
+	w, h = size
+	return (w + tile - 1)//tile, (h + tile - 1)//tile
+
+
+def tile_path(root, digest):
+	"""path of the tile with a hex digest"""
+	return os.path.join(root, TILES, digest[:2], "%s.png" % digest)
+
+
+class Manifest(object):
+	"""a manifest mapped in memory"""
+
+	def __init__(self, path):
+		self.root = os.path.dirname(path)
+		with open(path, "rb") as f:
+			self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			magic, version, self.tile, levels, _, self.page_count = HEADER.unpack_from(self.data, 0)
+		except struct.error:
+			raise ValueError("truncated manifest '%s'" % path)
+		if magic != MAGIC or version != VERSION:
+			raise ValueError("not a tile manifest '%s'" % path)
+		self.widths = struct.unpack_from("<%dI" % levels, self.data, HEADER.size)
+		self.pages_offset = HEADER.size + 4*levels
+		self.page_size = PAGE.size + LEVEL.size*levels
+		self.tiles_offset = self.pages_offset + self.page_size*self.page_count
+
+	def __len__(self):
+		return self.page_count
+
+	def close(self):
+		self.data.close()
+
+	def _page(self, page):
+		if not 0 <= page < self.page_count:
+			raise IndexError("no page %s in manifest" % page)
+		return self.pages_offset + page*self.page_size
+
+	def digest(self, page):
+		digest, _ = PAGE.unpack_from(self.data, self._page(page))
+		return bytes(digest).hex()
+
+	def sizes(self, page):
+		"""width and height of each level of page"""
+		offset = self._page(page) + PAGE.size
+		return [LEVEL.unpack_from(self.data, offset + i*LEVEL.size)
+		        for i in range(len(self.widths))]
+
+	def tiles(self, page):
+		"""binary digests of the tiles of page, in manifest order"""
+		_, first = PAGE.unpack_from(self.data, self._page(page))
+		count = sum(c*r for c, r in (grid(size, self.tile) for size in self.sizes(page)))
+		offset = self.tiles_offset + first*DIGEST
+		return [bytes(self.data[offset+i*DIGEST:offset+(i+1)*DIGEST]) for i in range(count)]
+
+	def level_for(self, width):
+		"""smallest level at least width pixels wide, else the largest"""
+		fitting = [i for i, w in enumerate(self.widths) if w >= width]
+		return min(fitting, key=lambda i: self.widths[i]) if fitting else \
+		       max(range(len(self.widths)), key=lambda i: self.widths[i])
+
+	def tile_digest(self, page, level, column, row):
+		offset = self._page(page)
+		_, index = PAGE.unpack_from(self.data, offset)
+		sizes = self.sizes(page)
+		for size in sizes[:level]:
+			columns, rows = grid(size, self.tile)
+			index += columns*rows
+		columns, rows = grid(sizes[level], self.tile)
+		if not (0 <= column < columns and 0 <= row < rows):
+			raise IndexError("no tile %s, %s at level %s" % (column, row, level))
+		offset = self.tiles_offset + (index + row*columns + column)*DIGEST
+		return bytes(self.data[offset:offset+DIGEST]).hex()
+
+	def tile_path(self, page, level, column, row):
+		return tile_path(self.root, self.tile_digest(page, level, column, row))
+
+
+def load(root, widths, tile):
+	"""pages of the manifest of root if it has the same levels: digest ->
+	(sizes, tile digests), empty if there is none"""
+	try:
+		manifest = Manifest(os.path.join(root, MANIFEST))
+	except (IOError, OSError, ValueError):
+		return {}
+	try:
+		if list(manifest.widths) != list(widths) or manifest.tile != tile:
+			return {}
+		return dict((manifest.digest(page), (manifest.sizes(page), manifest.tiles(page)))
+		            for page in range(len(manifest)))
+	finally:
+		manifest.close()
+
+
+def write_manifest(root, widths, tile, pages):
+	"""pages being (digest, sizes, tile digests) tuples"""
+	out = bytearray(HEADER.pack(MAGIC, VERSION, tile, len(widths), 0, len(pages)))
+	out += struct.pack("<%dI" % len(widths), *widths)
+	first = 0
+	for digest, sizes, tiles in pages:
+		out += PAGE.pack(bytes.fromhex(digest), first)
+		for size in sizes:
+			out += LEVEL.pack(*size)
+		first += len(tiles)
+	for _, _, tiles in pages:
+		out += b"".join(tiles)
+	path = os.path.join(root, MANIFEST)
+	temp = "%s.%s" % (path, os.getpid())
+	with open(temp, "wb") as f:
+		f.write(out)
+	os.rename(temp, path) # readers keep their mapping of the previous one
+	return path
+
+
+# rendering ##################################################################
+
+def open_document(spec):
+	"""PDFKit document on Mac OS X, else a headless one"""
+	if backends.objc is not None and not spec.startswith("synthetic:"):
+		from Foundation import NSURL
+		from Quartz import PDFDocument
+		url = NSURL.fileURLWithPath_(os.path.abspath(spec))
+		return backends.QuartzDocument(PDFDocument.alloc().initWithURL_(url))
+	return backends.open_document(spec)
+
+
+def write_tile(root, data):
+	"""store a tile, returns its binary digest and whether it was new"""
+	digest = hashlib.sha1(data).digest()
+	path = tile_path(root, digest.hex())
+	if os.path.exists(path):
+		return digest, False
+	directory = os.path.dirname(path)
+	if not os.path.isdir(directory):
+		os.makedirs(directory, exist_ok=True) # other workers may race
+	temp = "%s.%s" % (path, os.getpid())
+	with open(temp, "wb") as f:
+		f.write(data)
+	os.rename(temp, path)
+	return digest, True
+
+
+def render_page(document, page, root, widths, tile):
+	"""render the levels of page into tiles, returns the level sizes, the
+	tile digests and the number of tiles written"""
+	w, h = document.size(page)
+	sizes, tiles, written = [], [], 0
+	for width in widths:
+		size = width, max(int(round(width*h/w)), 1)
+		image, _ = document.render(page, size, IDENTITY)
+		columns, rows = grid(size, tile)
+		for row in range(rows):
+			for column in range(columns):
+				x, y = column*tile, row*tile
+				rect = x, y, min(tile, size[0]-x), min(tile, size[1]-y)
+				digest, new = write_tile(root, encode_png(image, rect))
+				tiles.append(digest)
+				written += new
+		sizes.append(size)
+	return sizes, tiles, written
+
+
+worker_document = None    # document opened once by each worker process
+worker_known = frozenset() # digests of the pages of the previous export
+
+def open_worker(spec, known=frozenset()):
+	global worker_document, worker_known
+	worker_document = open_document(spec)
+	worker_known = known
+
+
+def export_page(task):
+	"""digest, sizes, tile digests and tiles written for a page, sizes and
+	tiles being None if the digest is known"""
+	page, root, widths, tile = task
+	digest = worker_document.digest(page)
+	if digest in worker_known:
+		return digest, None, None, 0
+	sizes, tiles, written = render_page(worker_document, page, root, widths, tile)
+	return (digest, sizes, tiles, written)
+
+
+# export #####################################################################
+
+def export(spec, root, widths=DEFAULT_WIDTHS, tile=DEFAULT_TILE, workers=DEFAULT_WORKERS):
+	"""export a document (see open_document) into root, returns stats"""
+	if tile < 1 or not widths or min(widths) < 1 or workers < 1:
+		raise ValueError("tiles, widths and workers must be at least 1")
+	start = time.time()
+	if not os.path.isdir(root):
+		os.makedirs(root)
+	previous = load(root, widths, tile)
+	known = frozenset(previous)
+	page_count = open_document(spec).page_count
+	# known goes to each worker once, not with every page
+	tasks = [(page, root, widths, tile) for page in range(page_count)]
+	if workers > 1:
+		with ProcessPoolExecutor(workers, initializer=open_worker, initargs=(spec, known)) as pool:
+			results = list(pool.map(export_page, tasks))
+	else:
+		open_worker(spec, known)
+		results = [export_page(task) for task in tasks]
+
+	pages, rendered, written = [], 0, 0
+	for digest, sizes, tiles, new in results:
+		if sizes is None:
+			sizes, tiles = previous[digest]
+		else:
+			rendered += 1
+			written += new
+		pages.append((digest, sizes, tiles))
+	path = write_manifest(root, widths, tile, pages)
+	return dict(manifest=path, pages=page_count, rendered=rendered,
+	            reused=page_count-rendered, tiles=sum(len(t) for _, _, t in pages),
+	            written=written, seconds=round(time.time()-start, 3))
+
+
+# command line ###############################################################
+
+def parse_count(spec, name):
+	"""positive integer of an option"""
+	try:
+		count = int(spec)
+	except ValueError:
+		count = 0
+	if count < 1:
+		raise ValueError("invalid %s '%s'" % (name, spec))
+	return count
+
+
+def main(args):
+	command = args[:1]
+	try:
+		options, args = getopt.getopt(args[1:], "j:w:t:")
+	except getopt.GetoptError as error:
+		sys.stderr.write("%s\n%s" % (error, __doc__))
+		return 1
+	options = dict(options)
+	if command == ["export"] and len(args) == 2:
+		try:
+			widths = DEFAULT_WIDTHS
+			if "-w" in options:
+				widths = tuple(parse_count(width, "width") for width in options["-w"].split(","))
+			tile = parse_count(options.get("-t", DEFAULT_TILE), "tile size")
+			workers = parse_count(options.get("-j", DEFAULT_WORKERS), "worker count")
+		except ValueError as error:
+			sys.stderr.write("%s\n%s" % (error, __doc__))
+			return 1
+		stats = export(args[0], args[1], widths, tile, workers)
+		sys.stdout.write("%(manifest)s: %(pages)s pages (%(rendered)s rendered, "
+		                 "%(reused)s unchanged), %(tiles)s tiles (%(written)s new) "
+		                 "in %(seconds)ss\n" % stats)
+		return 0
+	if command == ["show"] and len(args) == 1:
+		try:
+			manifest = Manifest(os.path.join(args[0], MANIFEST))
+		except (IOError, OSError, ValueError) as error:
+			sys.stderr.write("%s\n" % error)
+			return 1
+		sys.stdout.write("%s pages, tiles of %s pixels, levels %s\n" % (
+			len(manifest), manifest.tile, " ".join(str(w) for w in manifest.widths)))
+		for page in range(len(manifest)):
+			sys.stdout.write("%5s %s %s\n" % (page+1, manifest.digest(page)[:12], " ".join(
+				"%sx%s" % size for size in manifest.sizes(page))))
+		return 0
+	sys.stderr.write(__doc__)
+	return 1
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))